@@ -0,0 +1,795 @@
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import urllib.request
+from concurrent.futures import wait
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlencode, urlparse
+
+from PyQt5.QtCore import Qt
+
+from vi import (DownloadCancelled, DownloadEngine, InstagramDownloaderThread, RequestScheduler,
+                SQLiteMediaTracker, TikTokDownloaderThread, TransferResult, get_media_tracker,
+                get_request_scheduler)
+
+
+class LegacyMediaTracker:
+    # Eski davranış: her çağrıda yeni bağlantı, tek satır, commit ve kapatma
+    def __init__(self, db_path):
+        self.db_path = db_path
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS downloaded_media (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    media_id TEXT NOT NULL,
+                    media_hash TEXT UNIQUE NOT NULL,
+                    media_url TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    media_type TEXT NOT NULL,
+                    platform TEXT NOT NULL,
+                    hashtag TEXT,
+                    downloaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_media_hash ON downloaded_media(media_hash)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_media_id ON downloaded_media(media_id)')
+
+    def is_media_downloaded(self, media_id, media_url):
+        media_hash = hashlib.md5(str(media_url).encode('utf-8')).hexdigest()
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.execute('SELECT COUNT(*) FROM downloaded_media WHERE media_hash = ? OR media_id = ?',
+                                  (media_hash, media_id))
+            return cursor.fetchone()[0] > 0
+
+    def add_media(self, media_id, media_url, file_path, media_type, platform, hashtag=None):
+        media_hash = hashlib.md5(str(media_url).encode('utf-8')).hexdigest()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''
+                INSERT INTO downloaded_media
+                (media_id, media_hash, media_url, file_path, media_type, platform, hashtag)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (media_id, media_hash, str(media_url), file_path, media_type, platform, hashtag))
+            conn.commit()
+        return True
+
+
+def _media_items(count, offset=0):
+    for i in range(offset, offset + count):
+        yield {
+            'media_id': str(1000000 + i),
+            'media_url': f"https://cdn.example.com/media/{i}.jpg",
+            'file_path': f"/tmp/bench/{i}.jpg",
+            'media_type': 'photo',
+            'platform': 'instagram',
+            'hashtag': 'bench',
+        }
+
+
+def _rate(count, elapsed):
+    return round(count / elapsed, 1) if elapsed > 0 else float('inf')
+
+
+def _bench_lookups(tracker, count):
+    items = list(_media_items(count))
+    start = time.perf_counter()
+    for item in items:
+        tracker.is_media_downloaded(item['media_id'], item['media_url'])
+    return _rate(count, time.perf_counter() - start)
+
+
+def bench_tracker(rows):
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='tracker_bench_')
+    try:
+        legacy = LegacyMediaTracker(os.path.join(workdir, 'legacy.db'))
+        start = time.perf_counter()
+        for item in _media_items(rows):
+            legacy.add_media(**item)
+        results['legacy'] = {
+            'inserts_per_sec': _rate(rows, time.perf_counter() - start),
+            'lookups_per_sec': _bench_lookups(legacy, rows),
+        }
+
+        tracker = SQLiteMediaTracker(os.path.join(workdir, 'single.db'))
+        start = time.perf_counter()
+        for item in _media_items(rows):
+            tracker.add_media(**item)
+        results['add_media'] = {
+            'inserts_per_sec': _rate(rows, time.perf_counter() - start),
+            'lookups_per_sec': _bench_lookups(tracker, rows),
+        }
+        tracker.close()
+
+        tracker = SQLiteMediaTracker(os.path.join(workdir, 'many.db'))
+        items = list(_media_items(rows))
+        start = time.perf_counter()
+        for i in range(0, rows, tracker.batch_size):
+            tracker.add_media_many(items[i:i + tracker.batch_size])
+        results['add_media_many'] = {
+            'inserts_per_sec': _rate(rows, time.perf_counter() - start),
+        }
+        tracker.close()
+
+        tracker = SQLiteMediaTracker(os.path.join(workdir, 'queued.db'))
+        start = time.perf_counter()
+        for item in _media_items(rows):
+            tracker.queue_media(**item)
+        tracker.flush()
+        results['queue_media'] = {
+            'inserts_per_sec': _rate(rows, time.perf_counter() - start),
+        }
+        tracker.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _bench_bulk_lookups(tracker, count, page_size=30):
+    # Arama sayfası büyüklüğünde gruplarla filter_new_media
+    candidates = [(item['platform'], item['media_id'], item['media_url']) for item in _media_items(count)]
+    start = time.perf_counter()
+    for i in range(0, count, page_size):
+        tracker.filter_new_media(candidates[i:i + page_size])
+    return _rate(count, time.perf_counter() - start)
+
+
+def _legacy_lookups(db_path, count):
+    # Eski şemanın sorgusu, kalıcı bağlantıyla (bağlantı açma maliyeti hariç)
+    conn = sqlite3.connect(db_path)
+    items = list(_media_items(count))
+    start = time.perf_counter()
+    for item in items:
+        media_hash = hashlib.md5(item['media_url'].encode('utf-8')).hexdigest()
+        conn.execute('SELECT 1 FROM downloaded_media WHERE media_hash = ? OR media_id = ? LIMIT 1',
+                     (media_hash, item['media_id'])).fetchone()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return _rate(count, elapsed)
+
+
+def _media_lookups(db_path, count):
+    # Yeni şemada aynı sorgu: (platform, media_id) birincil anahtarı ve url_hash indeksi
+    conn = sqlite3.connect(db_path)
+    items = list(_media_items(count))
+    start = time.perf_counter()
+    for item in items:
+        url_hash = hashlib.md5(item['media_url'].encode('utf-8')).digest()
+        conn.execute('SELECT 1 FROM media WHERE platform = 1 AND media_id = ? '
+                     'UNION ALL SELECT 1 FROM media WHERE url_hash = ? LIMIT 1',
+                     (item['media_id'], url_hash)).fetchone()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return _rate(count, elapsed)
+
+
+def bench_schema(rows):
+    # Eski downloaded_media şeması ile media (WITHOUT ROWID, ikili özet) karşılaştırması;
+    # bellek indeksi kapalıdır, sorgular doğrudan SQLite'a gider
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='schema_bench_')
+    try:
+        legacy_path = os.path.join(workdir, 'legacy.db')
+        LegacyMediaTracker(legacy_path)
+        with sqlite3.connect(legacy_path) as conn:
+            conn.execute('ALTER TABLE downloaded_media ADD COLUMN content_hash TEXT')
+            conn.execute('CREATE INDEX idx_content_hash ON downloaded_media(content_hash)')
+            conn.executemany('''
+                INSERT INTO downloaded_media
+                (media_id, media_hash, media_url, file_path, media_type, platform, hashtag, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', ((item['media_id'], hashlib.md5(item['media_url'].encode('utf-8')).hexdigest(),
+                   item['media_url'], item['file_path'], item['media_type'], item['platform'],
+                   item['hashtag'], hashlib.sha256(item['media_url'].encode('utf-8')).hexdigest())
+                  for item in _media_items(rows)))
+        with sqlite3.connect(legacy_path) as conn:
+            conn.execute('VACUUM')
+        results['legacy'] = {
+            'file_mb': round(os.path.getsize(legacy_path) / 2 ** 20, 2),
+            'lookups_per_sec': _legacy_lookups(legacy_path, rows),
+        }
+
+        migrated_path = os.path.join(workdir, 'migrated.db')
+        shutil.copyfile(legacy_path, migrated_path)
+        tracker = SQLiteMediaTracker(migrated_path, index_max_rows=0)
+        start = time.perf_counter()
+        migrated = tracker.migrate_legacy_media(vacuum=True)
+        results['migration'] = {
+            'rows': migrated,
+            'rows_per_sec': _rate(migrated, time.perf_counter() - start),
+        }
+        tracker.close()
+        tracker = SQLiteMediaTracker(migrated_path, index_max_rows=0)
+        results['media'] = {
+            'file_mb': round(os.path.getsize(migrated_path) / 2 ** 20, 2),
+            'lookups_per_sec': _media_lookups(migrated_path, rows),
+            'tracker_lookups_per_sec': _bench_lookups(tracker, rows),
+            'bulk_lookups_per_sec': _bench_bulk_lookups(tracker, rows),
+        }
+        items = list(_media_items(rows, offset=rows))
+        start = time.perf_counter()
+        for i in range(0, rows, tracker.batch_size):
+            tracker.add_media_many(items[i:i + tracker.batch_size])
+        results['media']['inserts_per_sec'] = _rate(rows, time.perf_counter() - start)
+        tracker.close()
+        results['size_ratio'] = round(results['media']['file_mb'] / results['legacy']['file_mb'], 2)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+class PayloadHandler(BaseHTTPRequestHandler):
+    # /media/<boyut>/<ad> isteğine boyut kadar sabit veri döner; Range desteklenir
+    protocol_version = 'HTTP/1.1'
+    payload_cache = {}
+
+    def do_GET(self):
+        try:
+            size = int(self.path.split('/')[2])
+        except (IndexError, ValueError):
+            self.send_error(404)
+            return
+        payload = self.payload_cache.get(size)
+        if payload is None:
+            payload = os.urandom(size)
+            self.payload_cache[size] = payload
+        self.send_payload(payload, 'application/octet-stream')
+
+    def send_payload(self, payload, content_type):
+        etag = '"%s"' % hashlib.md5(payload).hexdigest()
+        start = 0
+        range_header = self.headers.get('Range', '')
+        if_range = self.headers.get('If-Range')
+        if range_header.startswith('bytes=') and (if_range is None or if_range == etag):
+            start = int(range_header[6:].split('-')[0] or 0)
+            if start >= len(payload):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(payload)}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(payload) - 1}/{len(payload)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload) - start))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        try:
+            self.wfile.write(memoryview(payload)[start:])
+        except ConnectionError:
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+JPEG_HEADER = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00'
+MP4_HEADER = b'\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom'
+
+
+class StandInHandler(PayloadHandler):
+    # Instagram/TikTok yerine geçen yerel sunucu:
+    #   /                                  TikTok ana sayfası (tt_csrf_token çerezi)
+    #   /api/search/general/preview/       TikTok önizleme araması (JSON)
+    #   /api/search/general/full/          TikTok tam arama (JSON)
+    #   /instagram/tags/<etiket>/<sekme>   StubInstagramClient için hashtag sayfası
+    #   /media/<boyut>/<ad>.jpg|.mp4       Sahte JPEG/MP4; her ad için farklı içerik
+    total_items = 200
+    photo_size = 200 * 1024
+    video_size = 2 * 1024 * 1024
+    video_every = 4
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        if url.path == '/':
+            body = b'<html></html>'
+            self.send_response(200)
+            self.send_header('Set-Cookie', 'tt_csrf_token=bench; Path=/')
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path == '/api/search/general/preview/':
+            self.send_json(self.tiktok_page(query, full=False))
+        elif url.path == '/api/search/general/full/':
+            self.send_json(self.tiktok_page(query, full=True))
+        elif url.path.startswith('/instagram/tags/'):
+            self.send_json(self.instagram_page(url.path.split('/')[3], query))
+        elif url.path.startswith('/media/'):
+            self.send_media(url.path)
+        else:
+            self.send_error(404)
+
+    def base_url(self):
+        return f"http://{self.headers['Host']}"
+
+    def tiktok_page(self, query, full):
+        keyword = query.get('keyword', '')
+        offset = int(query.get('offset', 0))
+        count = int(query.get('count', 20))
+        end = min(offset + count, self.total_items)
+        items = []
+        for i in range(offset, end):
+            url = f"{self.base_url()}/media/{self.video_size}/{quote(keyword)}-{i}.mp4"
+            if full:
+                items.append({'item': {'id': f"{i}", 'desc': f"bench {i}", 'createTime': 1700000000 + i,
+                                       'author': {'nickname': 'bench'},
+                                       'video': {'playAddr': url, 'width': 720, 'height': 1280, 'duration': 15}}})
+            else:
+                items.append({'id': f"{i}", 'title': f"bench {i}", 'create_time': 1700000000 + i,
+                              'author': {'nickname': 'bench'}, 'play_addr': {'url_list': [url]},
+                              'width': 720, 'height': 1280, 'duration': 15})
+        data = {'data': items} if full else {'data': {'videos': items}}
+        data.update(has_more=int(end < self.total_items), cursor=end)
+        return data
+
+    def instagram_page(self, tag, query):
+        offset = int(query.get('max_id') or 0)
+        end = min(offset + int(query.get('count', 27)), self.total_items)
+        items = []
+        for i in range(offset, end):
+            video = i % self.video_every == 0
+            size, ext = (self.video_size, 'mp4') if video else (self.photo_size, 'jpg')
+            url = f"{self.base_url()}/media/{size}/{tag}-{i}.{ext}"
+            items.append({'id': f"{i}_1", 'media_type': 2 if video else 1, 'taken_at': 1700000000 + i,
+                          'caption_text': f"bench #{tag} {i}", 'video_duration': 15 if video else 0,
+                          'video_url': url if video else None, 'thumbnail_url': None if video else url})
+        return {'items': items, 'next_max_id': str(end) if end < self.total_items else None}
+
+    def send_json(self, data):
+        # Arama sayfaları ETag taşır; If-None-Match eşleşirse 304 döner
+        body = json.dumps(data).encode('utf-8')
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_media(self, path):
+        try:
+            _, _, size, name = path.split('/', 3)
+            size = int(size)
+        except ValueError:
+            self.send_error(404)
+            return
+        base = self.payload_cache.get(size)
+        if base is None:
+            base = os.urandom(size)
+            self.payload_cache[size] = base
+        header = (MP4_HEADER if name.endswith('.mp4') else JPEG_HEADER) + name.encode('utf-8')
+        content_type = 'video/mp4' if name.endswith('.mp4') else 'image/jpeg'
+        self.send_payload(header + base[len(header):], content_type)
+
+
+class StubInstagramClient:
+    # instagrapi.Client yerine geçer; giriş yapmaz, hashtag sayfalarını yerel
+    # sunucudan çeker ve Media benzeri nesneler döner
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.settings = {}
+
+    def set_settings(self, settings):
+        self.settings = settings
+
+    def get_settings(self):
+        return self.settings
+
+    def login(self, username, password, relogin=False):
+        self.settings = {'uuids': {'uuid': 'bench'}}
+        return True
+
+    def hashtag_medias_v1_chunk(self, name, max_amount=27, tab_key='', max_id=None):
+        query = urlencode({'count': max_amount, 'max_id': max_id or ''})
+        with urllib.request.urlopen(f"{self.base_url}/instagram/tags/{quote(name)}/{tab_key}?{query}") as response:
+            data = json.load(response)
+        return [types.SimpleNamespace(**item) for item in data['items']], data['next_max_id']
+
+
+def start_local_server(handler=PayloadHandler):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _serve_in_process(port_queue, handler_name, handler_options):
+    handler = globals()[handler_name]
+    if handler_options:
+        handler = type(handler_name, (handler,), handler_options)
+    server = start_local_server(handler)
+    port_queue.put(server.server_address[1])
+    threading.Event().wait()
+
+
+def start_server_process(handler=PayloadHandler, **handler_options):
+    # CPU ve bellek ölçümlerinde sunucunun GIL, CPU ve RSS kullanımı istemciye
+    # karışmasın diye sunucu ayrı bir süreçte çalıştırılır
+    port_queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve_in_process, daemon=True,
+                                      args=(port_queue, handler.__name__, handler_options))
+    process.start()
+    return process, port_queue.get(timeout=10)
+
+
+def bench_engine(files, size, connections):
+    server = start_local_server()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    workdir = tempfile.mkdtemp(prefix='engine_bench_')
+    # Yerel sunucuda hız sınırı ölçümü bozmasın diye zamanlayıcı serbest bırakılır
+    scheduler = RequestScheduler(default_rate=1e9, default_burst=10 ** 9)
+    engine = DownloadEngine(max_connections=connections, per_host_limit=connections, scheduler=scheduler)
+    try:
+        start = time.perf_counter()
+        futures = [
+            engine.submit(engine.fetch(f"{base_url}/media/{size}/{i}", os.path.join(workdir, f"{i}.bin")))
+            for i in range(files)
+        ]
+        wait(futures)
+        elapsed = time.perf_counter() - start
+        total = sum(future.result().bytes_written for future in futures)
+        return {
+            'files': files,
+            'items_per_sec': _rate(files, elapsed),
+            'mb_per_sec': round(total / elapsed / 1e6, 1),
+        }
+    finally:
+        engine.close()
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class LegacyDownloadEngine(DownloadEngine):
+    # Eski yazma yolu: 8 KB parçalar, parça başına write, özet ve durum kontrolü
+    async def _transfer(self, url, filename, headers, cookies, is_running, on_progress,
+                        journal, transfer_key, metrics=None, platform=None):
+        digest = hashlib.sha256()
+        downloaded = 0
+        async with self._client.stream('GET', url, headers=headers, cookies=cookies) as response:
+            response.raise_for_status()
+            with open(filename, 'wb') as f:
+                async for chunk in response.aiter_bytes(8192):
+                    if self.bandwidth.enabled:
+                        await self.bandwidth.consume_async(platform, len(chunk))
+                    if is_running is not None and not is_running():
+                        raise DownloadCancelled(filename)
+                    f.write(chunk)
+                    digest.update(chunk)
+                    downloaded += len(chunk)
+                    if on_progress is not None:
+                        on_progress(downloaded, 0)
+        return TransferResult(filename, downloaded, 0, digest.hexdigest())
+
+
+def _loop_cpu_time(engine):
+    # Motor döngüsü thread'inin (kullanıcı, çekirdek) CPU süresi. Çekirdek süresine
+    # fsync ile diske yazılan sayfalar da girdiğinden ikisi ayrı raporlanır.
+    async def thread_times():
+        if resource is not None and hasattr(resource, 'RUSAGE_THREAD'):
+            usage = resource.getrusage(resource.RUSAGE_THREAD)
+            return usage.ru_utime, usage.ru_stime
+        return time.thread_time(), 0.0
+    return engine.submit(thread_times()).result()
+
+
+def _measure_write(engine, base_url, workdir, name, files, size):
+    # Isınma: bağlantı kurulur ve sunucu veriyi önbelleğe alır
+    engine.submit(engine.fetch(f"{base_url}/media/{size}/warmup",
+                               os.path.join(workdir, 'warmup.bin'))).result()
+    cpu_start = _loop_cpu_time(engine)
+    start = time.perf_counter()
+    total = 0
+    for i in range(files):
+        result = engine.submit(engine.fetch(
+            f"{base_url}/media/{size}/{name}{i}", os.path.join(workdir, f"{name}{i}.bin"),
+            is_running=lambda: True, on_progress=lambda done, length: None)).result()
+        total += result.bytes_written
+    elapsed = time.perf_counter() - start
+    user, system = (end - begin for begin, end in zip(cpu_start, _loop_cpu_time(engine)))
+    for entry in os.listdir(workdir):
+        os.remove(os.path.join(workdir, entry))
+    return {
+        'cpu_sec_per_gb': round((user + system) / total * 1e9, 3),
+        'user_sec_per_gb': round(user / total * 1e9, 3),
+        'system_sec_per_gb': round(system / total * 1e9, 3),
+        'mb_per_sec': round(total / elapsed / 1e6, 1),
+    }
+
+
+def bench_write(files, size, rounds):
+    # İki yol sırayla birkaç tur ölçülür, her biri için en düşük CPU süresi alınır
+    server_process, port = start_server_process()
+    base_url = f"http://127.0.0.1:{port}"
+    workdir = tempfile.mkdtemp(prefix='write_bench_')
+    scheduler = RequestScheduler(default_rate=1e9, default_burst=10 ** 9)
+    results = {}
+    try:
+        for _ in range(rounds):
+            for name, engine_class in (('legacy_8k', LegacyDownloadEngine), ('adaptive', DownloadEngine)):
+                engine = engine_class(max_connections=1, per_host_limit=1, scheduler=scheduler)
+                try:
+                    sample = _measure_write(engine, base_url, workdir, name, files, size)
+                finally:
+                    engine.close()
+                if name not in results or sample['cpu_sec_per_gb'] < results[name]['cpu_sec_per_gb']:
+                    results[name] = sample
+        results['cpu_reduction'] = round(
+            1 - results['adaptive']['cpu_sec_per_gb'] / results['legacy_8k']['cpu_sec_per_gb'], 3)
+        # Her iki yolun da ödediği SHA-256 maliyeti, karşılaştırma için alt sınır
+        block = os.urandom(size)
+        start = time.thread_time()
+        hashlib.sha256(block).digest()
+        results['sha256_sec_per_gb'] = round((time.thread_time() - start) / size * 1e9, 3)
+    finally:
+        server_process.terminate()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+LAZY_MODULES = ('instagrapi', 'requests', 'httpx', 'tiktokapipy', 'bs4', 'numpy', 'PIL')
+
+
+def bench_startup(budget_ms, runs):
+    # python -X importtime çıktısından vi modülünün kümülatif yükleme süresi okunur;
+    # ağır istemcilerin modül yüklenirken içeri alınmadığı da doğrulanır
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    eager = set()
+    for _ in range(runs):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import vi'],
+            cwd=tempfile.gettempdir(), env={**os.environ, 'PYTHONPATH': repo_dir},
+            capture_output=True, text=True, check=True
+        )
+        for line in completed.stderr.splitlines():
+            if not line.startswith('import time:') or '|' not in line:
+                continue
+            parts = [part.strip() for part in line[len('import time:'):].split('|')]
+            if not parts[1].isdigit():
+                continue
+            name = parts[2]
+            if name == 'vi':
+                samples.append(int(parts[1]) / 1000)
+            elif name.split('.')[0] in LAZY_MODULES:
+                eager.add(name.split('.')[0])
+    samples.sort()
+    median_ms = samples[len(samples) // 2]
+    return {
+        'import_ms_median': round(median_ms, 1),
+        'import_ms_max': round(samples[-1], 1),
+        'budget_ms': budget_ms,
+        'eager_heavy_modules': sorted(eager),
+        'ok': median_ms <= budget_ms and not eager,
+    }
+
+
+def percentile(values, fraction):
+    # En yakın sıra yöntemi; boş listede None
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux kilobayt, macOS bayt döner
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _scenario_report(items, total_bytes, elapsed, latencies_ms, errors):
+    return {
+        'items': items,
+        'seconds': round(elapsed, 3),
+        'items_per_sec': _rate(items, elapsed),
+        'mb_per_sec': round(total_bytes / elapsed / 1e6, 2) if total_bytes is not None else None,
+        'latency_ms_p50': round(percentile(latencies_ms, 0.50), 2) if latencies_ms else None,
+        'latency_ms_p99': round(percentile(latencies_ms, 0.99), 2) if latencies_ms else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'errors': errors,
+    }
+
+
+def _run_downloader(downloader, tracker):
+    # Arayüzsüz çalıştırma (run_cli ile aynı): run() bu thread'de, sinyaller doğrudan
+    errors = []
+    downloader.download_error.connect(errors.append, Qt.DirectConnection)
+    start = time.perf_counter()
+    downloader.run()
+    elapsed = time.perf_counter() - start
+    tracker.flush()
+    rows = tracker.get_connection().execute(
+        "SELECT ttfb_ms + transfer_ms + db_ms, bytes FROM download_metrics WHERE status = 'ok'"
+    ).fetchall()
+    latencies = [row[0] for row in rows]
+    return _scenario_report(len(rows), sum(row[1] for row in rows), elapsed, latencies, errors[:5])
+
+
+def scenario_instagram(base_url, workdir, items, workers):
+    tracker = get_media_tracker()
+    downloader = InstagramDownloaderThread(
+        hashtag='bench', download_path=os.path.join(workdir, 'media'), limit=items,
+        username='bench', password='bench', max_workers=workers)
+    downloader.client = StubInstagramClient(base_url)
+    return _run_downloader(downloader, tracker)
+
+
+def scenario_tiktok(base_url, workdir, items, workers):
+    tracker = get_media_tracker()
+    downloader = TikTokDownloaderThread(
+        keyword='bench', download_path=os.path.join(workdir, 'media'), limit=items, max_workers=workers)
+    downloader.base_url = base_url
+    return _run_downloader(downloader, tracker)
+
+
+def scenario_tracker(items):
+    tracker = get_media_tracker()
+    latencies = []
+    start = time.perf_counter()
+    for item in _media_items(items):
+        began = time.perf_counter()
+        if not tracker.is_media_downloaded(item['media_id'], item['media_url']):
+            tracker.add_media(**item)
+        latencies.append((time.perf_counter() - began) * 1000)
+    return _scenario_report(items, None, time.perf_counter() - start, latencies, [])
+
+
+SCENARIOS = ('tracker', 'instagram', 'tiktok')
+
+
+def run_scenario(name, items, workers, photo_size, video_size):
+    # Her senaryo temiz bir çalışma klasöründe (downloads.db, sessions/) çalışır;
+    # sunucu ayrı süreçte olduğundan tepe RSS yalnızca istemciyi ölçer
+    workdir = tempfile.mkdtemp(prefix=f'bench_{name}_')
+    previous_dir = os.getcwd()
+    server_process = None
+    try:
+        os.chdir(workdir)
+        os.makedirs('media')
+        scheduler = get_request_scheduler()
+        scheduler.default_rate = 1e9
+        scheduler.default_burst = 10 ** 9
+        if name == 'tracker':
+            return scenario_tracker(items)
+        server_process, port = start_server_process(
+            StandInHandler, total_items=items, photo_size=photo_size, video_size=video_size)
+        base_url = f"http://127.0.0.1:{port}"
+        if name == 'instagram':
+            return scenario_instagram(base_url, workdir, items, workers)
+        return scenario_tiktok(base_url, workdir, items, workers)
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare_results(results, baseline, tolerance):
+    # items/s düşüşü veya p99 artışı tolerance oranını aşarsa gerileme sayılır
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        if previous.get('items_per_sec') and current['items_per_sec'] < previous['items_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: items/s {previous['items_per_sec']} -> {current['items_per_sec']}")
+        if previous.get('latency_ms_p99') and current['latency_ms_p99'] is not None \
+                and current['latency_ms_p99'] > previous['latency_ms_p99'] * (1 + tolerance):
+            regressions.append(f"{name}: p99 {previous['latency_ms_p99']} ms -> {current['latency_ms_p99']} ms")
+    return regressions
+
+
+def bench_suite(scenarios, items, workers, photo_size, video_size, output, baseline, tolerance):
+    # Her senaryo ayrı bir Python sürecinde çalışır; tepe RSS birbirine karışmaz
+    results = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'items': items, 'workers': workers, 'photo_size': photo_size, 'video_size': video_size},
+        'scenarios': {},
+    }
+    for name in scenarios:
+        completed = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), 'scenario', name, '--items', str(items),
+             '--workers', str(workers), '--photo-size', str(photo_size), '--video-size', str(video_size)],
+            capture_output=True, text=True, check=True
+        )
+        results['scenarios'][name] = json.loads(completed.stdout)
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            results['regressions'] = compare_results(results, json.load(f), tolerance)
+        results['ok'] = not results['regressions']
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sosyal medya indirici performans ölçümleri')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    tracker_parser = subparsers.add_parser('tracker', help='SQLiteMediaTracker ekleme/sorgu hızı')
+    tracker_parser.add_argument('--rows', type=int, default=5000)
+
+    schema_parser = subparsers.add_parser('schema', help='Eski ve yeni veritabanı şeması boyut/sorgu hızı')
+    schema_parser.add_argument('--rows', type=int, default=100000)
+
+    engine_parser = subparsers.add_parser('engine', help='DownloadEngine ile yerel sunucudan indirme')
+    engine_parser.add_argument('--files', type=int, default=200)
+    engine_parser.add_argument('--size', type=int, default=256 * 1024)
+    engine_parser.add_argument('--connections', type=int, default=16)
+
+    write_parser = subparsers.add_parser('write', help='Büyük dosya yazma yolunun GB başına CPU süresi')
+    write_parser.add_argument('--files', type=int, default=4)
+    write_parser.add_argument('--size', type=int, default=64 * 1024 * 1024)
+    write_parser.add_argument('--rounds', type=int, default=3)
+
+    suite_parser = subparsers.add_parser('suite', help='Yerel Instagram/TikTok sunucusuyla uçtan uca ölçüm')
+    suite_parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    suite_parser.add_argument('--output', default='bench_results.json', help='Sonuçların yazılacağı JSON')
+    suite_parser.add_argument('--baseline', help='Karşılaştırılacak önceki sonuç JSON dosyası')
+    suite_parser.add_argument('--tolerance', type=float, default=0.10)
+
+    scenario_parser = subparsers.add_parser('scenario', help='Tek senaryo (suite tarafından çağrılır)')
+    scenario_parser.add_argument('name', choices=SCENARIOS)
+
+    for sub_parser in (suite_parser, scenario_parser):
+        sub_parser.add_argument('--items', type=int, default=200)
+        sub_parser.add_argument('--workers', type=int, default=8)
+        sub_parser.add_argument('--photo-size', type=int, default=200 * 1024)
+        sub_parser.add_argument('--video-size', type=int, default=2 * 1024 * 1024)
+
+    startup_parser = subparsers.add_parser('startup', help='vi modülü yükleme süresi bütçesi')
+    startup_parser.add_argument('--budget-ms', type=float, default=200)
+    startup_parser.add_argument('--runs', type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == 'tracker':
+        results = bench_tracker(args.rows)
+    elif args.command == 'schema':
+        results = bench_schema(args.rows)
+    elif args.command == 'engine':
+        results = bench_engine(args.files, args.size, args.connections)
+    elif args.command == 'write':
+        results = bench_write(args.files, args.size, args.rounds)
+    elif args.command == 'suite':
+        results = bench_suite(args.scenarios, args.items, args.workers, args.photo_size, args.video_size,
+                              args.output, args.baseline, args.tolerance)
+    elif args.command == 'scenario':
+        results = run_scenario(args.name, args.items, args.workers, args.photo_size, args.video_size)
+    elif args.command == 'startup':
+        results = bench_startup(args.budget_ms, args.runs)
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if not results.get('ok', True):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,573 @@
+import os
+import json
+import time
+import logging
+from collections import deque
+from datetime import datetime
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit,
+                             QPushButton, QLabel, QProgressBar, QPlainTextEdit, QFileDialog,
+                             QMessageBox, QCheckBox, QComboBox, QTabWidget, QSpinBox,
+                             QListWidget, QDoubleSpinBox)
+# Arayüz yalnızca vi.main() tarafından, arayüz açılırken yüklenir; komut satırı modu,
+# kuyruk çalıştırıcısı ve indirici thread'leri QtWidgets'a ihtiyaç duymaz
+from vi import (JOB_STATE_LABELS, NEAR_DUPLICATE_MODES, PLATFORM_CODES, STORAGE_LAYOUTS,
+                create_downloader, get_bandwidth_limiter, get_download_engine,
+                get_media_tracker, split_queries, start_metrics_server)
+
+LOG_MAX_BLOCKS = 5000
+UI_REFRESH_MS = 100
+THROUGHPUT_WINDOW = 5.0
+
+
+def format_eta(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+class SocialMediaDownloaderGUI(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.media_tracker = get_media_tracker()
+        self.initUI()
+        self.engine = get_download_engine()
+        self.running_jobs = {}
+        self.queue_active = False
+        self.session_jobs = []
+        self.last_download_path = ""
+        self.metrics_port = None
+        self.load_last_path()
+        self.restore_job_queue()
+        self.start_metrics_endpoint()
+
+    def initUI(self):
+        self.setWindowTitle('Sosyal Medya İndirici')
+        self.setGeometry(100, 100, 800, 600)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+
+        # Platform seçimi
+        platform_layout = QHBoxLayout()
+        self.platform_combo = QComboBox()
+        self.platform_combo.addItems(['Instagram', 'TikTok'])
+        self.platform_combo.currentTextChanged.connect(self.on_platform_change)
+        platform_layout.addWidget(QLabel('Platform:'))
+        platform_layout.addWidget(self.platform_combo)
+        layout.addLayout(platform_layout)
+
+        # Tab widget
+        self.tab_widget = QTabWidget()
+        self.instagram_tab = QWidget()
+        self.tiktok_tab = QWidget()
+        self.setup_instagram_tab()
+        self.setup_tiktok_tab()
+        self.tab_widget.addTab(self.instagram_tab, "Instagram")
+        self.tab_widget.addTab(self.tiktok_tab, "TikTok")
+        layout.addWidget(self.tab_widget)
+
+        # Kayıt yeri seçimi
+        path_layout = QHBoxLayout()
+        self.path_input = QLineEdit()
+        self.path_input.setReadOnly(True)
+        self.path_button = QPushButton('Kayıt Yeri Seç')
+        self.path_button.clicked.connect(self.select_download_path)
+        self.layout_combo = QComboBox()
+        for storage_layout, label in STORAGE_LAYOUTS.items():
+            self.layout_combo.addItem(label, storage_layout)
+        path_layout.addWidget(self.path_input)
+        path_layout.addWidget(self.layout_combo)
+        path_layout.addWidget(self.path_button)
+        layout.addLayout(path_layout)
+
+        # Butonlar
+        button_layout = QHBoxLayout()
+        self.download_button = QPushButton('İndirmeyi Başlat')
+        self.download_button.clicked.connect(self.start_download)
+        button_layout.addWidget(self.download_button)
+
+        self.stop_button = QPushButton('İndirmeyi Durdur')
+        self.stop_button.clicked.connect(self.stop_download)
+        self.stop_button.setEnabled(False)
+        button_layout.addWidget(self.stop_button)
+        layout.addLayout(button_layout)
+
+        # İş kuyruğu
+        queue_layout = QHBoxLayout()
+        self.enqueue_button = QPushButton('Kuyruğa Ekle')
+        self.enqueue_button.clicked.connect(self.add_to_queue)
+        queue_layout.addWidget(self.enqueue_button)
+        self.max_jobs_input = QSpinBox()
+        self.max_jobs_input.setRange(1, 8)
+        self.max_jobs_input.setValue(2)
+        self.max_jobs_input.valueChanged.connect(lambda value: self.schedule_jobs())
+        queue_layout.addWidget(QLabel('Eşzamanlı İş:'))
+        queue_layout.addWidget(self.max_jobs_input)
+        layout.addLayout(queue_layout)
+
+        # Bant genişliği sınırı (MB/s); değişiklik süren indirmelere hemen uygulanır
+        bandwidth_layout = QHBoxLayout()
+        bandwidth_layout.addWidget(QLabel('Bant Genişliği (MB/s):'))
+        limits = self.media_tracker.get_bandwidth_limits() or {}
+        self.bandwidth_inputs = {}
+        for scope, label in [('*', 'Toplam')] + [(platform, platform.capitalize()) for platform in PLATFORM_CODES]:
+            spin = QDoubleSpinBox()
+            spin.setRange(0, 10000)
+            spin.setDecimals(1)
+            spin.setSpecialValueText('Sınırsız')
+            spin.setValue(limits.get(scope, 0) / 1e6)
+            spin.valueChanged.connect(lambda value: self.update_bandwidth_limits())
+            self.bandwidth_inputs[scope] = spin
+            bandwidth_layout.addWidget(QLabel(f'{label}:'))
+            bandwidth_layout.addWidget(spin)
+        layout.addLayout(bandwidth_layout)
+
+        self.job_list = QListWidget()
+        self.job_list.setMaximumHeight(120)
+        layout.addWidget(self.job_list)
+
+        # İlerleme çubuğu
+        self.progress_bar = QProgressBar()
+        layout.addWidget(self.progress_bar)
+
+        # Log alanı; en fazla LOG_MAX_BLOCKS satır tutulur, eskiler silinir
+        self.log_text = QPlainTextEdit()
+        self.log_text.setReadOnly(True)
+        self.log_text.setMaximumBlockCount(LOG_MAX_BLOCKS)
+        layout.addWidget(self.log_text)
+
+        self.statusBar().showMessage('Hazır')
+
+        # Log satırları ve ilerleme tamponda birikir, saniyede 10 kez ekrana basılır
+        self.pending_log = deque(maxlen=LOG_MAX_BLOCKS)
+        self.job_progress = {}
+        self.throughput_samples = deque()
+        self.ui_timer = QTimer(self)
+        self.ui_timer.setInterval(UI_REFRESH_MS)
+        self.ui_timer.timeout.connect(self.refresh_ui)
+        self.ui_timer.start()
+
+    def setup_instagram_tab(self):
+        layout = QVBoxLayout(self.instagram_tab)
+
+        # Instagram kullanıcı girişi
+        login_group = QVBoxLayout()
+
+        username_layout = QHBoxLayout()
+        self.instagram_username_input = QLineEdit()
+        self.instagram_username_input.setPlaceholderText('Instagram kullanıcı adı')
+        username_layout.addWidget(QLabel('Kullanıcı Adı:'))
+        username_layout.addWidget(self.instagram_username_input)
+        login_group.addLayout(username_layout)
+
+        password_layout = QHBoxLayout()
+        self.instagram_password_input = QLineEdit()
+        self.instagram_password_input.setPlaceholderText('Instagram şifresi')
+        self.instagram_password_input.setEchoMode(QLineEdit.Password)
+        password_layout.addWidget(QLabel('Şifre:'))
+        password_layout.addWidget(self.instagram_password_input)
+        login_group.addLayout(password_layout)
+
+        layout.addLayout(login_group)
+
+        # Medya türü seçimi
+        media_type_layout = QHBoxLayout()
+        self.photo_checkbox = QCheckBox('Fotoğrafları İndir')
+        self.video_checkbox = QCheckBox('Videoları İndir')
+        self.photo_checkbox.setChecked(True)
+        self.video_checkbox.setChecked(True)
+        media_type_layout.addWidget(self.photo_checkbox)
+        media_type_layout.addWidget(self.video_checkbox)
+        self.near_duplicates_combo = QComboBox()
+        for mode, label in NEAR_DUPLICATE_MODES.items():
+            self.near_duplicates_combo.addItem(label, mode)
+        media_type_layout.addWidget(QLabel('Benzer Fotoğraflar:'))
+        media_type_layout.addWidget(self.near_duplicates_combo)
+        layout.addLayout(media_type_layout)
+
+        # Hashtag girişi
+        hashtag_layout = QHBoxLayout()
+        self.instagram_hashtag_input = QLineEdit()
+        self.instagram_hashtag_input.setPlaceholderText('Hashtag girin (# olmadan, birden fazlası için virgül)')
+        hashtag_layout.addWidget(QLabel('Hashtag:'))
+        hashtag_layout.addWidget(self.instagram_hashtag_input)
+        layout.addLayout(hashtag_layout)
+
+        # Limit girişi
+        limit_layout = QHBoxLayout()
+        self.instagram_limit_input = QLineEdit()
+        self.instagram_limit_input.setPlaceholderText('Boş bırakın veya sayı girin')
+        limit_layout.addWidget(QLabel('Medya Limiti:'))
+        limit_layout.addWidget(self.instagram_limit_input)
+        layout.addLayout(limit_layout)
+
+        # Eşzamanlı indirme sayısı
+        workers_layout = QHBoxLayout()
+        self.instagram_workers_input = QSpinBox()
+        self.instagram_workers_input.setRange(1, 16)
+        self.instagram_workers_input.setValue(4)
+        workers_layout.addWidget(QLabel('Eşzamanlı İndirme:'))
+        workers_layout.addWidget(self.instagram_workers_input)
+        layout.addLayout(workers_layout)
+
+        layout.addStretch()
+
+    def setup_tiktok_tab(self):
+        layout = QVBoxLayout(self.tiktok_tab)
+
+        # Arama kelimesi girişi
+        keyword_layout = QHBoxLayout()
+        self.tiktok_keyword_input = QLineEdit()
+        self.tiktok_keyword_input.setPlaceholderText('Arama kelimesi veya hashtag girin (virgülle ayırın)')
+        keyword_layout.addWidget(QLabel('Arama:'))
+        keyword_layout.addWidget(self.tiktok_keyword_input)
+        layout.addLayout(keyword_layout)
+
+        # Limit girişi
+        limit_layout = QHBoxLayout()
+        self.tiktok_limit_input = QLineEdit()
+        self.tiktok_limit_input.setPlaceholderText('Boş bırakın veya sayı girin')
+        limit_layout.addWidget(QLabel('Video Limiti:'))
+        limit_layout.addWidget(self.tiktok_limit_input)
+        layout.addLayout(limit_layout)
+
+        # Bilgi etiketi
+        info_label = QLabel("Not: TikTok aramalarında hashtag için '#' kullanabilirsiniz.")
+        info_label.setStyleSheet("color: gray;")
+        layout.addWidget(info_label)
+
+        layout.addStretch()
+
+    def on_platform_change(self, platform):
+        self.tab_widget.setCurrentIndex(0 if platform == 'Instagram' else 1)
+
+    def load_last_path(self):
+        try:
+            if os.path.exists('settings.json'):
+                with open('settings.json', 'r', encoding='utf-8') as f:
+                    settings = json.load(f)
+                    last_path = settings.get('last_download_path', '')
+                    if os.path.exists(last_path):
+                        self.last_download_path = last_path
+                        self.path_input.setText(last_path)
+                    self.metrics_port = settings.get('metrics_port')
+                    # "min_free_space": diskte bırakılacak en az boş alan (bayt)
+                    if settings.get('min_free_space') is not None:
+                        self.engine.min_free_bytes = int(settings['min_free_space'])
+                    index = self.layout_combo.findData(settings.get('storage_layout', 'flat'))
+                    if index >= 0:
+                        self.layout_combo.setCurrentIndex(index)
+        except Exception as e:
+            logging.error(f"Ayarları yükleme hatası: {e}")
+        self.layout_combo.currentIndexChanged.connect(self.save_last_path)
+
+    def save_last_path(self):
+        try:
+            settings = {}
+            if os.path.exists('settings.json'):
+                with open('settings.json', 'r', encoding='utf-8') as f:
+                    settings = json.load(f)
+            settings['last_download_path'] = self.last_download_path
+            settings['storage_layout'] = self.layout_combo.currentData()
+            with open('settings.json', 'w', encoding='utf-8') as f:
+                json.dump(settings, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logging.error(f"Ayarları kaydetme hatası: {e}")
+
+    def update_bandwidth_limits(self):
+        # Diğer süreçler (CLI) ayarı veritabanından okur
+        limits = {scope: int(spin.value() * 1e6) for scope, spin in self.bandwidth_inputs.items()}
+        self.media_tracker.set_bandwidth_limits(limits)
+        get_bandwidth_limiter().configure(limits)
+
+    def start_metrics_endpoint(self):
+        # settings.json içinde "metrics_port" varsa Prometheus ölçümleri yayınlanır
+        if self.metrics_port is None:
+            return
+        try:
+            server = start_metrics_server(int(self.metrics_port))
+            self.log_message(f"Ölçümler: http://127.0.0.1:{server.server_address[1]}/metrics")
+        except Exception as e:
+            self.log_message(f"Ölçüm sunucusu başlatılamadı: {e}")
+
+    def select_download_path(self):
+        folder = QFileDialog.getExistingDirectory(
+            self, 
+            'İndirme Klasörünü Seç',
+            self.last_download_path or os.path.expanduser('~')
+        )
+        if folder:
+            self.last_download_path = folder
+            self.path_input.setText(folder)
+            self.save_last_path()
+
+    def log_message(self, message):
+        timestamp = datetime.now().strftime('%H:%M:%S')
+        self.pending_log.append(f"[{timestamp}] {message}")
+        logging.info(message)
+
+    def refresh_ui(self):
+        if self.pending_log:
+            self.log_text.appendPlainText('\n'.join(self.pending_log))
+            self.pending_log.clear()
+        if self.job_progress:
+            self.progress_bar.setValue(sum(self.job_progress.values()) // len(self.job_progress))
+        if self.queue_active:
+            self.update_throughput()
+
+    def update_throughput(self):
+        # Son THROUGHPUT_WINDOW saniyedeki motor sayaçlarından MB/s, öğe/sn ve ETA
+        now = time.monotonic()
+        samples = self.throughput_samples
+        samples.append((now, self.engine.bytes_received, self.engine.files_completed))
+        while now - samples[0][0] > THROUGHPUT_WINDOW:
+            samples.popleft()
+        elapsed = now - samples[0][0]
+        if elapsed < 1.0:
+            return
+        mb_per_sec = (samples[-1][1] - samples[0][1]) / elapsed / 1e6
+        items_per_sec = (samples[-1][2] - samples[0][2]) / elapsed
+        status = f"İndiriliyor | {mb_per_sec:.1f} MB/s | {items_per_sec:.1f} öğe/sn"
+        remaining = sum(max(0, (entry['thread'].limit or 20) - entry['thread'].downloaded_count)
+                        for entry in self.running_jobs.values())
+        if items_per_sec > 0 and remaining:
+            status += f" | Kalan: {format_eta(remaining / items_per_sec)}"
+        self.statusBar().showMessage(status)
+
+    def validate_inputs(self):
+        if not self.path_input.text().strip():
+            QMessageBox.warning(self, 'Hata', 'İndirme klasörü seçilmelidir.')
+            return False
+
+        current_platform = self.platform_combo.currentText()
+
+        if current_platform == 'Instagram':
+            if not self.instagram_username_input.text().strip():
+                QMessageBox.warning(self, 'Hata', 'Instagram kullanıcı adı gereklidir.')
+                return False
+
+            if not self.instagram_password_input.text().strip():
+                QMessageBox.warning(self, 'Hata', 'Instagram şifresi gereklidir.')
+                return False
+
+            if not self.instagram_hashtag_input.text().strip():
+                QMessageBox.warning(self, 'Hata', 'Instagram hashtag gereklidir.')
+                return False
+
+            if not self.photo_checkbox.isChecked() and not self.video_checkbox.isChecked():
+                QMessageBox.warning(self, 'Hata', 'En az bir medya türü seçilmelidir.')
+                return False
+
+        elif current_platform == 'TikTok':
+            if not self.tiktok_keyword_input.text().strip():
+                QMessageBox.warning(self, 'Hata', 'TikTok arama kelimesi gereklidir.')
+                return False
+
+        return True
+
+    def current_query_input(self):
+        if self.platform_combo.currentText() == 'Instagram':
+            return self.instagram_hashtag_input
+        return self.tiktok_keyword_input
+
+    def enqueue_inputs(self):
+        # Formdaki her hashtag/arama kelimesi ayrı bir iş olarak kuyruğa yazılır
+        if not self.validate_inputs():
+            return 0
+
+        current_platform = self.platform_combo.currentText()
+        download_path = self.path_input.text().strip()
+
+        if current_platform == 'Instagram':
+            limit_text = self.instagram_limit_input.text().strip()
+            options = {
+                'username': self.instagram_username_input.text().strip(),
+                'photos': self.photo_checkbox.isChecked(),
+                'videos': self.video_checkbox.isChecked(),
+                'workers': self.instagram_workers_input.value(),
+                'near_duplicates': self.near_duplicates_combo.currentData(),
+            }
+        else:  # TikTok
+            limit_text = self.tiktok_limit_input.text().strip()
+            options = {}
+        options['layout'] = self.layout_combo.currentData()
+
+        try:
+            limit = int(limit_text) if limit_text else None
+            if limit is not None and limit <= 0:
+                raise ValueError("Limit pozitif olmalıdır")
+        except ValueError as e:
+            QMessageBox.warning(self, 'Hata', f'Geçersiz limit: {str(e)}')
+            return 0
+        options['limit'] = limit
+
+        query_input = self.current_query_input()
+        added = 0
+        for query in split_queries(query_input.text()):
+            if self.media_tracker.add_job(current_platform.lower(), query, download_path, options):
+                added += 1
+        if added:
+            query_input.clear()
+            self.log_message(f"{added} iş kuyruğa eklendi.")
+        self.refresh_job_list()
+        return added
+
+    def add_to_queue(self):
+        if self.enqueue_inputs() and self.queue_active:
+            self.schedule_jobs()
+
+    def restore_job_queue(self):
+        restored = self.media_tracker.requeue_running_jobs()
+        pending = len(self.media_tracker.list_jobs(('pending',)))
+        self.refresh_job_list()
+        if pending:
+            self.log_message(
+                f"Kuyrukta bekleyen {pending} iş var"
+                + (f" ({restored} tanesi yarıda kalmıştı)" if restored else "")
+                + ". Devam etmek için İndirmeyi Başlat'a basın."
+            )
+
+    def refresh_job_list(self):
+        self.job_list.clear()
+        for job in self.media_tracker.list_jobs():
+            self.job_list.addItem(
+                f"#{job['id']} [{JOB_STATE_LABELS.get(job['state'], job['state'])}] "
+                f"{job['platform']}: {job['query']}"
+            )
+        self.job_list.scrollToBottom()
+
+    def start_download(self):
+        if self.current_query_input().text().strip():
+            if not self.enqueue_inputs():
+                return
+        elif not self.media_tracker.list_jobs(('pending',)):
+            QMessageBox.warning(self, 'Hata', 'Kuyrukta bekleyen iş yok.')
+            return
+
+        pending = self.media_tracker.list_jobs(('pending',))
+        if (any(job['platform'] == 'instagram' for job in pending)
+                and not self.instagram_password_input.text().strip()):
+            QMessageBox.warning(self, 'Hata', 'Instagram işleri için şifre gereklidir.')
+            return
+
+        if not self.running_jobs:
+            self.session_jobs = []
+            self.progress_bar.setValue(0)
+            self.log_text.clear()
+        self.queue_active = True
+        self.throughput_samples.clear()
+        self.stop_button.setEnabled(True)
+        self.statusBar().showMessage('İndiriliyor')
+        self.schedule_jobs()
+
+    def schedule_jobs(self):
+        # Eşzamanlı iş sınırı dolana kadar kuyruktan iş alınıp başlatılır
+        while self.queue_active and len(self.running_jobs) < self.max_jobs_input.value():
+            job = self.media_tracker.claim_next_job()
+            if job is None:
+                break
+            self.start_job(job)
+        self.refresh_job_list()
+        if self.queue_active and not self.running_jobs:
+            self.queue_finished()
+
+    def start_job(self, job):
+        job_id = job['id']
+        label = f"{job['platform']}:{job['query']}"
+        thread = create_downloader(
+            job,
+            username=self.instagram_username_input.text().strip(),
+            password=self.instagram_password_input.text().strip()
+        )
+        entry = {'thread': thread, 'result': None, 'error': None, 'stopped': False}
+        self.running_jobs[job_id] = entry
+        self.session_jobs.append(job_id)
+
+        thread.progress_updated.connect(lambda message, label=label: self.log_message(f"[{label}] {message}"))
+        thread.download_error.connect(lambda message, job_id=job_id, label=label:
+                                      self.job_error(job_id, label, message))
+        thread.download_complete.connect(lambda message, job_id=job_id, label=label:
+                                         self.job_completed(job_id, label, message))
+        thread.progress_count.connect(lambda value, job_id=job_id: self.set_job_progress(job_id, value))
+        thread.finished.connect(lambda job_id=job_id: self.job_finished(job_id))
+        self.log_message(f"[{label}] İş başlatılıyor...")
+        thread.start()
+
+    def set_job_progress(self, job_id, value):
+        if job_id in self.running_jobs:
+            self.job_progress[job_id] = value
+
+    def job_error(self, job_id, label, message):
+        entry = self.running_jobs.get(job_id)
+        if entry is not None:
+            entry['error'] = message
+        self.log_message(f"[{label}] {message}")
+
+    def job_completed(self, job_id, label, message):
+        entry = self.running_jobs.get(job_id)
+        if entry is not None:
+            entry['result'] = message
+        self.log_message(f"[{label}] {message}")
+
+    def job_finished(self, job_id):
+        entry = self.running_jobs.pop(job_id, None)
+        self.job_progress.pop(job_id, None)
+        if entry is None:
+            return
+        if entry['stopped']:
+            self.media_tracker.finish_job(job_id, 'pending')
+        elif entry['result'] is not None:
+            self.media_tracker.finish_job(job_id, 'done', entry['result'])
+        else:
+            self.media_tracker.finish_job(job_id, 'failed', entry['error'])
+        self.schedule_jobs()
+
+    def queue_finished(self):
+        self.queue_active = False
+        self.stop_button.setEnabled(False)
+        self.statusBar().showMessage('İndirme tamamlandı')
+        self.refresh_ui()
+        jobs = {job['id']: job for job in self.media_tracker.list_jobs(('done', 'failed'))}
+        finished = [jobs[job_id] for job_id in self.session_jobs if job_id in jobs]
+        if not finished:
+            return
+        self.progress_bar.setValue(100)
+        if len(finished) == 1 and finished[0]['state'] == 'done':
+            message = finished[0]['result']
+        else:
+            done = sum(1 for job in finished if job['state'] == 'done')
+            message = (
+                f"Kuyruk tamamlandı!\n"
+                f"Başarılı iş: {done}\n"
+                f"Başarısız iş: {len(finished) - done}"
+            )
+        QMessageBox.information(self, 'Tamamlandı', message)
+
+    def stop_download(self):
+        # Durdurulan işler kuyruğa geri döner, sonraki başlatmada devam eder
+        self.queue_active = False
+        if self.running_jobs:
+            for entry in self.running_jobs.values():
+                entry['stopped'] = True
+                entry['thread'].stop()
+            self.log_message("İndirme durduruldu...")
+        self.stop_button.setEnabled(False)
+        self.statusBar().showMessage('Durduruldu')
+
+    def closeEvent(self, event):
+        if self.running_jobs:
+            reply = QMessageBox.question(
+                self, 'Çıkış',
+                'İndirme işlemi devam ediyor. Çıkmak istediğinizden emin misiniz?',
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if reply == QMessageBox.Yes:
+                self.stop_download()
+                event.accept()
+            else:
+                event.ignore()
+        else:
+            event.accept()
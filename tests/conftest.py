@@ -0,0 +1,23 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# vi içe aktarılırken log dosyasını çalışma dizininde açar; depo köküne yazılmasın diye
+# içe aktarma geçici bir dizinde yapılır
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix='vi-tests-'))
+try:
+    import vi  # noqa: E402
+finally:
+    os.chdir(_cwd)
+
+
+@pytest.fixture
+def tracker(tmp_path):
+    tracker = vi.SQLiteMediaTracker(str(tmp_path / 'downloads.db'))
+    yield tracker
+    tracker.close()
@@ -0,0 +1,31 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import vi
+
+
+def test_refresh_reads_stored_limits_off_the_calling_thread(tracker):
+    assert tracker.set_bandwidth_limits({'*': 5_000_000, 'tiktok': 1_000_000})
+    readers = []
+    read_limits = tracker.get_bandwidth_limits
+
+    def get_bandwidth_limits():
+        readers.append(threading.current_thread())
+        return read_limits()
+
+    tracker.get_bandwidth_limits = get_bandwidth_limits
+    limiter = vi.BandwidthLimiter(tracker=tracker, refresh_interval=60)
+    with ThreadPoolExecutor(1) as executor:
+        limiter.refresh(executor)
+        # Aralık dolmadan tekrar okunmaz
+        limiter.refresh(executor)
+    assert limiter.limits() == {'*': 5_000_000, 'tiktok': 1_000_000}
+    assert limiter.enabled
+    assert len(readers) == 1 and readers[0] is not threading.current_thread()
+
+
+def test_refresh_without_tracker_keeps_configured_limits():
+    limiter = vi.BandwidthLimiter({'*': 1000})
+    with ThreadPoolExecutor(1) as executor:
+        limiter.refresh(executor)
+    assert limiter.limits() == {'*': 1000}
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+import bench
+import vi
+
+
+@pytest.fixture
+def server():
+    process, port = bench.start_server_process(bench.StandInHandler, total_items=6, video_size=100_000)
+    yield f"http://127.0.0.1:{port}"
+    process.terminate()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch, server):
+    # Kuyruk, motor ve zamanlayıcı bu test için ayrı kurulur; TikTok yerine yerel sunucu
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vi, 'TIKTOK_URL', server)
+    monkeypatch.setattr(vi, '_media_trackers', {})
+    monkeypatch.setattr(vi, '_request_scheduler', vi.RequestScheduler())
+    monkeypatch.setattr(vi, '_bandwidth_limiter', None)
+    engine = vi.DownloadEngine(scheduler=vi.get_request_scheduler())
+    monkeypatch.setattr(vi, '_download_engine', engine)
+    yield tmp_path
+    engine.close()
+    vi.get_media_tracker().close()
+
+
+def test_disk_floor_fails_queue_job_instead_of_completing(workdir):
+    tracker = vi.get_media_tracker()
+    job_id = tracker.add_job('tiktok', 'kedi', str(workdir / 'media'), {'limit': 6})
+
+    # Alt sınır diskten büyük: ilk aktarımda indirme durdurulur
+    assert vi.run_cli(['queue', 'run', '--rate', '1000', '--burst', '1000',
+                       '--min-free', '1000000000G']) == 1
+
+    job, = tracker.list_jobs()
+    assert job['id'] == job_id
+    assert job['state'] == 'failed'
+    assert job['result'].startswith('Yetersiz disk alanı')
+    assert 'İndirme durduruldu' in job['result']
+    assert not [name for name in os.listdir(workdir / 'media') if not name.endswith('.part')]
+
+
+def test_disk_floor_run_reports_error_not_completion(workdir):
+    downloader = vi.TikTokDownloaderThread('kedi', str(workdir / 'media'), limit=6)
+    downloader.engine.min_free_bytes = 1 << 62
+    downloader.scheduler.default_rate = 1e9
+    downloader.scheduler.default_burst = 10 ** 9
+    completed, errors = [], []
+    downloader.download_complete.connect(completed.append, vi.Qt.DirectConnection)
+    downloader.download_error.connect(errors.append, vi.Qt.DirectConnection)
+    os.makedirs(downloader.download_path)
+    downloader.run()
+
+    assert completed == []
+    assert errors[-1].startswith('Yetersiz disk alanı')
+    assert downloader.halted is not None
@@ -0,0 +1,88 @@
+import socket
+import subprocess
+import sys
+import time
+
+import bench
+import vi
+
+
+def _running_job(tracker, owner, lease_expires):
+    job_id = tracker.add_job('tiktok', f"{owner}-{lease_expires}", '/tmp')
+    with tracker.get_connection() as conn:
+        conn.execute("UPDATE download_jobs SET state = 'running', owner = ?, lease_expires = ? WHERE id = ?",
+                     (owner, lease_expires, job_id))
+    return job_id
+
+
+def _job_row(tracker, job_id):
+    return tracker.get_connection().execute(
+        'SELECT state, owner, lease_expires FROM download_jobs WHERE id = ?', (job_id,)).fetchone()
+
+
+def test_requeue_only_takes_jobs_without_a_live_lease(tracker):
+    # Bu makinede çıkmış bir sürecin pid'i
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    host = socket.gethostname()
+    later = time.time() + 60
+    live = _running_job(tracker, 'other-host:1', later)
+    expired = _running_job(tracker, 'other-host:2', time.time() - 1)
+    dead = _running_job(tracker, f"{host}:{process.pid}", later)
+    unleased = _running_job(tracker, None, None)
+    own = _running_job(tracker, tracker.worker_id, time.time() - 1)
+
+    assert tracker.requeue_running_jobs() == 3
+    assert _job_row(tracker, live) == ('running', 'other-host:1', later)
+    assert _job_row(tracker, own)[0] == 'running'
+    for job_id in (expired, dead, unleased):
+        assert _job_row(tracker, job_id) == ('pending', None, None)
+
+
+def test_finish_job_clears_the_lease(tracker):
+    job_id = tracker.add_job('tiktok', 'kedi', '/tmp')
+    assert tracker.claim_next_job()['id'] == job_id
+    assert _job_row(tracker, job_id)[1] == tracker.worker_id
+    tracker.finish_job(job_id, 'done', 'ok')
+    assert _job_row(tracker, job_id) == ('done', None, None)
+
+
+def test_claim_media_reports_media_downloaded_elsewhere(tracker):
+    assert tracker.add_media('1', 'https://example.com/1.mp4', '/tmp/1.mp4', 'video', 'tiktok')
+    other = vi.SQLiteMediaTracker(tracker.db_path)
+    try:
+        assert other.claim_media('other-host:1:1', 'tiktok', ['2']) == ({'2'}, set())
+    finally:
+        other.close()
+    claimed, downloaded = tracker.claim_media(tracker.new_lease_owner(), 'tiktok', ['1', '2', '3'])
+    assert claimed == {'3'}
+    assert downloaded == {'1'}
+
+
+def test_iter_videos_claims_only_up_to_the_limit(tmp_path, monkeypatch):
+    process, port = bench.start_server_process(bench.StandInHandler, total_items=20, video_size=1000)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vi, 'TIKTOK_URL', f"http://127.0.0.1:{port}")
+    monkeypatch.setattr(vi, '_media_trackers', {})
+    monkeypatch.setattr(vi, '_request_scheduler', vi.RequestScheduler(default_rate=1e9, default_burst=10 ** 9))
+    monkeypatch.setattr(vi, '_bandwidth_limiter', None)
+    engine = vi.DownloadEngine(scheduler=vi.get_request_scheduler())
+    monkeypatch.setattr(vi, '_download_engine', engine)
+    tracker = vi.get_media_tracker()
+    try:
+        # Başka bir işçi sayfanın ilk videosunu kiralamış; yerine sıradaki denenir
+        other = vi.SQLiteMediaTracker(tracker.db_path)
+        assert other.claim_media('other-host:1:1', 'tiktok', ['0']) == ({'0'}, set())
+        downloader = vi.TikTokDownloaderThread('kedi', str(tmp_path), limit=2)
+        assert [video['id'] for video in downloader.iter_videos('kedi')] == ['1', '2']
+        assert downloader.busy_count == 1
+
+        # Limitin dışında kalan videolar ikinci işçiye açık kalır
+        ids = [str(i) for i in range(20)]
+        claimed, _ = other.claim_media('other-host:1:2', 'tiktok', ids)
+        assert claimed == set(ids) - {'0', '1', '2'}
+        other.close()
+    finally:
+        engine.close()
+        tracker.close()
+        process.terminate()
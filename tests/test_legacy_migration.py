@@ -0,0 +1,84 @@
+import calendar
+import hashlib
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import vi
+
+LEGACY_ROWS = [
+    ('i1', 'https://example.com/i1.jpg', '/media/i1.jpg', 'photo', 'instagram', 'kedi',
+     '2023-05-01 12:00:00', 'ab' * 32),
+    ('t1', 'https://example.com/t1.mp4', '/media/t1.mp4', 'video', 'tiktok', 'kopek',
+     '2022-01-02 03:04:05', None),
+    ('t2', 'https://example.com/t2.mp4', '/media/t2.mp4', 'video', 'tiktok', None,
+     '2021-12-31 23:59:59', 'cd' * 32),
+]
+
+
+def _seed_legacy_db(path, content_hash_column):
+    # Eski şema: satır başına id, URL'nin hex MD5'i ve metin zaman damgası
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('''
+            CREATE TABLE downloaded_media (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                media_id TEXT NOT NULL,
+                media_hash TEXT UNIQUE NOT NULL,
+                media_url TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                media_type TEXT NOT NULL,
+                platform TEXT NOT NULL,
+                hashtag TEXT,
+                downloaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        if content_hash_column:
+            conn.execute('ALTER TABLE downloaded_media ADD COLUMN content_hash TEXT')
+        for media_id, url, file_path, media_type, platform, hashtag, downloaded_at, content_hash in LEGACY_ROWS:
+            conn.execute('''
+                INSERT INTO downloaded_media
+                (media_id, media_hash, media_url, file_path, media_type, platform, hashtag, downloaded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (media_id, hashlib.md5(url.encode('utf-8')).hexdigest(), url, file_path, media_type,
+                  platform, hashtag, downloaded_at))
+            if content_hash_column:
+                conn.execute('UPDATE downloaded_media SET content_hash = ? WHERE media_id = ?',
+                             (content_hash, media_id))
+    conn.close()
+
+
+@pytest.mark.parametrize('content_hash_column', [True, False])
+@pytest.mark.parametrize('batch_size', [1, 1000])
+def test_legacy_rows_survive_migration(tmp_path, content_hash_column, batch_size):
+    path = str(tmp_path / 'downloads.db')
+    _seed_legacy_db(path, content_hash_column)
+
+    tracker = vi.SQLiteMediaTracker(path)
+    try:
+        assert tracker.legacy_table
+        # Taşınmadan önce de eski satırlar indirilmiş sayılır
+        assert tracker.is_media_downloaded('t1', LEGACY_ROWS[1][1], 'tiktok')
+        assert tracker.migrate_legacy_media(batch_size=batch_size) == len(LEGACY_ROWS)
+        assert not tracker.legacy_table
+    finally:
+        tracker.close()
+
+    tracker = vi.SQLiteMediaTracker(path)
+    try:
+        conn = tracker.get_connection()
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert 'downloaded_media' not in tables
+        rows = {row[1]: row for row in conn.execute(
+            'SELECT platform, media_id, url_hash, media_url, file_path, media_type, hashtag, '
+            'content_hash, downloaded_at FROM media')}
+        assert len(rows) == len(LEGACY_ROWS)
+        for media_id, url, file_path, media_type, platform, hashtag, downloaded_at, content_hash in LEGACY_ROWS:
+            expected_content = bytes.fromhex(content_hash) if content_hash and content_hash_column else None
+            timestamp = calendar.timegm(datetime.strptime(downloaded_at, '%Y-%m-%d %H:%M:%S').timetuple())
+            assert rows[media_id] == (vi.PLATFORM_CODES[platform], media_id, vi.url_digest(url), url,
+                                      file_path, media_type, hashtag, expected_content, timestamp)
+            assert tracker.is_media_downloaded(media_id, url, platform)
+    finally:
+        tracker.close()
@@ -0,0 +1,33 @@
+import vi
+
+
+def _observe(registry, transfer_time):
+    metrics = vi.DownloadMetrics('tiktok', 'x')
+    metrics.transfer_time = transfer_time
+    metrics.bytes = 1000
+    registry.observe(metrics)
+
+
+def _series(text):
+    return dict(line.rsplit(' ', 1) for line in text.splitlines() if not line.startswith('#'))
+
+
+def test_phase_histogram_stays_cumulative_after_the_window(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(vi.time, 'monotonic', lambda: clock[0])
+    registry = vi.MetricsRegistry(window=60)
+    _observe(registry, 0.2)
+    _observe(registry, 3.0)
+    before = _series(registry.render())
+    labels = 'platform="tiktok",phase="transfer"'
+    assert before[f'downloader_phase_seconds_bucket{{{labels},le="0.25"}}'] == '1'
+    assert before[f'downloader_phase_seconds_bucket{{{labels},le="5"}}'] == '2'
+    assert f'downloader_recent_phase_seconds{{{labels},quantile="0.95"}}' in before
+
+    # Pencere dolunca kayan görünüm boşalır, histogram ise azalmaz
+    clock[0] += 120
+    _observe(registry, 0.05)
+    after = _series(registry.render())
+    assert after[f'downloader_phase_seconds_count{{{labels}}}'] == '3'
+    assert float(after[f'downloader_phase_seconds_sum{{{labels}}}']) == 3.25
+    assert after[f'downloader_recent_phase_seconds{{{labels},quantile="0.5"}}'] == '0.050000'
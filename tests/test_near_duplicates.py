@@ -0,0 +1,88 @@
+import os
+import random
+
+import pytest
+
+import vi
+
+
+def test_hamming_index_matches_full_scan():
+    rng = random.Random(7)
+    index = vi.HammingIndex()
+    values = [rng.getrandbits(64) for _ in range(2000)]
+    # Aranan özetlerin yakınına, farklı bantlara dağılmış bit farklarıyla kayıt eklenir
+    for value in values[:200]:
+        for bits in (1, 3, 6, 9):
+            near = value
+            for bit in rng.sample(range(64), bits):
+                near ^= 1 << bit
+            values.append(near)
+    for position, value in enumerate(values):
+        index.add(value, position)
+
+    for value in values[:200]:
+        for max_distance in (0, 3, 6, 7, 12):
+            expected = sorted(position for position, other in enumerate(values)
+                              if vi.hamming_distance(value, other) <= max_distance)
+            assert sorted(item for _, item in index.search(value, max_distance)) == expected
+
+
+def test_hamming_index_masks_signed_hashes():
+    index = vi.HammingIndex()
+    index.add(-2, 'a')
+    assert index.search(-1, 1) == [(1, 'a')]
+
+
+def _write_images(directory):
+    np = pytest.importorskip('numpy')
+    Image = pytest.importorskip('PIL.Image')
+    pixels = np.random.default_rng(1).integers(0, 256, (8, 9), dtype=np.uint8)
+    original = Image.fromarray(pixels).resize((90, 80), Image.NEAREST).convert('RGB')
+    similar = np.array(original)
+    similar[:40, :10] = 255 - similar[:40, :10]
+    paths = {name: str(directory / f"{name}.jpg") for name in 'abc'}
+    original.save(paths['a'], quality=95)
+    original.save(paths['b'], quality=95)
+    Image.fromarray(similar).save(paths['c'], quality=95)
+    return paths
+
+
+def _add_photos(tracker, paths):
+    for name, path in paths.items():
+        assert tracker.add_media(name, f"https://example.com/{name}.jpg", path, 'photo', 'instagram')
+
+
+def _row_paths(tracker):
+    return dict(tracker.get_connection().execute('SELECT media_id, file_path FROM media'))
+
+
+def test_remove_scan_keeps_original_of_redirected_photo(tracker, tmp_path):
+    # A ve C işaretlenir, B (A'nın kopyası) silinip A'ya yönlendirilir; ardından
+    # yapılan 'remove' taraması A'nın dosyasını C ile eşleştirip silmemeli
+    paths = _write_images(tmp_path)
+    _add_photos(tracker, paths)
+    hashes = dict(zip('abc', vi.image_dhashes([paths[name] for name in 'abc'])))
+    assert 0 < vi.hamming_distance(hashes['a'], hashes['c']) <= vi.NEAR_DUPLICATE_DISTANCE
+
+    assert vi.handle_near_duplicate(tracker, 'a', paths['a'], hashes['a'], 'flag') is None
+    assert vi.handle_near_duplicate(tracker, 'c', paths['c'], hashes['c'], 'flag') is not None
+    assert vi.handle_near_duplicate(tracker, 'b', paths['b'], hashes['b'], 'remove')[1] == 'a'
+    assert not os.path.exists(paths['b'])
+    assert _row_paths(tracker)['b'] == paths['a']
+
+    assert vi.scan_near_duplicates(tracker, 'remove') == (0, 0)
+    assert all(os.path.exists(path) for path in _row_paths(tracker).values())
+
+
+def test_remove_scan_skips_rows_sharing_a_file(tracker, tmp_path):
+    # Özeti yazılmadan yönlendirilmiş eski kayıtlar da taramada atlanır
+    paths = _write_images(tmp_path)
+    _add_photos(tracker, paths)
+    hashes = dict(zip('abc', vi.image_dhashes([paths[name] for name in 'abc'])))
+    tracker.set_phash('instagram', 'a', hashes['a'], paths['a'])
+    tracker.set_phash('instagram', 'c', hashes['c'], paths['c'])
+    os.remove(paths['b'])
+    tracker.replace_file_path('instagram', 'b', paths['a'])
+
+    assert vi.scan_near_duplicates(tracker, 'remove') == (0, 0)
+    assert all(os.path.exists(path) for path in _row_paths(tracker).values())
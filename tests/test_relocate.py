@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import vi
+
+
+def _media(tracker, root, names):
+    for name in names:
+        path = os.path.join(root, f"{name}.jpg")
+        with open(path, 'wb') as f:
+            f.write(name.encode())
+        assert tracker.add_media(name, f"https://example.com/{name}.jpg", path, 'photo', 'instagram')
+    # 'b' silinmiş bir benzer fotoğraf gibi 'a'nın dosyasını gösterir
+    os.remove(os.path.join(root, 'b.jpg'))
+    tracker.replace_file_path('instagram', 'b', os.path.join(root, 'a.jpg'))
+
+
+def _row_paths(tracker):
+    return dict(tracker.get_connection().execute('SELECT media_id, file_path FROM media'))
+
+
+@pytest.mark.parametrize('batch_size', [1, 1000])
+def test_shared_file_rows_follow_the_moved_file(tracker, tmp_path, batch_size):
+    root = str(tmp_path)
+    _media(tracker, root, 'abc')
+    stats = tracker.relocate_media(root, 'hash', batch_size=batch_size)
+    paths = _row_paths(tracker)
+    assert stats['moved'] == 2 and stats['failed'] == 0
+    assert paths['a'] == paths['b'] != os.path.join(root, 'a.jpg')
+    assert all(os.path.exists(path) for path in paths.values())
+
+
+@pytest.mark.parametrize('batch_size', [1, 1000])
+def test_shared_file_rows_stay_when_the_move_fails(tracker, tmp_path, batch_size):
+    root = str(tmp_path)
+    _media(tracker, root, 'abc')
+    # Hedefte başka bir dosya olduğu için 'a.jpg' taşınamaz
+    target = vi.media_file_path(root, 'hash', 'instagram', 'a.jpg')
+    os.makedirs(os.path.dirname(target))
+    with open(target, 'wb') as f:
+        f.write(b'other')
+    stats = tracker.relocate_media(root, 'hash', batch_size=batch_size)
+    paths = _row_paths(tracker)
+    assert stats['failed'] == 2
+    assert paths['a'] == paths['b'] == os.path.join(root, 'a.jpg')
+    assert all(os.path.exists(path) for path in paths.values())
+
+
+def test_partial_downloads_follow_the_new_layout(tracker, tmp_path):
+    root = str(tmp_path)
+    old_path = os.path.join(root, 'tiktok_9.mp4')
+    with open(old_path + '.part', 'wb') as f:
+        f.write(b'half')
+    tracker.save_transfer('tiktok:9', 'https://example.com/9.mp4', old_path, 8, 4)
+    # .part dosyası olmayan kayıtların yalnızca yolu güncellenir
+    tracker.save_transfer('instagram:8', 'https://example.com/8.jpg', os.path.join(root, 'ig_8.jpg'), 8, 0)
+
+    stats = tracker.relocate_media(root, 'hash')
+    target = vi.media_file_path(root, 'hash', 'tiktok', 'tiktok_9.mp4')
+    assert stats['partial'] == 1 and stats['failed'] == 0
+    assert tracker.get_transfer('tiktok:9')['file_path'] == target
+    assert tracker.get_transfer('instagram:8')['file_path'] == vi.media_file_path(root, 'hash', 'instagram',
+                                                                                  'ig_8.jpg')
+    assert not os.path.exists(old_path + '.part')
+    with open(target + '.part', 'rb') as f:
+        assert f.read() == b'half'
@@ -0,0 +1,19 @@
+import pytest
+
+import vi
+
+
+@pytest.mark.parametrize('rate', ['0', '-1', 'nan'])
+def test_cli_rejects_non_positive_rate(rate, capsys):
+    with pytest.raises(SystemExit):
+        vi.build_cli_parser().parse_args(['queue', 'run', '--rate', rate])
+    assert 'Değer pozitif olmalıdır' in capsys.readouterr().err
+
+
+def test_scheduler_rejects_non_positive_rate():
+    with pytest.raises(ValueError):
+        vi.RequestScheduler(default_rate=0)
+    scheduler = vi.RequestScheduler()
+    with pytest.raises(ValueError):
+        scheduler.configure('example.com', -1)
+    assert scheduler._reserve('https://example.com/a') == 0.0
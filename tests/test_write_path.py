@@ -0,0 +1,41 @@
+import hashlib
+import os
+
+import pytest
+
+import bench
+import vi
+
+
+def test_write_all_continues_after_short_writes(tmp_path, monkeypatch):
+    if not hasattr(os, 'writev'):
+        pytest.skip('os.writev yok')
+    real_writev = os.writev
+
+    def short_writev(fd, buffers):
+        # Her çağrıda en fazla 7 bayt yazılır; parçaların ortasında kesilir
+        data = b''.join(bytes(buffer) for buffer in buffers)[:7]
+        return real_writev(fd, [data])
+
+    monkeypatch.setattr(os, 'writev', short_writev)
+    parts = [b'abcde', bytearray(b'fghijklmnop'), memoryview(b'qrstuvwxyz')]
+    path = tmp_path / 'out.bin'
+    with open(path, 'wb', buffering=0) as f:
+        assert vi.DownloadEngine._write_all(f, parts) == 26
+    assert path.read_bytes() == b'abcdefghijklmnopqrstuvwxyz'
+
+
+def test_fetch_writes_the_body_it_hashes(tmp_path):
+    server = bench.start_local_server()
+    scheduler = vi.RequestScheduler(default_rate=1e9, default_burst=10 ** 9)
+    engine = vi.DownloadEngine(scheduler=scheduler, min_free_bytes=0, chunk_size=4096)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/media/3000000/a"
+        target = str(tmp_path / 'a.bin')
+        result = engine.submit(engine.fetch(url, target)).result()
+    finally:
+        engine.close()
+        server.shutdown()
+    data = open(target, 'rb').read()
+    assert len(data) == result.bytes_written == 3_000_000
+    assert hashlib.sha256(data).hexdigest() == result.content_hash
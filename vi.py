@@ -1,84 +1,525 @@
 import sys
 import os
+import argparse
 import hashlib
 import json
 import time
 import logging
 import sqlite3
+import threading
+import asyncio
+import importlib.util
+import queue
+import bisect
+import heapq
+import random
+import socket
+import itertools
+import math
+import email.utils
+import errno
+import shutil
+import atexit
+from logging.handlers import QueueHandler, QueueListener
+from collections import deque
+from array import array
 from datetime import datetime
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                          QHBoxLayout, QLineEdit, QPushButton, QLabel, 
-                          QProgressBar, QTextEdit, QFileDialog, QMessageBox,
-                          QCheckBox, QComboBox, QTabWidget)
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlparse, quote, urlencode
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+# Arayüz (gui.py, QtWidgets) yalnızca arayüz açılırken yüklenir; bkz. main
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from instagrapi import Client
-import requests
-from tiktokapipy.api import TikTokAPI  # DEĞİŞTİ
 import re
-from bs4 import BeautifulSoup
-import requests
-# Logging ayarları
-logging.basicConfig(
-    filename='social_media_downloader.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+# Ağır bağımlılıklar ilk kullanıldıkları yerde yüklenir (instagrapi, requests,
+# httpx); komut satırı modunda yalnızca seçilen platformun istemcisi yüklenir.
+httpx = None
+# Logging ayarları: kayıtlar kuyruğa bırakılır, dosyaya ayrı bir thread yazar;
+# arayüz ve indirme thread'leri disk yazımını beklemez.
+_log_file_handler = logging.FileHandler('social_media_downloader.log')
+_log_file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, _log_file_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+
+# media tablosunda platform adı yerine küçük tamsayı kodu saklanır
+PLATFORM_CODES = {'instagram': 1, 'tiktok': 2}
+LEGACY_PLATFORM_SQL = ('CASE platform '
+                       + ' '.join(f"WHEN '{name}' THEN {code}" for name, code in PLATFORM_CODES.items())
+                       + ' END')
+
+
+# Algısal özetler (dHash) 64 bittir; Hamming uzaklığı bu değerin altındaki
+# fotoğraflar benzer sayılır. numpy ve Pillow isteğe bağlıdır.
+PHASH_MASK = (1 << 64) - 1
+NEAR_DUPLICATE_DISTANCE = 6
+NEAR_DUPLICATE_MODES = {'off': 'Kapalı', 'flag': 'İşaretle', 'remove': 'Sil'}
+
+# Gönderiden saklanan bilgiler; created_at gönderinin paylaşıldığı unix zamanıdır
+MEDIA_METADATA_FIELDS = ('caption', 'author', 'created_at', 'width', 'height', 'duration')
+MEDIA_OPTIONAL_COLUMNS = (('phash', 'INTEGER'), ('caption', 'TEXT'), ('author', 'TEXT'),
+                          ('created_at', 'INTEGER'), ('width', 'INTEGER'), ('height', 'INTEGER'),
+                          ('duration', 'REAL'))
+MEDIA_DATE_SQL = 'COALESCE(created_at, downloaded_at)'
+MEDIA_SEARCH_COLUMNS = ('platform', 'media_id', 'file_path', 'media_type', 'hashtag', 'caption', 'author',
+                        'created_at', 'downloaded_at', 'width', 'height', 'duration')
+MEDIA_INSERT_SQL = f'''
+    INSERT {{}} INTO media
+    (platform, media_id, url_hash, media_url, file_path, media_type, hashtag, content_hash,
+     {', '.join(MEDIA_METADATA_FIELDS)})
+    VALUES ({', '.join('?' * (8 + len(MEDIA_METADATA_FIELDS)))})
+'''
+# Aynı veritabanını paylaşan işçi süreçlerin medya ve iş kiralamalarının süresi (saniye).
+# Kiralamalar LEASE_SECONDS / 4'te bir yenilenir; yenilenmeyen (ölmüş işçiye ait)
+# kiralama süresi dolunca başka bir işçi tarafından alınabilir.
+LEASE_SECONDS = 120
+
+
+def media_digest(kind, value):
+    # 64-bit işaretli özet; SQLite INTEGER ve array('q') ile doğrudan uyumlu
+    data = f"{kind}:{value}".encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little', signed=True)
+
+
+def fts_phrase(value):
+    # Kullanıcı metni FTS5 sözdizimine karışmasın diye tırnak içine alınır; sondaki * önek aramasıdır
+    prefix = value.endswith('*') and len(value) > 1
+    value = value[:-1] if prefix else value
+    return '"' + value.replace('"', '""') + '"' + ('*' if prefix else '')
+
+
+def url_digest(url):
+    # URL'nin 16 baytlık ikili MD5'i (eski şemadaki media_hash'in hex olmayan hali)
+    return hashlib.md5(str(url).encode('utf-8')).digest()
+
+
+def url_key(url_hash):
+    # MD5 zaten düzgün dağıldığından indeks anahtarı olarak ilk 8 bayt yeterli
+    return int.from_bytes(url_hash[:8], 'little', signed=True)
+
+
+class MediaDigestIndex:
+    # (platform, media_id) ve URL özeti için 64-bit anahtarlardan oluşan üyelik indeksi.
+    # Sıralı array('q') anahtar başına 8 bayt tutar; satır başına iki anahtar
+    # olduğundan 1 milyon satır ~16 MB, 10 milyon satır ~160 MB eder.
+    # Yeni eklemeler küçük bir set'te toplanır ve MERGE_THRESHOLD'da ana diziye
+    # birleştirilir (birleştirme sırasında geçici olarak iki kopya bulunur).
+    # Çakışma olasılığı anahtar başına ~n/2^64 olduğundan pratikte yok sayılır.
+    MERGE_THRESHOLD = 65536
+
+    def __init__(self):
+        self._keys = array('q')
+        self._delta = set()
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def load(self, conn, legacy=False):
+        # Sıralama Python listesi yerine SQLite'ın sorter'ında yapılır,
+        # böylece yükleme sırasında bellek yalnızca diziye harcanır.
+        # legacy: taşınmamış eski downloaded_media satırları da eklenir.
+        conn.create_function('media_digest', 2, media_digest, deterministic=True)
+        conn.create_function('url_key', 1, url_key, deterministic=True)
+        parts = ['SELECT media_digest(platform, media_id) AS digest FROM media',
+                 'SELECT url_key(url_hash) FROM media']
+        if legacy:
+            conn.create_function('legacy_url_key', 1, lambda value: url_key(bytes.fromhex(value)),
+                                 deterministic=True)
+            parts += [f'SELECT media_digest({LEGACY_PLATFORM_SQL}, media_id) FROM downloaded_media',
+                      'SELECT legacy_url_key(media_hash) FROM downloaded_media']
+        keys = array('q')
+        cursor = conn.execute(' UNION '.join(parts) + ' ORDER BY digest')
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            keys.extend(row[0] for row in rows)
+        with self._lock:
+            if self._keys:
+                # Yükleme sürerken delta ana diziye birleştirilmiş olabilir; o anahtarlar
+                # atılmaz (iki kez bulunan anahtar aramayı bozmaz)
+                keys = array('q', heapq.merge(self._keys, keys))
+            self._keys = keys
+            self.ready = True
+
+    def add(self, digest):
+        with self._lock:
+            self._delta.add(digest)
+            if len(self._delta) >= self.MERGE_THRESHOLD:
+                merged = array('q', heapq.merge(self._keys, sorted(self._delta)))
+                self._keys = merged
+                self._delta = set()
+
+    def __contains__(self, digest):
+        with self._lock:
+            if digest in self._delta:
+                return True
+            keys = self._keys
+        i = bisect.bisect_left(keys, digest)
+        return i < len(keys) and keys[i] == digest
+
+    def __len__(self):
+        return len(self._keys) + len(self._delta)
+
 
 class SQLiteMediaTracker:
-    def __init__(self, db_path="downloads.db"):
+    # Her thread kendi bağlantısını bir kez açar ve yeniden kullanır (WAL modunda
+    # okuyucular yazıcıyı beklemez). Toplu eklemeler ayrı bir yazıcı thread'inde
+    # batch_size satırda veya flush_interval saniyede bir tek transaction ile yazılır.
+    # "Zaten indirildi mi" kontrolleri arka planda yüklenen MediaDigestIndex'ten
+    # cevaplanır; tablo index_max_rows'tan büyükse indeks kurulmaz ve SQLite sorgulanır.
+    def __init__(self, db_path="downloads.db", batch_size=500, flush_interval=0.25,
+                 index_max_rows=10_000_000):
         self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.index_max_rows = index_max_rows
+        self.index = MediaDigestIndex()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._write_queue = queue.Queue()
+        self._writer = None
+        self._pending_hashes = set()
+        self._pending_ids = set()
+        # Kuyrukta bekleyen kayıtların içerik özetleri -> dosya yolu (find_media_by_content için)
+        self._pending_content = {}
+        self.legacy_table = False
+        self.fts_enabled = False
+        # Algısal özetlerin Hamming indeksi; ilk benzerlik aramasında yüklenir
+        self._phash_index = None
+        self._phash_lock = threading.Lock()
+        # Kiralama sahibi: makine:pid; her indirici thread'i bunun altında ayrı bir ad alır
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._lease_owners = set()
+        self._lease_counter = itertools.count(1)
+        self._heartbeat = None
+        self._heartbeat_stop = threading.Event()
         self.init_database()
+        threading.Thread(target=self._load_index, daemon=True).start()
+
+    def _init_search_index(self, cursor):
+        # Açıklama, yazar ve hashtag için FTS5 indeksi; media tablosuna eklenen satırlar
+        # aynı transaction'da _add_search_entries ile indekse de yazılır. FTS5 yoksa
+        # arama LIKE ile yapılır.
+        try:
+            exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'media_fts'").fetchone()
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS media_fts USING fts5(
+                    caption, author, hashtag, platform UNINDEXED, media_id UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            ''')
+            if not exists:
+                cursor.execute('''
+                    INSERT INTO media_fts (caption, author, hashtag, platform, media_id)
+                    SELECT caption, author, hashtag, platform, media_id FROM media
+                    WHERE COALESCE(caption, author, hashtag) IS NOT NULL
+                ''')
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            logging.warning(f"FTS5 kullanılamıyor, arama yavaş olacak: {e}")
+            self.fts_enabled = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-16000')
+        conn.execute('PRAGMA mmap_size=268435456')
+        return conn
+
+    def get_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                # Sonlanmış worker thread'lerinden kalan bağlantıları kapat
+                for thread in [t for t in self._connections if not t.is_alive()]:
+                    self._connections.pop(thread).close()
+                self._connections[threading.current_thread()] = conn
+        return conn
+
+    def release_connection(self):
+        # Thread sonlanırken kendi bağlantısını kapatır
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            self._connections.pop(threading.current_thread(), None)
+        conn.close()
 
     def init_database(self):
         try:
-            with sqlite3.connect(self.db_path) as conn:
+            conn = self.get_connection()
+            with conn:
                 cursor = conn.cursor()
+                # Kayıtlar (platform, media_id) birincil anahtarıyla WITHOUT ROWID tabloda
+                # tutulur; kimlik sorgusu doğrudan tablo B-ağacında, URL sorgusu yalnızca
+                # url_hash indeksinde biter. Özetler ikili saklanır (16 + 32 bayt).
                 cursor.execute('''
-                    CREATE TABLE IF NOT EXISTS downloaded_media (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    CREATE TABLE IF NOT EXISTS media (
+                        platform INTEGER NOT NULL,
                         media_id TEXT NOT NULL,
-                        media_hash TEXT UNIQUE NOT NULL,
+                        url_hash BLOB NOT NULL,
                         media_url TEXT NOT NULL,
                         file_path TEXT NOT NULL,
                         media_type TEXT NOT NULL,
-                        platform TEXT NOT NULL,
                         hashtag TEXT,
-                        downloaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        content_hash BLOB,
+                        downloaded_at INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+                        PRIMARY KEY (platform, media_id)
+                    ) WITHOUT ROWID
+                ''')
+                # Sonradan eklenen sütunlar eski veritabanlarına da eklenir
+                media_columns = {row[1] for row in cursor.execute('PRAGMA table_info(media)')}
+                for column, column_type in MEDIA_OPTIONAL_COLUMNS:
+                    if column not in media_columns:
+                        cursor.execute(f'ALTER TABLE media ADD COLUMN {column} {column_type}')
+                cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_media_url_hash ON media(url_hash)')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_media_content ON media(content_hash, file_path) '
+                               'WHERE content_hash IS NOT NULL')
+                # Tarih araması gönderi zamanını, bilinmiyorsa indirme zamanını kullanır
+                cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_media_date ON media({MEDIA_DATE_SQL})')
+                self._init_search_index(cursor)
+                # Eski şemadaki downloaded_media, migrate_legacy_media ile taşınana kadar
+                # sorgulara dahil edilir
+                tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                self.legacy_table = 'downloaded_media' in tables
+                if self.legacy_table:
+                    columns = {row[1] for row in cursor.execute('PRAGMA table_info(downloaded_media)')}
+                    if 'content_hash' not in columns:
+                        cursor.execute('ALTER TABLE downloaded_media ADD COLUMN content_hash TEXT')
+                        cursor.execute('CREATE INDEX IF NOT EXISTS idx_content_hash '
+                                       'ON downloaded_media(content_hash)')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS transfer_journal (
+                        transfer_key TEXT PRIMARY KEY,
+                        url TEXT NOT NULL,
+                        file_path TEXT NOT NULL,
+                        expected_length INTEGER,
+                        bytes_written INTEGER NOT NULL DEFAULT 0,
+                        etag TEXT,
+                        last_modified TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS download_jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        platform TEXT NOT NULL,
+                        query TEXT NOT NULL,
+                        download_path TEXT NOT NULL,
+                        options TEXT NOT NULL DEFAULT '{}',
+                        priority INTEGER NOT NULL DEFAULT 0,
+                        state TEXT NOT NULL DEFAULT 'pending',
+                        result TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        started_at TIMESTAMP,
+                        finished_at TIMESTAMP
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state '
+                               'ON download_jobs(state, priority DESC, id)')
+                job_columns = {row[1] for row in cursor.execute('PRAGMA table_info(download_jobs)')}
+                for column, column_type in (('owner', 'TEXT'), ('lease_expires', 'REAL')):
+                    if column not in job_columns:
+                        cursor.execute(f'ALTER TABLE download_jobs ADD COLUMN {column} {column_type}')
+                # Birden çok işçi sürecin aynı medyayı indirmemesi için kiralamalar
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS media_claims (
+                        platform INTEGER NOT NULL,
+                        media_id TEXT NOT NULL,
+                        owner TEXT NOT NULL,
+                        expires_at REAL NOT NULL,
+                        PRIMARY KEY (platform, media_id)
+                    ) WITHOUT ROWID
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_claims_owner ON media_claims(owner)')
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS download_metrics (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        platform TEXT NOT NULL,
+                        media_id TEXT NOT NULL,
+                        started_at REAL NOT NULL,
+                        status TEXT NOT NULL,
+                        wait_ms REAL,
+                        connect_ms REAL,
+                        ttfb_ms REAL,
+                        transfer_ms REAL,
+                        db_ms REAL,
+                        bytes INTEGER,
+                        retries INTEGER
+                    )
+                ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_metrics_platform '
+                               'ON download_metrics(platform, started_at)')
+                # Bant genişliği sınırları (bayt/sn); kapsam '*' veya platform adı
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS bandwidth_limits (
+                        scope TEXT PRIMARY KEY,
+                        rate INTEGER NOT NULL
+                    )
+                ''')
+                # Arama sayfası önbelleği; anahtar istek adresi ve parametreleridir
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS search_cache (
+                        cache_key TEXT PRIMARY KEY,
+                        payload TEXT NOT NULL,
+                        etag TEXT,
+                        last_modified TEXT,
+                        fetched_at REAL NOT NULL
                     )
                 ''')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_media_hash ON downloaded_media(media_hash)')
-                cursor.execute('CREATE INDEX IF NOT EXISTS idx_media_id ON downloaded_media(media_id)')
-                conn.commit()
         except Exception as e:
             logging.error(f"Veritabanı başlatma hatası: {e}")
 
-    def is_media_downloaded(self, media_id, media_url):
+    def _load_index(self):
         try:
-            media_url_str = str(media_url)
-            media_hash = hashlib.md5(media_url_str.encode('utf-8')).hexdigest()
-            
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT COUNT(*) FROM downloaded_media WHERE media_hash = ? OR media_id = ?',
-                             (media_hash, media_id))
-                return cursor.fetchone()[0] > 0
+            conn = self._connect()
+            try:
+                # Büyük tablolarda sıralama belleğe değil geçici dosyaya taşar
+                conn.execute('PRAGMA temp_store=FILE')
+                legacy = self.legacy_table
+                row_count = conn.execute('SELECT COUNT(*) FROM media').fetchone()[0]
+                if legacy:
+                    row_count += conn.execute('SELECT COUNT(*) FROM downloaded_media').fetchone()[0]
+                if row_count > self.index_max_rows:
+                    logging.warning(f"Bellek indeksi devre dışı: {row_count} kayıt sınırı aşıyor")
+                    return
+                started = time.monotonic()
+                self.index.load(conn, legacy=legacy)
+                logging.info(f"Bellek indeksi yüklendi: {row_count} kayıt, "
+                             f"{time.monotonic() - started:.1f} sn")
+            finally:
+                conn.close()
+        except Exception as e:
+            logging.error(f"Bellek indeksi yükleme hatası: {e}")
+
+    def _index_media(self, platform_code, media_id, url_hash):
+        self.index.add(media_digest(platform_code, media_id))
+        self.index.add(url_key(url_hash))
+
+    def is_media_downloaded(self, media_id, media_url, platform=None):
+        # platform verilmezse kimlik bütün platformlarda aranır
+        try:
+            media_id = str(media_id)
+            url_hash = url_digest(media_url)
+            codes = (PLATFORM_CODES[platform],) if platform else tuple(PLATFORM_CODES.values())
+
+            with self._lock:
+                if url_hash in self._pending_hashes or any(
+                        (code, media_id) in self._pending_ids for code in codes):
+                    return True
+
+            if self.index.ready:
+                return (url_key(url_hash) in self.index
+                        or any(media_digest(code, media_id) in self.index for code in codes))
+
+            cursor = self.get_connection().execute(
+                f"SELECT 1 FROM media WHERE platform IN ({','.join('?' * len(codes))}) AND media_id = ? "
+                'UNION ALL SELECT 1 FROM media WHERE url_hash = ? LIMIT 1',
+                (*codes, media_id, url_hash))
+            if cursor.fetchone() is not None:
+                return True
+            return self.legacy_table and self._legacy_media_exists(media_id, url_hash, platform)
         except Exception as e:
             logging.error(f"Medya kontrol hatası: {e}")
             return False
 
-    def add_media(self, media_id, media_url, file_path, media_type, platform, hashtag=None):
+    def _legacy_media_exists(self, media_id, url_hash, platform):
         try:
-            media_url_str = str(media_url)
-            media_hash = hashlib.md5(media_url_str.encode('utf-8')).hexdigest()
-            
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO downloaded_media 
-                    (media_id, media_hash, media_url, file_path, media_type, platform, hashtag)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (media_id, media_hash, media_url_str, file_path, media_type, platform, hashtag))
-                conn.commit()
+            if platform:
+                cursor = self.get_connection().execute(
+                    'SELECT 1 FROM downloaded_media WHERE media_hash = ? '
+                    'OR (media_id = ? AND platform = ?) LIMIT 1', (url_hash.hex(), media_id, platform))
+            else:
+                cursor = self.get_connection().execute(
+                    'SELECT 1 FROM downloaded_media WHERE media_hash = ? OR media_id = ? LIMIT 1',
+                    (url_hash.hex(), media_id))
+            return cursor.fetchone() is not None
+        except sqlite3.OperationalError:
+            # Tablo başka bir süreçteki taşıma tarafından silinmiş
+            self.legacy_table = False
+            return False
+
+    def filter_new_media(self, candidates, chunk_size=300):
+        # candidates: (platform, media_id, url, ...) demetleri; henüz indirilmemiş olanlar
+        # sırası korunarak aynen döner (ek alanlar çağıranın verisini taşır).
+        # Bir sayfa, parça başına tek sorguyla elenir.
+        candidates = list(candidates)
+        try:
+            keyed = [(PLATFORM_CODES[candidate[0]], str(candidate[1]), url_digest(candidate[2]), candidate)
+                     for candidate in candidates]
+            with self._lock:
+                keyed = [item for item in keyed
+                         if (item[0], item[1]) not in self._pending_ids and item[2] not in self._pending_hashes]
+
+            if self.index.ready:
+                return [candidate for code, media_id, url_hash, candidate in keyed
+                        if media_digest(code, media_id) not in self.index and url_key(url_hash) not in self.index]
+
+            conn = self.get_connection()
+            known_ids, known_hashes = set(), set()
+            for start in range(0, len(keyed), chunk_size):
+                chunk = keyed[start:start + chunk_size]
+                # Aday sayfası sabit bir VALUES tablosu olarak birincil anahtar ve
+                # url_hash indeksiyle birleştirilir (satır değerli IN tabloyu tarar)
+                cursor = conn.execute(f'''
+                    WITH candidates(platform, media_id, url_hash) AS (
+                        VALUES {','.join(['(?, ?, ?)'] * len(chunk))}
+                    )
+                    SELECT media.platform, media.media_id, NULL FROM candidates
+                    JOIN media ON media.platform = candidates.platform AND media.media_id = candidates.media_id
+                    UNION ALL
+                    SELECT NULL, NULL, media.url_hash FROM candidates
+                    JOIN media ON media.url_hash = candidates.url_hash
+                ''', [value for item in chunk for value in item[:3]])
+                for code, media_id, url_hash in cursor:
+                    if url_hash is None:
+                        known_ids.add((code, media_id))
+                    else:
+                        known_hashes.add(url_hash)
+                if self.legacy_table:
+                    self._legacy_known_media(conn, chunk, known_ids, known_hashes)
+            return [candidate for code, media_id, url_hash, candidate in keyed
+                    if (code, media_id) not in known_ids and url_hash not in known_hashes]
+        except Exception as e:
+            logging.error(f"Toplu medya kontrol hatası: {e}")
+            return list(candidates)
+
+    def _legacy_known_media(self, conn, chunk, known_ids, known_hashes):
+        try:
+            cursor = conn.execute(f'''
+                SELECT {LEGACY_PLATFORM_SQL}, media_id, media_hash FROM downloaded_media
+                WHERE media_id IN ({','.join('?' * len(chunk))})
+                   OR media_hash IN ({','.join('?' * len(chunk))})
+            ''', [media_id for _, media_id, _, _ in chunk] + [url_hash.hex() for _, _, url_hash, _ in chunk])
+            for code, media_id, media_hash in cursor:
+                known_ids.add((code, media_id))
+                known_hashes.add(bytes.fromhex(media_hash))
+        except sqlite3.OperationalError:
+            self.legacy_table = False
+
+    def add_media(self, media_id, media_url, file_path, media_type, platform, hashtag=None,
+                  content_hash=None, metadata=None):
+        # metadata: MEDIA_METADATA_FIELDS anahtarlarından oluşan isteğe bağlı dict
+        try:
+            row = self._media_row(media_id, media_url, file_path, media_type, platform, hashtag,
+                                  content_hash, metadata)
+
+            conn = self.get_connection()
+            with conn:
+                conn.execute(MEDIA_INSERT_SQL.format(''), row)
+                self._add_search_entries(conn, [self._search_entry(row)])
+            self._index_media(row[0], row[1], row[2])
             return True
         except sqlite3.IntegrityError:
             logging.warning(f"Medya zaten var: {media_id}")
@@ -87,276 +528,2685 @@ class SQLiteMediaTracker:
             logging.error(f"Medya ekleme hatası: {e}")
             return False
 
-class InstagramDownloaderThread(QThread):
+    # İş kuyruğu: pending -> running -> done/failed. Durdurulan veya uygulama
+    # kapanırken yarıda kalan işler tekrar pending yapılır.
+    def add_job(self, platform, query, download_path, options=None, priority=0):
+        try:
+            conn = self.get_connection()
+            with conn:
+                cursor = conn.execute(
+                    'INSERT INTO download_jobs (platform, query, download_path, options, priority) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (platform, query, download_path, json.dumps(options or {}), priority))
+            return cursor.lastrowid
+        except Exception as e:
+            logging.error(f"İş ekleme hatası: {e}")
+            return None
+
+    def _job_from_row(self, row):
+        keys = ('id', 'platform', 'query', 'download_path', 'options', 'priority', 'state', 'result')
+        job = dict(zip(keys, row))
+        job['options'] = json.loads(job['options'] or '{}')
+        return job
+
+    def claim_next_job(self):
+        # En yüksek öncelikli bekleyen iş tek bir yazma transaction'ında bu süreç adına
+        # kiralanır; kiralaması dolmuş (işçisi ölmüş) çalışan işler de yeniden alınır
+        try:
+            conn = self.get_connection()
+            now = time.time()
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute(
+                    'SELECT id, platform, query, download_path, options, priority, state, result '
+                    'FROM download_jobs WHERE state = \'pending\' '
+                    '   OR (state = \'running\' AND lease_expires < ?) '
+                    'ORDER BY priority DESC, id LIMIT 1', (now,)
+                ).fetchone()
+                if row is None:
+                    return None
+                conn.execute("UPDATE download_jobs SET state = 'running', started_at = CURRENT_TIMESTAMP, "
+                             "owner = ?, lease_expires = ? WHERE id = ?",
+                             (self.worker_id, now + LEASE_SECONDS, row[0]))
+            self._ensure_heartbeat()
+            job = self._job_from_row(row)
+            job['state'] = 'running'
+            return job
+        except Exception as e:
+            logging.error(f"İş alma hatası: {e}")
+            return None
+
+    def finish_job(self, job_id, state, result=None):
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('UPDATE download_jobs SET state = ?, result = ?, owner = NULL, lease_expires = NULL, '
+                             'finished_at = CASE WHEN ? = \'pending\' THEN NULL ELSE CURRENT_TIMESTAMP END '
+                             'WHERE id = ?',
+                             (state, result, state, job_id))
+        except Exception as e:
+            logging.error(f"İş güncelleme hatası: {e}")
+
+    def list_jobs(self, states=None):
+        try:
+            query = ('SELECT id, platform, query, download_path, options, priority, state, result '
+                     'FROM download_jobs')
+            params = ()
+            if states:
+                query += f" WHERE state IN ({','.join('?' * len(states))})"
+                params = tuple(states)
+            query += ' ORDER BY id'
+            return [self._job_from_row(row) for row in self.get_connection().execute(query, params)]
+        except Exception as e:
+            logging.error(f"İş listesi okuma hatası: {e}")
+            return []
+
+    def requeue_running_jobs(self):
+        # Önceki oturumda çalışırken kesilen işler kuyruğa geri döner. Başka bir canlı
+        # işçinin kiraladığı işlere dokunulmaz; bu makinedeki sahibi ölmüşse beklenmez.
+        # Sahiplerin kontrolü ve güncelleme tek yazma transaction'ında yapılır; arada
+        # başka bir işçi işi alır veya kiralamasını yenilerse iş geri alınmaz.
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                owners = [row[0] for row in conn.execute(
+                    "SELECT DISTINCT owner FROM download_jobs WHERE state = 'running' AND owner IS NOT NULL")]
+                dead = [owner for owner in owners if owner != self.worker_id and not lease_owner_alive(owner)]
+                cursor = conn.execute(
+                    "UPDATE download_jobs SET state = 'pending', started_at = NULL, owner = NULL, "
+                    "lease_expires = NULL WHERE state = 'running' AND (owner IS NULL OR owner != ?) "
+                    "AND (lease_expires IS NULL OR lease_expires < ? "
+                    f"OR owner IN ({','.join('?' * len(dead))}))",
+                    (self.worker_id, time.time(), *dead))
+            return cursor.rowcount
+        except Exception as e:
+            logging.error(f"İş kuyruğu geri yükleme hatası: {e}")
+            return 0
+
+    # Medya kiralamaları: aynı veritabanını paylaşan işçiler bir medyayı yalnızca bir kez indirir
+    def new_lease_owner(self):
+        return f"{self.worker_id}:{next(self._lease_counter)}"
+
+    def claim_media(self, owner, platform, media_ids):
+        # İndirilmemiş ve başka bir işçide geçerli kiralaması olmayan medyalar tek
+        # transaction'da owner adına kiralanır. (kiralanan id'ler, bu arada başka bir
+        # işçinin indirip kaydettiği id'ler) döner.
+        media_ids = list(media_ids)
+        if not media_ids:
+            return set(), set()
+        code = PLATFORM_CODES[platform]
+        claimed, downloaded = set(), set()
+        try:
+            conn = self.get_connection()
+            now = time.time()
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                for media_id in media_ids:
+                    if conn.execute('SELECT 1 FROM media WHERE platform = ? AND media_id = ?',
+                                    (code, media_id)).fetchone():
+                        downloaded.add(media_id)
+                        continue
+                    cursor = conn.execute('''
+                        INSERT INTO media_claims (platform, media_id, owner, expires_at) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (platform, media_id) DO UPDATE
+                        SET owner = excluded.owner, expires_at = excluded.expires_at
+                        WHERE media_claims.expires_at < ? OR media_claims.owner = excluded.owner
+                    ''', (code, media_id, owner, now + LEASE_SECONDS, now))
+                    if cursor.rowcount:
+                        claimed.add(media_id)
+            with self._lock:
+                self._lease_owners.add(owner)
+            self._ensure_heartbeat()
+            return claimed, downloaded
+        except Exception as e:
+            # Kiralama yapılamazsa tek işçi davranışına dönülür
+            logging.error(f"Medya kiralama hatası: {e}")
+            return set(media_ids), set()
+
+    def release_claims(self, owner):
+        with self._lock:
+            self._lease_owners.discard(owner)
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('DELETE FROM media_claims WHERE owner = ?', (owner,))
+        except Exception as e:
+            logging.error(f"Kiralama bırakma hatası: {e}")
+
+    def _ensure_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat_stop.clear()
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='LeaseHeartbeat',
+                                                   daemon=True)
+                self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        # Bu sürecin medya ve iş kiralamalarını yeniler, süresi dolmuş kiralamaları siler
+        conn = self._connect()
+        try:
+            while not self._heartbeat_stop.wait(LEASE_SECONDS / 4):
+                with self._lock:
+                    owners = list(self._lease_owners)
+                now = time.time()
+                try:
+                    with conn:
+                        conn.executemany('UPDATE media_claims SET expires_at = ? WHERE owner = ?',
+                                         [(now + LEASE_SECONDS, owner) for owner in owners])
+                        conn.execute("UPDATE download_jobs SET lease_expires = ? "
+                                     "WHERE owner = ? AND state = 'running'",
+                                     (now + LEASE_SECONDS, self.worker_id))
+                        conn.execute('DELETE FROM media_claims WHERE expires_at < ?', (now,))
+                except Exception as e:
+                    logging.error(f"Kiralama yenileme hatası: {e}")
+        finally:
+            conn.close()
+
+    def find_media_by_content(self, content_hash):
+        # Aynı baytlara sahip, diskte hâlâ duran ilk dosyanın yolunu döndürür
+        try:
+            with self._lock:
+                pending = self._pending_content.get(bytes.fromhex(content_hash))
+            if pending is not None and os.path.exists(pending):
+                return pending
+            conn = self.get_connection()
+            paths = [row[0] for row in conn.execute(
+                'SELECT file_path FROM media WHERE content_hash = ?', (bytes.fromhex(content_hash),))]
+            if self.legacy_table:
+                paths += [row[0] for row in conn.execute(
+                    'SELECT file_path FROM downloaded_media WHERE content_hash = ?', (content_hash,))]
+            for file_path in paths:
+                if os.path.exists(file_path):
+                    return file_path
+            return None
+        except Exception as e:
+            logging.error(f"İçerik özeti sorgu hatası: {e}")
+            return None
+
+    # Yarım kalan indirmelerin kaydı (DownloadEngine tarafından kullanılır)
+    def get_transfer(self, transfer_key):
+        try:
+            cursor = self.get_connection().execute(
+                'SELECT url, file_path, expected_length, bytes_written, etag, last_modified '
+                'FROM transfer_journal WHERE transfer_key = ?', (transfer_key,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            keys = ('url', 'file_path', 'expected_length', 'bytes_written', 'etag', 'last_modified')
+            return dict(zip(keys, row))
+        except Exception as e:
+            logging.error(f"İndirme kaydı okuma hatası: {e}")
+            return None
+
+    def save_transfer(self, transfer_key, url, file_path, expected_length, bytes_written,
+                      etag=None, last_modified=None):
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO transfer_journal
+                    (transfer_key, url, file_path, expected_length, bytes_written, etag, last_modified)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (transfer_key, url, file_path, expected_length, bytes_written, etag, last_modified))
+        except Exception as e:
+            logging.error(f"İndirme kaydı yazma hatası: {e}")
+
+    def update_transfer(self, transfer_key, bytes_written):
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('UPDATE transfer_journal SET bytes_written = ?, updated_at = CURRENT_TIMESTAMP '
+                             'WHERE transfer_key = ?', (bytes_written, transfer_key))
+        except Exception as e:
+            logging.error(f"İndirme kaydı güncelleme hatası: {e}")
+
+    def remove_transfer(self, transfer_key):
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('DELETE FROM transfer_journal WHERE transfer_key = ?', (transfer_key,))
+        except Exception as e:
+            logging.error(f"İndirme kaydı silme hatası: {e}")
+
+    def get_bandwidth_limits(self):
+        try:
+            return dict(self.get_connection().execute('SELECT scope, rate FROM bandwidth_limits'))
+        except Exception as e:
+            logging.error(f"Bant genişliği ayarı okuma hatası: {e}")
+            return None
+
+    def set_bandwidth_limits(self, limits):
+        # {kapsam: bayt/sn}; 0 veya None o kapsamın sınırını kaldırır
+        try:
+            conn = self.get_connection()
+            with conn:
+                for scope, rate in limits.items():
+                    if rate:
+                        conn.execute('INSERT OR REPLACE INTO bandwidth_limits (scope, rate) VALUES (?, ?)',
+                                     (scope, int(rate)))
+                    else:
+                        conn.execute('DELETE FROM bandwidth_limits WHERE scope = ?', (scope,))
+            return True
+        except Exception as e:
+            logging.error(f"Bant genişliği ayarı yazma hatası: {e}")
+            return False
+
+    # Arama sayfası önbelleği (TikTokDownloaderThread tarafından kullanılır)
+    def get_search_page(self, cache_key):
+        try:
+            row = self.get_connection().execute(
+                'SELECT payload, etag, last_modified, fetched_at FROM search_cache WHERE cache_key = ?',
+                (cache_key,)).fetchone()
+            if row is None:
+                return None
+            return {'payload': json.loads(row[0]), 'etag': row[1], 'last_modified': row[2],
+                    'fetched_at': row[3]}
+        except Exception as e:
+            logging.error(f"Arama önbelleği okuma hatası: {e}")
+            return None
+
+    def save_search_page(self, cache_key, payload, etag=None, last_modified=None):
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO search_cache '
+                             '(cache_key, payload, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)',
+                             (cache_key, json.dumps(payload, ensure_ascii=False), etag, last_modified,
+                              time.time()))
+        except Exception as e:
+            logging.error(f"Arama önbelleği yazma hatası: {e}")
+
+    def touch_search_page(self, cache_key):
+        # 304 yanıtı: içerik aynı, yalnızca tazelik süresi yenilenir
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('UPDATE search_cache SET fetched_at = ? WHERE cache_key = ?',
+                             (time.time(), cache_key))
+        except Exception as e:
+            logging.error(f"Arama önbelleği güncelleme hatası: {e}")
+
+    def prune_search_cache(self, max_age=None):
+        max_age = SEARCH_CACHE_MAX_AGE if max_age is None else max_age
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('DELETE FROM search_cache WHERE fetched_at < ?', (time.time() - max_age,))
+        except Exception as e:
+            logging.error(f"Arama önbelleği temizleme hatası: {e}")
+
+    def _media_row(self, media_id, media_url, file_path, media_type, platform, hashtag=None,
+                   content_hash=None, metadata=None):
+        metadata = metadata or {}
+        return (PLATFORM_CODES[platform], str(media_id), url_digest(media_url), str(media_url),
+                file_path, media_type, hashtag, bytes.fromhex(content_hash) if content_hash else None,
+                *(metadata.get(field) for field in MEDIA_METADATA_FIELDS))
+
+    @staticmethod
+    def _search_entry(row):
+        # _media_row satırından media_fts satırı: (caption, author, hashtag, platform, media_id)
+        return row[8], row[9], row[6], row[0], row[1]
+
+    def _add_search_entries(self, conn, entries):
+        # FTS5'e tetikleyiciyle yazmak doğrudan yazmaktan yaklaşık dört kat yavaş
+        # olduğu için indeks satırları çağıranın transaction'ında elle eklenir
+        if self.fts_enabled:
+            conn.executemany('INSERT INTO media_fts (caption, author, hashtag, platform, media_id) '
+                             'VALUES (?, ?, ?, ?, ?)', [entry for entry in entries if any(entry[:3])])
+
+    def _insert_rows(self, conn, rows):
+        # OR IGNORE ile atlanan satırlar indekse yazılmasın diye her satırın sonucu ayrı okunur
+        inserted = []
+        with conn:
+            for row in rows:
+                if conn.execute(MEDIA_INSERT_SQL.format('OR IGNORE'), row).rowcount:
+                    inserted.append(row)
+            self._add_search_entries(conn, [self._search_entry(row) for row in inserted])
+        return len(inserted)
+
+    def add_media_many(self, items):
+        # items: add_media ile aynı alanlara sahip dict'ler; tek transaction'da yazılır
+        try:
+            rows = [self._media_row(**item) for item in items]
+            if not rows:
+                return 0
+            inserted = self._insert_rows(self.get_connection(), rows)
+            for row in rows:
+                self._index_media(row[0], row[1], row[2])
+            return inserted
+        except Exception as e:
+            logging.error(f"Toplu medya ekleme hatası: {e}")
+            return 0
+
+    def queue_media(self, media_id, media_url, file_path, media_type, platform, hashtag=None,
+                    content_hash=None, metadata=None):
+        # Kaydı beklemeden kuyruğa atar; yazıcı thread grup halinde commit eder
+        row = self._media_row(media_id, media_url, file_path, media_type, platform, hashtag,
+                              content_hash, metadata)
+        with self._lock:
+            self._pending_ids.add((row[0], row[1]))
+            self._pending_hashes.add(row[2])
+            if row[7] is not None:
+                self._pending_content.setdefault(row[7], row[4])
+            self._index_media(row[0], row[1], row[2])
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+                self._writer.start()
+        self._write_queue.put(('media', row))
+
+    def queue_metrics(self, metrics):
+        # İndirme ölçümleri medya kayıtlarıyla aynı yazıcı thread'inde toplu yazılır
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+                self._writer.start()
+        self._write_queue.put(('metrics', metrics.row()))
+
+    def _writer_loop(self):
+        conn = self._connect()
+        try:
+            while True:
+                batch = [self._write_queue.get()]
+                deadline = time.monotonic() + self.flush_interval
+                while batch[-1] is not None and len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._write_queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+
+                rows = [row for kind, row in filter(None, batch) if kind == 'media']
+                metric_rows = [row for kind, row in filter(None, batch) if kind == 'metrics']
+                try:
+                    if rows:
+                        self._insert_rows(conn, rows)
+                except Exception as e:
+                    logging.error(f"Toplu medya ekleme hatası: {e}")
+                try:
+                    if metric_rows:
+                        with conn:
+                            conn.executemany('''
+                                INSERT INTO download_metrics
+                                (platform, media_id, started_at, status, wait_ms, connect_ms,
+                                 ttfb_ms, transfer_ms, db_ms, bytes, retries)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ''', metric_rows)
+                except Exception as e:
+                    logging.error(f"Ölçüm kaydetme hatası: {e}")
+                finally:
+                    with self._lock:
+                        for row in rows:
+                            self._pending_ids.discard((row[0], row[1]))
+                            self._pending_hashes.discard(row[2])
+                            if self._pending_content.get(row[7]) == row[4]:
+                                del self._pending_content[row[7]]
+                    for _ in batch:
+                        self._write_queue.task_done()
+
+                if batch[-1] is None:
+                    break
+        finally:
+            conn.close()
+
+    def flush(self):
+        # Kuyruktaki tüm kayıtlar commit edilene kadar bekler
+        self._write_queue.join()
+
+    def _load_phash_index(self):
+        if self._phash_index is None:
+            index = HammingIndex()
+            cursor = self.get_connection().execute(
+                'SELECT phash, media_id, file_path FROM media WHERE phash IS NOT NULL')
+            for phash, media_id, file_path in cursor:
+                index.add(phash, (media_id, file_path))
+            self._phash_index = index
+        return self._phash_index
+
+    def find_near_duplicates(self, phash, max_distance=NEAR_DUPLICATE_DISTANCE):
+        # Diskte hâlâ duran benzer fotoğraflar: (uzaklık, media_id, file_path), en yakın önce
+        try:
+            with self._phash_lock:
+                matches = self._load_phash_index().search(phash, max_distance)
+            return [(distance, media_id, file_path) for distance, (media_id, file_path) in matches
+                    if os.path.exists(file_path)]
+        except Exception as e:
+            logging.error(f"Benzer fotoğraf arama hatası: {e}")
+            return []
+
+    def search_media(self, text=None, author=None, hashtag=None, platform=None, since=None, until=None,
+                     limit=50):
+        # Açıklama/yazar/hashtag üzerinde tam metin araması. since/until unix saniyedir ve
+        # gönderi zamanına (bilinmiyorsa indirme zamanına) uygulanır. Metin varsa sonuçlar
+        # en son indirilen önce döner: FTS5 rowid sırası belge listesini tersten okur,
+        # bm25 (rank) sıralaması ise bütün eşleşmeleri puanladığı için yaygın
+        # kelimelerde yüzlerce milisaniye sürer. Metin yoksa gönderi tarihi sırası kullanılır.
+        try:
+            conditions, params = [], []
+            if platform:
+                conditions.append('media.platform = ?')
+                params.append(PLATFORM_CODES[platform])
+            if since is not None:
+                conditions.append(f'{MEDIA_DATE_SQL} >= ?')
+                params.append(since)
+            if until is not None:
+                conditions.append(f'{MEDIA_DATE_SQL} < ?')
+                params.append(until)
+
+            terms = [fts_phrase(token) for token in (text or '').split()]
+            if author:
+                terms.append(f'author : {fts_phrase(author)}')
+            if hashtag:
+                terms.append(f'hashtag : {fts_phrase(hashtag)}')
+
+            columns = ', '.join(f'media.{column}' for column in MEDIA_SEARCH_COLUMNS)
+            if terms and self.fts_enabled:
+                where = ''.join(f' AND {condition}' for condition in conditions)
+                sql = (f'SELECT {columns} FROM media_fts '
+                       'JOIN media ON media.platform = media_fts.platform AND media.media_id = media_fts.media_id '
+                       f'WHERE media_fts MATCH ?{where} ORDER BY media_fts.rowid DESC LIMIT ?')
+                params = [' AND '.join(terms)] + params + [limit]
+            else:
+                # FTS5 olmayan SQLite derlemeleri için yavaş yol
+                like_terms = [('caption', token) for token in (text or '').split()]
+                like_terms += [(column, value) for column, value in (('author', author), ('hashtag', hashtag))
+                               if value]
+                for column, value in like_terms:
+                    conditions.append(f'media.{column} LIKE ?')
+                    params.append(f"%{value.rstrip('*')}%")
+                where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+                sql = f'SELECT {columns} FROM media{where} ORDER BY {MEDIA_DATE_SQL} DESC LIMIT ?'
+                params.append(limit)
+
+            platform_names = {code: name for name, code in PLATFORM_CODES.items()}
+            results = []
+            for row in self.get_connection().execute(sql, params):
+                item = dict(zip(MEDIA_SEARCH_COLUMNS, row))
+                item['platform'] = platform_names.get(item['platform'], item['platform'])
+                results.append(item)
+            return results
+        except Exception as e:
+            logging.error(f"Arama hatası: {e}")
+            return []
+
+    def set_phash(self, platform, media_id, phash, file_path):
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('UPDATE media SET phash = ? WHERE platform = ? AND media_id = ?',
+                             (phash, PLATFORM_CODES[platform], str(media_id)))
+            with self._phash_lock:
+                if self._phash_index is not None:
+                    self._phash_index.add(phash, (str(media_id), file_path))
+        except Exception as e:
+            logging.error(f"Algısal özet kaydetme hatası: {e}")
+
+    def replace_file_path(self, platform, media_id, file_path):
+        # Silinen benzer fotoğrafın kaydı tutulan kopyayı gösterir; tekrar indirilmez
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('UPDATE media SET file_path = ? WHERE platform = ? AND media_id = ?',
+                             (file_path, PLATFORM_CODES[platform], str(media_id)))
+        except Exception as e:
+            logging.error(f"Dosya yolu güncelleme hatası: {e}")
+
+    def photos_without_phash(self, platform='instagram'):
+        # Dosyasını başka bir kayıtla paylaşan fotoğraflar (benzer diye yönlendirilmiş
+        # kayıtlar ve onların tutulan kopyaları) dönmez
+        try:
+            cursor = self.get_connection().execute(
+                "SELECT media_id, file_path FROM media WHERE platform = ? AND media_type = 'photo' "
+                'AND phash IS NULL AND file_path NOT IN '
+                '(SELECT file_path FROM media GROUP BY file_path HAVING COUNT(*) > 1) '
+                'ORDER BY downloaded_at', (PLATFORM_CODES[platform],))
+            return cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Medya listeleme hatası: {e}")
+            return []
+
+    def relocate_media(self, root, layout, workers=8, batch_size=1000, on_progress=None):
+        # root altındaki kayıtların dosyalarını layout düzenine taşır. Her grubun
+        # dosyaları thread havuzunda paralel taşınır, yolları tek transaction'da
+        # güncellenir. Yarıda kalırsa yeniden çalıştırılabilir: dosyası zaten hedefte
+        # olan kaydın yalnızca yolu düzeltilir. Yarım indirmelerin .part dosyaları ve
+        # transfer_journal yolları da taşınır; indirme yeni yerinden devam eder.
+        # Kayıtlardaki yollar indirme klasörünün verildiği biçimde saklanır
+        root = os.path.normpath(root)
+        prefix = root + os.sep
+        stats = {'moved': 0, 'updated': 0, 'missing': 0, 'failed': 0, 'partial': 0}
+        try:
+            conn = self.get_connection()
+            platform_names = {code: name for name, code in PLATFORM_CODES.items()}
+            total = conn.execute('SELECT COUNT(*) FROM media WHERE substr(file_path, 1, ?) = ?',
+                                 (len(prefix), prefix)).fetchone()[0]
+            # Birden çok kaydın gösterdiği dosyalar (silinen benzer fotoğraflar) bir kez
+            # taşınır; diğer kayıtlar ancak taşıma başarılı olunca ilk kaydın hedefine
+            # yönlendirilir, taşınamazsa eski yolda bırakılır ve aynı sonuçla sayılır
+            shared = {row[0] for row in conn.execute(
+                'SELECT file_path FROM media WHERE substr(file_path, 1, ?) = ? '
+                'GROUP BY file_path HAVING COUNT(*) > 1', (len(prefix), prefix))}
+            shared_targets = {}
+            shared_failures = {}
+            source_dirs = set()
+            last_key = (0, '')
+            done = 0
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                while True:
+                    rows = conn.execute(f'''
+                        SELECT platform, media_id, file_path, {MEDIA_DATE_SQL} FROM media
+                        WHERE (platform, media_id) > (?, ?) AND substr(file_path, 1, ?) = ?
+                        ORDER BY platform, media_id LIMIT ?
+                    ''', (*last_key, len(prefix), prefix, batch_size)).fetchall()
+                    if not rows:
+                        break
+                    last_key = rows[-1][:2]
+
+                    updates, moves = [], []
+                    # Bu gruptaki taşıması süren paylaşılan dosyaların diğer kayıtları
+                    waiting = {}
+                    for code, media_id, file_path, timestamp in rows:
+                        if file_path in shared:
+                            if file_path in shared_targets:
+                                if shared_targets[file_path] != file_path:
+                                    updates.append((shared_targets[file_path], code, media_id))
+                                continue
+                            if file_path in shared_failures:
+                                stats[shared_failures[file_path]] += 1
+                                continue
+                            if file_path in waiting:
+                                waiting[file_path].append((code, media_id))
+                                continue
+                        target = media_file_path(root, layout, platform_names[code],
+                                                 os.path.basename(file_path), timestamp)
+                        if target != file_path:
+                            moves.append((code, media_id, file_path, target))
+                            if file_path in shared:
+                                waiting[file_path] = []
+                        elif file_path in shared:
+                            shared_targets[file_path] = target
+
+                    outcomes = pool.map(lambda move: move_media_file(move[2], move[3]), moves)
+                    for (code, media_id, file_path, target), outcome in zip(moves, outcomes):
+                        stats[outcome] += 1
+                        siblings = waiting.pop(file_path, ())
+                        if outcome in ('moved', 'updated'):
+                            updates.append((target, code, media_id))
+                            updates.extend((target, *sibling) for sibling in siblings)
+                            source_dirs.add(os.path.dirname(file_path))
+                            if file_path in shared:
+                                shared_targets[file_path] = target
+                        elif file_path in shared:
+                            stats[outcome] += len(siblings)
+                            shared_failures[file_path] = outcome
+                    with conn:
+                        conn.executemany('UPDATE media SET file_path = ? WHERE platform = ? AND media_id = ?',
+                                         updates)
+                    done += len(rows)
+                    if on_progress:
+                        on_progress(done, total)
+
+                # Gönderi zamanı günlükte yok; tarih düzeninde indirme tarihi kullanılır
+                transfers = []
+                for transfer_key, file_path in conn.execute(
+                        'SELECT transfer_key, file_path FROM transfer_journal WHERE substr(file_path, 1, ?) = ?',
+                        (len(prefix), prefix)).fetchall():
+                    platform = transfer_key.split(':', 1)[0]
+                    if platform not in PLATFORM_CODES:
+                        continue
+                    target = media_file_path(root, layout, platform, os.path.basename(file_path))
+                    if target != file_path:
+                        transfers.append((transfer_key, file_path, target))
+                outcomes = pool.map(lambda move: move_media_file(move[1] + '.part', move[2] + '.part'),
+                                    transfers)
+                updates = []
+                for (transfer_key, file_path, target), outcome in zip(transfers, outcomes):
+                    if outcome == 'failed':
+                        stats['failed'] += 1
+                        continue
+                    if outcome != 'missing':
+                        stats['partial'] += 1
+                        source_dirs.add(os.path.dirname(file_path))
+                    updates.append((target, transfer_key))
+                with conn:
+                    conn.executemany('UPDATE transfer_journal SET file_path = ? WHERE transfer_key = ?', updates)
+
+            remove_empty_directories(source_dirs, root)
+            with self._phash_lock:
+                self._phash_index = None
+            logging.info(f"Dosya düzeni değiştirildi ({layout}): {stats}")
+        except Exception as e:
+            logging.error(f"Dosya taşıma hatası: {e}")
+            stats['failed'] += 1
+        return stats
+
+    def migrate_legacy_media(self, batch_size=10000, drop=True, vacuum=False, on_progress=None):
+        # Eski downloaded_media satırlarını kısa transaction'larla media tablosuna taşır.
+        # Taşıma sırasında tracker kullanılmaya devam edebilir; yarıda kalırsa
+        # migration_state'teki son id'den devam eder.
+        if not self.legacy_table:
+            return 0
+        try:
+            conn = self.get_connection()
+            with conn:
+                conn.execute('CREATE TABLE IF NOT EXISTS migration_state (name TEXT PRIMARY KEY, value INTEGER)')
+            row = conn.execute("SELECT value FROM migration_state WHERE name = 'downloaded_media'").fetchone()
+            last_id = row[0] if row else 0
+            total = conn.execute('SELECT COUNT(*) FROM downloaded_media').fetchone()[0]
+            done = conn.execute('SELECT COUNT(*) FROM downloaded_media WHERE id <= ?', (last_id,)).fetchone()[0]
+            migrated = 0
+            while True:
+                batch = conn.execute(f'''
+                    SELECT id, {LEGACY_PLATFORM_SQL}, media_id, media_hash, media_url, file_path,
+                           media_type, hashtag, content_hash,
+                           COALESCE(CAST(strftime('%s', downloaded_at) AS INTEGER),
+                                    CAST(strftime('%s', 'now') AS INTEGER))
+                    FROM downloaded_media WHERE id > ? ORDER BY id LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+                if not batch:
+                    break
+                rows = []
+                for (row_id, code, media_id, media_hash, media_url, file_path, media_type,
+                     hashtag, content_hash, downloaded_at) in batch:
+                    if code is None:
+                        logging.warning(f"Bilinmeyen platform, kayıt atlandı: {media_id}")
+                        continue
+                    rows.append((code, media_id, bytes.fromhex(media_hash), media_url, file_path,
+                                 media_type, hashtag, bytes.fromhex(content_hash) if content_hash else None,
+                                 downloaded_at))
+                last_id = batch[-1][0]
+                with conn:
+                    entries = []
+                    for row in rows:
+                        if conn.execute('''
+                            INSERT OR IGNORE INTO media
+                            (platform, media_id, url_hash, media_url, file_path, media_type, hashtag,
+                             content_hash, downloaded_at)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ''', row).rowcount:
+                            entries.append((None, None, row[6], row[0], row[1]))
+                    migrated += len(entries)
+                    self._add_search_entries(conn, entries)
+                    conn.execute("INSERT OR REPLACE INTO migration_state (name, value) "
+                                 "VALUES ('downloaded_media', ?)", (last_id,))
+                done += len(batch)
+                if on_progress:
+                    on_progress(done, total)
+
+            if drop:
+                with conn:
+                    conn.execute('DROP TABLE downloaded_media')
+                    conn.execute("DELETE FROM migration_state WHERE name = 'downloaded_media'")
+                self.legacy_table = False
+                if vacuum:
+                    conn.execute('VACUUM')
+            logging.info(f"Şema taşıma tamamlandı: {migrated} kayıt")
+            return migrated
+        except Exception as e:
+            logging.error(f"Şema taşıma hatası: {e}")
+            return 0
+
+    def close(self):
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+            heartbeat = self._heartbeat
+            self._heartbeat = None
+        if writer is not None:
+            self._write_queue.put(None)
+            writer.join()
+        if heartbeat is not None:
+            self._heartbeat_stop.set()
+            heartbeat.join()
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for conn in connections.values():
+            try:
+                conn.close()
+            except Exception:
+                pass
+        self._local = threading.local()
+
+
+_media_trackers = {}
+_media_trackers_lock = threading.Lock()
+
+
+def lease_owner_alive(owner):
+    # Sahip bu makinedeyse süreç hâlâ çalışıyor mu bakılır; başka makinelerde ve
+    # Windows'ta (os.kill(pid, 0) orada sinyal gönderir) kiralama süresine güvenilir
+    try:
+        host, pid = owner.split(':')[:2]
+        if host != socket.gethostname() or os.name == 'nt':
+            return True
+        os.kill(int(pid), 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except (OSError, ValueError, AttributeError):
+        return True
+
+
+def get_media_tracker(db_path="downloads.db"):
+    # Aynı veritabanı için tek tracker; şema her thread'de yeniden kurulmaz
+    with _media_trackers_lock:
+        tracker = _media_trackers.get(db_path)
+        if tracker is None:
+            tracker = SQLiteMediaTracker(db_path)
+            _media_trackers[db_path] = tracker
+        return tracker
+
+class DownloadCancelled(Exception):
+    pass
+
+
+class TransferInterrupted(Exception):
+    pass
+
+
+class DownloadMetrics:
+    # Tek bir indirmenin süre dökümü (saniye). Bekleme, bağlantı (DNS dahil),
+    # ilk bayt ve aktarım süresini motor; veritabanı süresini ve sonucu thread doldurur.
+    __slots__ = ('platform', 'media_id', 'started_at', 'status', 'wait_time', 'connect_time',
+                 'ttfb', 'transfer_time', 'db_time', 'bytes', 'retries')
+
+    def __init__(self, platform, media_id):
+        self.platform = platform
+        self.media_id = media_id
+        self.started_at = time.time()
+        self.status = 'ok'
+        self.wait_time = 0.0
+        self.connect_time = 0.0
+        self.ttfb = 0.0
+        self.transfer_time = 0.0
+        self.db_time = 0.0
+        self.bytes = 0
+        self.retries = 0
+
+    def row(self):
+        return (self.platform, self.media_id, self.started_at, self.status,
+                self.wait_time * 1000, self.connect_time * 1000, self.ttfb * 1000,
+                self.transfer_time * 1000, self.db_time * 1000, self.bytes, self.retries)
+
+
+class InsufficientDiskSpace(Exception):
+    # Yazılacak dosya, boş alan alt sınırı korunarak diske sığmıyor.
+    # available: alt sınırdan sonra kalan alan; 0 veya altıysa hiçbir dosya sığmaz.
+    def __init__(self, directory, needed, available):
+        super().__init__(directory, needed, available)
+        self.directory = directory
+        self.needed = needed
+        self.available = available
+
+    @property
+    def exhausted(self):
+        return self.available <= 0
+
+    def __str__(self):
+        return (f"Yetersiz disk alanı: {self.directory} ({self.needed / 1e6:.1f} MB gerekli, "
+                f"alt sınırın üstünde {max(self.available, 0) / 1e6:.1f} MB boş)")
+
+
+class TransferResult:
+    __slots__ = ('file_path', 'bytes_written', 'resumed_from', 'content_hash')
+
+    def __init__(self, file_path, bytes_written, resumed_from=0, content_hash=None):
+        self.file_path = file_path
+        self.bytes_written = bytes_written
+        self.resumed_from = resumed_from
+        self.content_hash = content_hash
+
+
+FICLONE = 0x40049409
+
+
+def link_duplicate(existing_path, file_path):
+    # file_path'i aynı içerikteki existing_path'e hardlink (olmazsa reflink) yapar.
+    # Geçici isim üzerinden os.replace kullanıldığı için yarıda kalırsa dosya bozulmaz.
+    temp_path = file_path + '.link'
+    try:
+        try:
+            os.link(existing_path, temp_path)
+        except OSError:
+            # Farklı dosya sistemi veya hardlink desteği yok; Linux'ta reflink dene
+            if fcntl is None:
+                return False
+            with open(existing_path, 'rb') as src, open(temp_path, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        os.replace(temp_path, file_path)
+        return True
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        return False
+
+
+def deduplicate_content(tracker, file_path, content_hash):
+    if not content_hash:
+        return False
+    existing_path = tracker.find_media_by_content(content_hash)
+    if existing_path is None or os.path.abspath(existing_path) == os.path.abspath(file_path):
+        return False
+    if os.path.samefile(existing_path, file_path):
+        return True
+    return link_duplicate(existing_path, file_path)
+
+
+def perceptual_hash_available():
+    return importlib.util.find_spec('numpy') is not None and importlib.util.find_spec('PIL') is not None
+
+
+def image_dhashes(paths):
+    # Her görüntü gri tonlamalı 9x8 küçük resme indirilir; yatay komşu pikseller
+    # karşılaştırılarak 64 bit elde edilir. Karşılaştırma ve bit paketleme bütün
+    # grup için tek dizi üzerinde yapılır. Açılamayan dosyalar için None döner.
+    import numpy as np
+    from PIL import Image
+    pixels = np.zeros((len(paths), 8, 9), dtype=np.int16)
+    valid = [False] * len(paths)
+    for index, path in enumerate(paths):
+        try:
+            with Image.open(path) as image:
+                # JPEG'ler tam çözünürlük yerine küçültülerek çözülür
+                image.draft('L', (72, 64))
+                pixels[index] = np.asarray(image.convert('L').resize((9, 8), Image.BILINEAR))
+                valid[index] = True
+        except Exception:
+            continue
+    bits = pixels[:, :, 1:] > pixels[:, :, :-1]
+    hashes = np.packbits(bits.reshape(len(paths), 64), axis=1).view('>i8').ravel().tolist()
+    return [value if ok else None for value, ok in zip(hashes, valid)]
+
+
+def hamming_distance(a, b):
+    return bin((a ^ b) & PHASH_MASK).count('1')
+
+
+class HammingIndex:
+    # Çoklu indeksli Hamming araması: 64 bitlik özet dört 16 bitlik banda bölünür,
+    # her band için ayrı bir kova tablosu tutulur. Uzaklığı d olan iki özetin en az
+    # bir bandı en fazla d // 4 bit farklıdır (güvercin yuvası ilkesi); bu yüzden
+    # her bandın d // 4 yarıçaplı komşu anahtarlarının kovalarına bakılır. Varsayılan
+    # eşikte (6) band başına 17 anahtar aranır; kovalar 65536 değere dağıldığından
+    # aday sayısı kayıt sayısıyla birlikte büyümez. Komşu anahtar sayısı kayıt
+    # sayısını aşarsa bütün kayıtlar taranır.
+    BANDS = 4
+    BAND_BITS = 16
+    _flip_masks = {}
+
+    def __init__(self):
+        self.values = array('Q')
+        self.items = []
+        self.tables = [{} for _ in range(self.BANDS)]
+
+    def __len__(self):
+        return len(self.values)
+
+    def _keys(self, value):
+        band_mask = (1 << self.BAND_BITS) - 1
+        return [(value >> (self.BAND_BITS * band)) & band_mask for band in range(self.BANDS)]
+
+    @classmethod
+    def _masks(cls, radius):
+        # En fazla radius biti 1 olan band maskeleri; her yarıçap için bir kez kurulur
+        masks = cls._flip_masks.get(radius)
+        if masks is None:
+            masks = [sum(1 << bit for bit in bits)
+                     for count in range(radius + 1)
+                     for bits in itertools.combinations(range(cls.BAND_BITS), count)]
+            cls._flip_masks[radius] = masks
+        return masks
+
+    def add(self, value, item):
+        value &= PHASH_MASK
+        position = len(self.values)
+        self.values.append(value)
+        self.items.append(item)
+        for key, table in zip(self._keys(value), self.tables):
+            table.setdefault(key, []).append(position)
+
+    def search(self, value, max_distance):
+        value &= PHASH_MASK
+        radius = min(max(max_distance, 0) // self.BANDS, self.BAND_BITS)
+        probes = self.BANDS * sum(math.comb(self.BAND_BITS, count) for count in range(radius + 1))
+        if probes >= len(self.values):
+            candidates = range(len(self.values))
+        else:
+            candidates = set()
+            masks = self._masks(radius)
+            for key, table in zip(self._keys(value), self.tables):
+                for mask in masks:
+                    candidates.update(table.get(key ^ mask, ()))
+        results = []
+        for position in candidates:
+            distance = hamming_distance(value, self.values[position])
+            if distance <= max_distance:
+                results.append((distance, self.items[position]))
+        results.sort(key=lambda result: result[0])
+        return results
+
+
+_phash_pool = None
+_phash_pool_lock = threading.Lock()
+
+
+def get_phash_pool():
+    # Özetler ayrı süreçlerde hesaplanır; Qt ve motor thread'leri varken fork
+    # güvenli olmadığından spawn kullanılır
+    global _phash_pool
+    with _phash_pool_lock:
+        if _phash_pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            _phash_pool = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1),
+                                              mp_context=multiprocessing.get_context('spawn'))
+            atexit.register(_phash_pool.shutdown, wait=False, cancel_futures=True)
+        return _phash_pool
+
+
+def handle_near_duplicate(tracker, media_id, file_path, phash, mode, max_distance=NEAR_DUPLICATE_DISTANCE):
+    # En yakın benzeri döner; 'remove' kipinde yeni dosya silinir ve kayıt tutulan
+    # kopyaya yönlendirilir, aksi halde özet sonraki aramalar için indekse eklenir.
+    # Yönlendirilen kayda da özet yazılır; böylece sonraki taramalar onu yeniden
+    # ele alıp tutulan kopyayı silmez. SQLite ve dosya işi yaptığı için döngüde çağrılmaz.
+    matches = [match for match in tracker.find_near_duplicates(phash, max_distance)
+               if os.path.abspath(match[2]) != os.path.abspath(file_path)]
+    if matches and mode == 'remove':
+        os.remove(file_path)
+        tracker.replace_file_path('instagram', media_id, matches[0][2])
+        tracker.set_phash('instagram', media_id, phash, matches[0][2])
+        return matches[0]
+    tracker.set_phash('instagram', media_id, phash, file_path)
+    return matches[0] if matches else None
+
+
+def scan_near_duplicates(tracker, mode='flag', max_distance=NEAR_DUPLICATE_DISTANCE, chunk_size=64,
+                         on_match=None):
+    # Arşivde özeti olmayan Instagram fotoğrafları gruplar halinde süreç havuzunda
+    # özetlenir; sonuçlar indirme sırasıyla indekse eklenir, böylece eski kopya tutulur.
+    # Dosyası başka bir kayıtla paylaşılan (daha önce yönlendirilmiş) kayıtlar
+    # photos_without_phash tarafından atlanır; o dosyayı silmek diğer kaydı bozardı.
+    rows = [(media_id, file_path) for media_id, file_path in tracker.photos_without_phash()
+            if os.path.exists(file_path)]
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+    matched = 0
+    results = get_phash_pool().map(image_dhashes, [[file_path for _, file_path in chunk] for chunk in chunks])
+    for chunk, hashes in zip(chunks, results):
+        for (media_id, file_path), phash in zip(chunk, hashes):
+            if phash is None:
+                continue
+            match = handle_near_duplicate(tracker, media_id, file_path, phash, mode, max_distance)
+            if match is not None:
+                matched += 1
+                if on_match:
+                    on_match(file_path, match)
+    return len(rows), matched
+
+
+# İndirme klasörünün düzeni; tek klasörde yüz binlerce dosya listeleme ve
+# yedeklemeyi yavaşlattığı için dosyalar alt klasörlere dağıtılabilir
+STORAGE_LAYOUTS = {'flat': 'Tek Klasör', 'date': 'Platform/Tarih', 'hash': 'Platform/Özet'}
+
+
+def media_file_path(root, layout, platform, filename, timestamp=None):
+    # flat: root/ad, date: root/platform/YYYY/AA/GG/ad (gönderi, yoksa indirme tarihi),
+    # hash: root/platform/ab/cd/ad (dosya adının MD5 öneki; 65536 klasöre eşit dağılır)
+    if layout == 'date':
+        when = datetime.fromtimestamp(timestamp) if timestamp else datetime.now()
+        directory = os.path.join(root, platform, f"{when:%Y}", f"{when:%m}", f"{when:%d}")
+    elif layout == 'hash':
+        prefix = hashlib.md5(filename.encode('utf-8')).hexdigest()
+        directory = os.path.join(root, platform, prefix[:2], prefix[2:4])
+    else:
+        directory = root
+    return os.path.join(directory, filename)
+
+
+def move_media_file(source, target):
+    # Sonuç: 'moved', 'updated' (dosya zaten hedefte), 'missing' veya 'failed'
+    try:
+        if not os.path.exists(source):
+            return 'updated' if os.path.exists(target) else 'missing'
+        if os.path.exists(target):
+            if not os.path.samefile(source, target):
+                logging.error(f"Hedefte başka bir dosya var: {target}")
+                return 'failed'
+            # Aynı inode'a iki bağlantı; rename hiçbir şey yapmaz, kaynak silinir
+            os.remove(source)
+            return 'moved'
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+        return 'moved'
+    except OSError as e:
+        logging.error(f"Dosya taşıma hatası: {source}: {e}")
+        return 'failed'
+
+
+def remove_empty_directories(directories, root):
+    # Taşımadan sonra boşalan klasörler root'a kadar yukarı doğru silinir
+    root = os.path.abspath(root)
+    for directory in sorted(directories, key=len, reverse=True):
+        directory = os.path.abspath(directory)
+        while directory != root and directory.startswith(root + os.sep):
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+
+RETRYABLE_STATUS = (408, 425, 429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value):
+    # Retry-After saniye veya HTTP tarihi olabilir; anlaşılamazsa None döner
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class RequestScheduler:
+    # Host başına token bucket: saniyede rate istek, en fazla burst birikmiş hak.
+    # Sunucu 429/503 veya Retry-After ile bekleme isterse host o ana kadar kapatılır;
+    # ipucu yoksa bekleme üstel artar. Hak ayırma sırayla yapıldığından bekleyenler adil
+    # biçimde sıraya girer. Hem senkron (requests) hem asyncio (motor) çağrılarından kullanılır.
+    def __init__(self, default_rate=2.0, default_burst=4, host_limits=None,
+                 base_backoff=2.0, max_backoff=600.0):
+        if not default_rate > 0:
+            raise ValueError("İstek hızı pozitif olmalıdır")
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self.host_limits = dict(host_limits or {})
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def configure(self, host, rate, burst=None):
+        if not rate > 0:
+            raise ValueError("İstek hızı pozitif olmalıdır")
+        with self._lock:
+            self.host_limits[host] = (rate, burst or self.default_burst)
+
+    def _reserve(self, url):
+        host = urlparse(url).netloc
+        now = time.monotonic()
+        with self._lock:
+            rate, burst = self.host_limits.get(host, (self.default_rate, self.default_burst))
+            state = self._hosts.get(host)
+            if state is None:
+                state = {'tokens': float(burst), 'updated': now, 'blocked_until': 0.0, 'failures': 0}
+                self._hosts[host] = state
+            state['tokens'] = min(float(burst), state['tokens'] + (now - state['updated']) * rate)
+            state['updated'] = now
+            state['tokens'] -= 1
+            delay = -state['tokens'] / rate if state['tokens'] < 0 else 0.0
+            return max(delay, state['blocked_until'] - now)
+
+    def acquire(self, url, is_running=None):
+        # Uzun Retry-After beklemeleri durdurma isteğiyle kesilebilsin diye parça parça uyunur
+        deadline = time.monotonic() + self._reserve(url)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (is_running is not None and not is_running()):
+                return
+            time.sleep(min(remaining, 0.2))
+
+    async def acquire_async(self, url):
+        delay = self._reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def backoff(self, url, retry_after=None):
+        host = urlparse(url).netloc
+        with self._lock:
+            state = self._hosts.setdefault(
+                host, {'tokens': 0.0, 'updated': time.monotonic(), 'blocked_until': 0.0, 'failures': 0})
+            state['failures'] += 1
+            if retry_after is None:
+                delay = self.base_backoff * (2 ** (state['failures'] - 1)) * random.uniform(0.8, 1.2)
+            else:
+                delay = retry_after
+            delay = min(delay, self.max_backoff)
+            state['blocked_until'] = max(state['blocked_until'], time.monotonic() + delay)
+            return delay
+
+    def success(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is not None:
+                state['failures'] = 0
+
+
+_request_scheduler = None
+_request_scheduler_lock = threading.Lock()
+
+
+def get_request_scheduler():
+    global _request_scheduler
+    with _request_scheduler_lock:
+        if _request_scheduler is None:
+            _request_scheduler = RequestScheduler()
+        return _request_scheduler
+
+
+class BandwidthLimiter:
+    # Süreç genelinde bayt/sn token bucket. '*' kapsamı tüm aktarımları, platform adı
+    # yalnızca o platformun aktarımlarını sınırlar; gelen her parça iki kovadan da düşülür.
+    # RequestScheduler'daki gibi hak sırayla ayrılır, kova borca girer ve bekleme
+    # borç / hız kadardır. Sınırlar çalışırken configure() ile değişir; tracker verilirse
+    # kayıtlı ayarlar refresh_interval saniyede bir G/Ç havuzunda yeniden okunur, motor
+    # döngüsü yalnızca bellekteki sınırları kullanır.
+    def __init__(self, limits=None, burst_seconds=0.5, tracker=None, refresh_interval=2.0):
+        self.burst_seconds = burst_seconds
+        self.tracker = tracker
+        self.refresh_interval = refresh_interval
+        self._limits = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._refreshed = 0.0
+        self._reloading = False
+        # Sınır yokken aktarım döngüsü kilit almadan geçer
+        self.enabled = False
+        self.configure(limits or {})
+
+    def configure(self, limits):
+        # {kapsam: bayt/sn}; 0 veya None sınırsız demektir
+        with self._lock:
+            self._limits = {scope: float(rate) for scope, rate in limits.items() if rate}
+            self._buckets = {scope: bucket for scope, bucket in self._buckets.items()
+                             if scope in self._limits}
+            self.enabled = bool(self._limits)
+
+    def limits(self):
+        with self._lock:
+            return {scope: int(rate) for scope, rate in self._limits.items()}
+
+    def watch(self, tracker):
+        # Sınırların okunacağı veritabanı; GUI ve `vi.py bandwidth` oraya yazar,
+        # çalışan süreçler birkaç saniye içinde yeni değeri alır
+        self.tracker = tracker
+
+    def refresh(self, executor):
+        # Motor döngüsünden çağrılır: okuma zamanı geldiyse executor'a bırakılır,
+        # sonucu beklenmez
+        tracker = self.tracker
+        if tracker is None or self._reloading:
+            return
+        now = time.monotonic()
+        if now - self._refreshed < self.refresh_interval:
+            return
+        self._refreshed = now
+        self._reloading = True
+        executor.submit(self._reload, tracker)
+
+    def _reload(self, tracker):
+        try:
+            limits = tracker.get_bandwidth_limits()
+            if limits is not None and limits != self.limits():
+                self.configure(limits)
+        finally:
+            self._reloading = False
+
+    def _reserve(self, scopes, size):
+        now = time.monotonic()
+        delay = 0.0
+        with self._lock:
+            for scope in scopes:
+                rate = self._limits.get(scope)
+                if rate is None:
+                    continue
+                burst = rate * self.burst_seconds
+                bucket = self._buckets.get(scope)
+                if bucket is None:
+                    bucket = {'tokens': burst, 'updated': now}
+                    self._buckets[scope] = bucket
+                bucket['tokens'] = min(burst, bucket['tokens'] + (now - bucket['updated']) * rate)
+                bucket['updated'] = now
+                bucket['tokens'] -= size
+                if bucket['tokens'] < 0:
+                    delay = max(delay, -bucket['tokens'] / rate)
+        return delay
+
+    async def consume_async(self, platform, size):
+        delay = self._reserve(('*', platform), size)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+_bandwidth_limiter = None
+_bandwidth_limiter_lock = threading.Lock()
+
+
+def get_bandwidth_limiter():
+    global _bandwidth_limiter
+    with _bandwidth_limiter_lock:
+        if _bandwidth_limiter is None:
+            _bandwidth_limiter = BandwidthLimiter()
+        return _bandwidth_limiter
+
+
+class DownloadEngine:
+    # Tüm platformların paylaştığı asyncio indirme motoru. Döngü kendi thread'inde
+    # çalışır; iş parçacıkları submit() ile coroutine gönderir ve concurrent.futures
+    # Future'ı alır. Bağlantılar httpx havuzunda keep-alive ile yeniden kullanılır.
+    # Döngüyü bekletebilecek disk ve SQLite işleri (fsync, kayıt, özet okuma) io_workers
+    # thread'lik havuzda run_blocking() ile çalıştırılır.
+    def __init__(self, max_connections=32, per_host_limit=4, http2=False, timeout=30,
+                 chunk_size=65536, max_chunk_size=4 * 1024 * 1024, retries=3,
+                 checkpoint_bytes=4 * 1024 * 1024, checkpoint_interval=1.0, scheduler=None,
+                 bandwidth=None, min_free_bytes=512 * 1024 * 1024, io_workers=8):
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.http2 = http2
+        self.timeout = timeout
+        # Yazma tamponu chunk_size ile max_chunk_size arasında ölçülen hıza göre büyür
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.retries = retries
+        self.scheduler = scheduler or get_request_scheduler()
+        self.bandwidth = bandwidth or get_bandwidth_limiter()
+        # İndirmeler diskte en az bu kadar boş alan kalacaksa başlar
+        self.min_free_bytes = min_free_bytes
+        self.checkpoint_bytes = checkpoint_bytes
+        self.checkpoint_interval = checkpoint_interval
+        self.io_workers = io_workers
+        self._loop = None
+        self._thread = None
+        self._client = None
+        self._io = None
+        # Boş alan kontrolü ile ön ayırma havuzda ayrı thread'lerde yapıldığından
+        # ikisi birlikte bu kilitle korunur; iki aktarım aynı boş alanı kullanamaz
+        self._reserve_lock = threading.Lock()
+        # Arayüzün hız/ETA göstergesi için toplam sayaçlar; yalnızca döngü thread'i yazar
+        self.bytes_received = 0
+        self.files_completed = 0
+        self._host_slots = {}
+        # Sunucu başına son seçilen tampon boyutu; yeni indirme buradan başlar
+        self._block_sizes = {}
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        global httpx
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            import httpx
+            self._io = ThreadPoolExecutor(self.io_workers, thread_name_prefix='DownloadIO')
+            loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=loop.run_forever, name='DownloadEngine', daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+            self._loop = loop
+
+    async def _open(self):
+        http2 = self.http2
+        if http2 and importlib.util.find_spec('h2') is None:
+            logging.warning("HTTP/2 için 'h2' paketi bulunamadı, HTTP/1.1 kullanılıyor")
+            http2 = False
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=self.max_connections,
+                                max_keepalive_connections=self.max_connections)
+        )
+
+    def submit(self, coro):
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def run_blocking(self, func, *args):
+        # Engelleyen çağrıyı G/Ç havuzunda çalıştırır; döngü bu sırada diğer aktarımlara devam eder
+        return await asyncio.get_running_loop().run_in_executor(self._io, func, *args)
+
+    def _host_slot(self, url):
+        host = urlparse(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = asyncio.Semaphore(self.per_host_limit)
+            self._host_slots[host] = slot
+        return slot
+
+    async def fetch(self, url, filename, headers=None, cookies=None, is_running=None,
+                    on_progress=None, journal=None, transfer_key=None, metrics=None, platform=None):
+        # Dosyayı önce filename + '.part' olarak indirir, tamamlanınca yerine taşır.
+        # journal (SQLiteMediaTracker) ve transfer_key verilirse ilerleme kaydedilir;
+        # durdurma, çökme veya ağ hatasından sonra indirme Range ile kaldığı yerden sürer.
+        # Her deneme zamanlayıcıdan hak alır; 429/503 ve ağ hatalarında Retry-After'a
+        # veya üstel beklemeye uyulur. Kalıcı hata kodlarında yarım dosya ve kayıt silinir.
+        # metrics (DownloadMetrics) verilirse bekleme ve ağ süreleri ona yazılır.
+        # Okunan baytlar BandwidthLimiter'ın genel ve platform sınırlarından düşülür.
+        # Disk zaten alt sınırdaysa istek hiç gönderilmez (InsufficientDiskSpace).
+        await self.run_blocking(self._admit, filename, 0)
+        waiting_since = time.monotonic()
+        async with self._host_slot(url):
+            for attempt in range(1, self.retries + 1):
+                await self.scheduler.acquire_async(url)
+                if metrics is not None:
+                    metrics.wait_time += time.monotonic() - waiting_since
+                    metrics.retries = attempt - 1
+                try:
+                    self.bandwidth.refresh(self._io)
+                    result = await self._transfer(url, filename, headers, cookies, is_running,
+                                                  on_progress, journal, transfer_key, metrics, platform)
+                    self.scheduler.success(url)
+                    return result
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code not in RETRYABLE_STATUS:
+                        await self.run_blocking(self._abandon, filename, journal, transfer_key)
+                        raise
+                    if attempt == self.retries:
+                        raise
+                    self.scheduler.backoff(url, parse_retry_after(e.response.headers.get('retry-after')))
+                except (httpx.HTTPError, TransferInterrupted):
+                    if attempt == self.retries:
+                        raise
+                    self.scheduler.backoff(url)
+                waiting_since = time.monotonic()
+
+    @staticmethod
+    def _tracer(metrics):
+        # httpcore trace olayları: TCP bağlantısı (ad çözümleme dahil) ve TLS el sıkışması
+        started = 0.0
+
+        async def trace(event, info):
+            nonlocal started
+            if event in ('connection.connect_tcp.started', 'connection.start_tls.started'):
+                started = time.monotonic()
+            elif event in ('connection.connect_tcp.complete', 'connection.start_tls.complete'):
+                metrics.connect_time += time.monotonic() - started
+        return trace
+
+    async def _transfer(self, url, filename, headers, cookies, is_running, on_progress,
+                        journal, transfer_key, metrics=None, platform=None):
+        state = None
+        if journal is not None and transfer_key:
+            state = await self.run_blocking(journal.get_transfer, transfer_key)
+            if state is not None:
+                filename = state['file_path']
+        part_path = filename + '.part'
+
+        offset = 0
+        request_headers = {'Accept-Encoding': 'identity', **(headers or {})}
+        if state is not None and os.path.exists(part_path):
+            offset = min(os.path.getsize(part_path), state['bytes_written'])
+        if offset:
+            request_headers['Range'] = f'bytes={offset}-'
+            validator = state['etag'] or state['last_modified']
+            if validator:
+                request_headers['If-Range'] = validator
+
+        extensions = {'trace': self._tracer(metrics)} if metrics is not None else None
+        requested_at = time.monotonic()
+        async with self._client.stream('GET', url, headers=request_headers, cookies=cookies,
+                                       extensions=extensions) as response:
+            headers_at = time.monotonic()
+            if metrics is not None:
+                metrics.ttfb = headers_at - requested_at
+            if response.status_code == 416 and offset:
+                # Kayıtlı aralık artık geçerli değil; bir sonraki deneme baştan başlar
+                await self.run_blocking(self._abandon, filename, journal, transfer_key)
+                raise TransferInterrupted(f"Aralık kabul edilmedi: {url}")
+            response.raise_for_status()
+
+            if response.status_code != 206:
+                offset = 0
+            expected_length = None
+            content_range = response.headers.get('content-range', '')
+            if response.status_code == 206 and '/' in content_range:
+                total = content_range.rsplit('/', 1)[1]
+                expected_length = int(total) if total.isdigit() else None
+            elif response.headers.get('content-length', '').isdigit():
+                expected_length = offset + int(response.headers['content-length'])
+
+            # Boyut yanıt başlığından öğrenilir; dosya sığmıyorsa gövde okunmadan bağlantı
+            # kapatılır (_reserve: kabul, dosyayı açma ve ön ayırma tek adımda)
+            f = await self.run_blocking(self._reserve, filename, part_path, offset, expected_length)
+
+            etag = response.headers.get('etag')
+            last_modified = response.headers.get('last-modified')
+
+            # Accept-Encoding: identity gönderildiği için gövde çoğunlukla ham okunur;
+            # sunucu yine de sıkıştırırsa çözülmüş akış kullanılır
+            if response.headers.get('content-encoding', 'identity') == 'identity':
+                stream = response.aiter_raw()
+            else:
+                stream = response.aiter_bytes()
+
+            downloaded = offset
+            digest = hashlib.sha256()
+            with f:
+                if journal is not None and transfer_key:
+                    await self.run_blocking(journal.save_transfer, transfer_key, url, filename,
+                                            expected_length, offset, etag, last_modified)
+                if offset:
+                    # Devam edilen indirmede özet, diskteki ön ek okunarak tamamlanır
+                    await self.run_blocking(self._hash_prefix, f, digest, offset)
+                f.seek(offset)
+                checkpoint_bytes = offset
+                checkpoint_time = time.monotonic()
+                async for block in self._blocks(stream, urlparse(url).netloc, platform):
+                    size = self._write_all(f, block)
+                    for part in block:
+                        digest.update(part)
+                    downloaded += size
+                    self.bytes_received += size
+                    if is_running is not None and not is_running():
+                        await self.run_blocking(self._checkpoint, f, journal, transfer_key, downloaded)
+                        raise DownloadCancelled(filename)
+                    if on_progress is not None:
+                        on_progress(downloaded, expected_length or 0)
+                    if (downloaded - checkpoint_bytes >= self.checkpoint_bytes
+                            or time.monotonic() - checkpoint_time >= self.checkpoint_interval):
+                        await self.run_blocking(self._checkpoint, f, journal, transfer_key, downloaded)
+                        checkpoint_bytes = downloaded
+                        checkpoint_time = time.monotonic()
+                        if expected_length is None:
+                            # Boyutu bilinmeyen aktarım ön ayrılamaz; alt sınıra inince durur,
+                            # kayıt kaldığı için yer açılınca devam edilebilir
+                            await self.run_blocking(self._admit, filename, 0)
+                await self.run_blocking(self._checkpoint, f, journal, transfer_key, downloaded)
+
+        if expected_length is not None and downloaded != expected_length:
+            raise TransferInterrupted(f"Eksik indirme: {downloaded}/{expected_length} bayt")
+
+        await self.run_blocking(self._complete, part_path, filename, journal, transfer_key)
+        self.files_completed += 1
+        if metrics is not None:
+            metrics.transfer_time = time.monotonic() - headers_at
+            metrics.bytes = downloaded - offset
+        return TransferResult(filename, downloaded, offset, digest.hexdigest())
+
+    async def _blocks(self, stream, host, platform=None):
+        # Ağdan gelen parçalar kopyalanmadan bir listede biriktirilir; toplam boyut
+        # blok boyutuna ulaşınca liste tek blok olarak verilir ve tek sistem çağrısıyla
+        # yazılır (_write_all). Yazma ve durum kontrolü parça başına değil blok başına
+        # yapılır. Blok boyutu ölçülen hıza göre 0.1 sn'de bir yeniden hesaplanır
+        # (_block_size). Bant genişliği sınırı varsa her parça sokette beklerken
+        # okunmadan önce hak alır.
+        capacity = self._block_sizes.get(host, self.chunk_size)
+        parts = []
+        filled = 0
+        window_bytes = 0
+        window_start = time.monotonic()
+        bandwidth = self.bandwidth
+        async for chunk in stream:
+            size = len(chunk)
+            if not size:
+                continue
+            if bandwidth.enabled:
+                await bandwidth.consume_async(platform, size)
+            window_bytes += size
+            parts.append(chunk)
+            filled += size
+            if filled < capacity:
+                continue
+            yield parts
+            parts = []
+            filled = 0
+            # Blok verildikten sonra boyut değiştirilebilir
+            now = time.monotonic()
+            if now - window_start >= 0.1:
+                bandwidth.refresh(self._io)
+                capacity = self._block_size(window_bytes / (now - window_start))
+                self._block_sizes[host] = capacity
+                window_bytes = 0
+                window_start = now
+        if parts:
+            yield parts
+
+    def _block_size(self, rate):
+        # Bir bloğun ~0.1 sn'de dolacağı, chunk_size..max_chunk_size aralığında ikinin kuvveti
+        target = self.chunk_size
+        while target < self.max_chunk_size and target * 2 <= rate * 0.1:
+            target *= 2
+        return target
+
+    @staticmethod
+    def _write_all(f, parts):
+        # Parçalar os.writev ile tek çağrıda, kopyalanmadan yazılır (IOV_MAX sınırı için
+        # en fazla 512 parça); eksik yazılan kısım aynı bellekten sürdürülür. writev
+        # olmayan sistemlerde (Windows) parçalar ayrı ayrı yazılır. Yazılan bayt döner.
+        total = 0
+        if hasattr(os, 'writev'):
+            fd = f.fileno()
+            pending = list(parts)
+            while pending:
+                batch = pending[:512]
+                written = os.writev(fd, batch)
+                total += written
+                del pending[:len(batch)]
+                for index, part in enumerate(batch):
+                    if written < len(part):
+                        # Kısmen yazılan parçanın kalanı ve yazılmayanlar sıraya geri konur
+                        pending[:0] = [memoryview(part)[written:]] + batch[index + 1:]
+                        break
+                    written -= len(part)
+            return total
+        for part in parts:
+            view = memoryview(part)
+            written = 0
+            while written < len(view):
+                written += f.write(view[written:])
+            total += written
+        return total
+
+    def _admit(self, filename, needed):
+        if not self.min_free_bytes and not needed:
+            return
+        directory = os.path.dirname(os.path.abspath(filename))
+        available = shutil.disk_usage(directory).free - self.min_free_bytes
+        if needed > available or available <= 0:
+            raise InsufficientDiskSpace(directory, needed, available)
+
+    def _reserve(self, filename, part_path, offset, expected_length):
+        # Havuz thread'inde çalışır: boş alan kontrol edilir, .part dosyası açılır ve
+        # beklenen boyuta ön ayrılır. Açılan dosya çağırana döner.
+        with self._reserve_lock:
+            self._admit(filename, expected_length - offset if expected_length is not None else 0)
+            f = open(part_path, 'r+b' if offset else 'wb', buffering=0)
+            try:
+                f.truncate(offset)
+                if expected_length is not None:
+                    self._preallocate(f, offset, expected_length)
+            except BaseException:
+                f.close()
+                raise
+        return f
+
+    @staticmethod
+    def _complete(part_path, filename, journal, transfer_key):
+        os.replace(part_path, filename)
+        if journal is not None and transfer_key:
+            journal.remove_transfer(transfer_key)
+
+    @staticmethod
+    def _preallocate(f, offset, length):
+        # Dosya beklenen boyuta önceden ayrılır; parçalanma azalır, yer yoksa
+        # indirme başlamadan hata verir
+        if length > offset and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(f.fileno(), offset, length - offset)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise
+                logging.debug(f"Ön ayırma desteklenmiyor: {e}")
+
+    @staticmethod
+    def _hash_prefix(f, digest, length):
+        f.seek(0)
+        remaining = length
+        while remaining:
+            block = f.read(min(remaining, 1024 * 1024))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+
+    @staticmethod
+    def _checkpoint(f, journal, transfer_key, downloaded):
+        # Diske yazılmış (fsync) ofset kaydedilir; çökmeden sonra buradan devam edilir
+        f.flush()
+        os.fsync(f.fileno())
+        if journal is not None and transfer_key:
+            journal.update_transfer(transfer_key, downloaded)
+
+    def _abandon(self, filename, journal, transfer_key):
+        if journal is not None and transfer_key:
+            state = journal.get_transfer(transfer_key)
+            if state is not None:
+                filename = state['file_path']
+            journal.remove_transfer(transfer_key)
+        self._discard(filename + '.part')
+
+    @staticmethod
+    def _discard(filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def close(self):
+        with self._start_lock:
+            loop, self._loop = self._loop, None
+            if loop is None:
+                return
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            self._thread.join()
+            loop.close()
+            self._io.shutdown()
+            self._io = None
+            self._client = None
+            self._host_slots = {}
+
+
+_download_engine = None
+_download_engine_lock = threading.Lock()
+
+
+def get_download_engine():
+    global _download_engine
+    with _download_engine_lock:
+        if _download_engine is None:
+            _download_engine = DownloadEngine()
+        return _download_engine
+
+
+class MetricsRegistry:
+    # Platform başına toplam sayaçlar ve aşama süresi histogramları süreç boyunca
+    # birikir (rate() ve histogram_quantile() için); son `window` saniyedeki
+    # indirmelerin hızı ve yüzdelikleri ayrı gauge serileri olarak verilir.
+    # Prometheus metin biçiminde dışa verilir.
+    BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+    PHASES = (('wait', 'wait_time'), ('connect', 'connect_time'), ('ttfb', 'ttfb'),
+              ('transfer', 'transfer_time'), ('db', 'db_time'))
+    QUANTILES = (0.5, 0.95)
+
+    def __init__(self, window=300.0):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._downloads = {}
+        self._bytes = {}
+        self._retries = {}
+        # (platform, aşama) -> [kova sayıları (son kova +Inf), toplam süre, adet]
+        self._histograms = {}
+
+    def observe(self, metrics):
+        now = time.monotonic()
+        platform = metrics.platform
+        with self._lock:
+            self._samples.setdefault(platform, deque()).append((now, metrics))
+            key = (platform, metrics.status)
+            self._downloads[key] = self._downloads.get(key, 0) + 1
+            self._bytes[platform] = self._bytes.get(platform, 0) + metrics.bytes
+            self._retries[platform] = self._retries.get(platform, 0) + metrics.retries
+            for phase, attr in self.PHASES:
+                value = getattr(metrics, attr)
+                histogram = self._histograms.get((platform, phase))
+                if histogram is None:
+                    histogram = self._histograms[(platform, phase)] = [[0] * (len(self.BUCKETS) + 1), 0.0, 0]
+                histogram[0][bisect.bisect_left(self.BUCKETS, value)] += 1
+                histogram[1] += value
+                histogram[2] += 1
+            self._expire(now)
+
+    def _expire(self, now):
+        for samples in self._samples.values():
+            while samples and now - samples[0][0] > self.window:
+                samples.popleft()
+
+    def render(self):
+        lines = []
+        with self._lock:
+            self._expire(time.monotonic())
+            lines += ['# HELP downloader_downloads_total İndirme denemeleri (sonuca göre)',
+                      '# TYPE downloader_downloads_total counter']
+            for (platform, status), count in sorted(self._downloads.items()):
+                lines.append(f'downloader_downloads_total{{platform="{platform}",status="{status}"}} {count}')
+            lines += ['# HELP downloader_bytes_total İndirilen bayt',
+                      '# TYPE downloader_bytes_total counter']
+            for platform, total in sorted(self._bytes.items()):
+                lines.append(f'downloader_bytes_total{{platform="{platform}"}} {total}')
+            lines += ['# HELP downloader_retries_total Yeniden denemeler',
+                      '# TYPE downloader_retries_total counter']
+            for platform, total in sorted(self._retries.items()):
+                lines.append(f'downloader_retries_total{{platform="{platform}"}} {total}')
+
+            lines += [f'# HELP downloader_throughput_bytes_per_second Son {self.window:.0f} sn ortalama hız',
+                      '# TYPE downloader_throughput_bytes_per_second gauge']
+            for platform, samples in sorted(self._samples.items()):
+                total = sum(metrics.bytes for _, metrics in samples)
+                lines.append(f'downloader_throughput_bytes_per_second{{platform="{platform}"}} '
+                             f'{total / self.window:.1f}')
+
+            lines += ['# HELP downloader_phase_seconds İndirmelerin aşama süreleri',
+                      '# TYPE downloader_phase_seconds histogram']
+            for (platform, phase), (buckets, total, count) in sorted(self._histograms.items()):
+                labels = f'platform="{platform}",phase="{phase}"'
+                cumulative = 0
+                for bound, bucket in zip(self.BUCKETS, buckets):
+                    cumulative += bucket
+                    lines.append(f'downloader_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'downloader_phase_seconds_bucket{{{labels},le="+Inf"}} {count}')
+                lines.append(f'downloader_phase_seconds_sum{{{labels}}} {total:.6f}')
+                lines.append(f'downloader_phase_seconds_count{{{labels}}} {count}')
+
+            lines += [f'# HELP downloader_recent_phase_seconds Son {self.window:.0f} sn içindeki '
+                      f'indirmelerin aşama süresi yüzdelikleri',
+                      '# TYPE downloader_recent_phase_seconds gauge']
+            for platform, samples in sorted(self._samples.items()):
+                if not samples:
+                    continue
+                for phase, attr in self.PHASES:
+                    values = sorted(getattr(metrics, attr) for _, metrics in samples)
+                    for quantile in self.QUANTILES:
+                        value = values[min(len(values) - 1, int(quantile * len(values)))]
+                        lines.append(f'downloader_recent_phase_seconds{{platform="{platform}",'
+                                     f'phase="{phase}",quantile="{quantile}"}} {value:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+_metrics_registry = MetricsRegistry()
+
+
+def get_metrics_registry():
+    return _metrics_registry
+
+
+def record_download_metrics(tracker, metrics):
+    tracker.queue_metrics(metrics)
+    _metrics_registry.observe(metrics)
+
+
+def start_metrics_server(port, registry=None):
+    # Yalnızca 127.0.0.1'e bağlanır; GET /metrics Prometheus metin biçimini döner.
+    # port=0 verilirse boş bir port seçilir (server.server_address[1]).
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    registry = registry or _metrics_registry
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Ölçüm sunucusu: http://127.0.0.1:{server.server_address[1]}/metrics")
+    return server
+
+
+class ProgressThrottle:
+    # İlerleme sinyalini en fazla interval saniyede bir ve yalnızca değer
+    # değiştiğinde yayar. Parça başına gelen çağrılar thread'ler arası birkaç
+    # Qt sinyaline iner; force ile son değer beklemeden gönderilir.
+    def __init__(self, signal, compute, interval=0.1):
+        self.signal = signal
+        self.compute = compute
+        self.interval = interval
+        self._last_value = None
+        self._last_time = 0.0
+
+    def __call__(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_time < self.interval:
+            return
+        value = self.compute()
+        if value == self._last_value:
+            return
+        self._last_value = value
+        self._last_time = now
+        self.signal.emit(value)
+
+
+class MediaRecord:
+    # Hashtag akışından yalnızca indirme ve katalog için gereken alanlar tutulur
+    __slots__ = ('media_id', 'media_type', 'url', 'metadata')
+
+    def __init__(self, media_id, media_type, url, metadata=None):
+        self.media_id = media_id
+        self.media_type = media_type
+        self.url = url
+        self.metadata = metadata or {}
+
+    @classmethod
+    def from_media(cls, media):
+        url = media.video_url if media.media_type == 2 else media.thumbnail_url
+        taken_at = getattr(media, 'taken_at', None)
+        metadata = {
+            'caption': getattr(media, 'caption_text', None) or None,
+            'author': getattr(getattr(media, 'user', None), 'username', None),
+            'created_at': int(taken_at.timestamp()) if isinstance(taken_at, datetime) else taken_at,
+            'duration': getattr(media, 'video_duration', None) or None,
+        }
+        return cls(str(media.id), media.media_type, str(url) if url else None, metadata)
+
+
+def image_size(path):
+    # Yalnızca dosya başlığı okunur; Pillow yoksa veya görüntü okunamazsa boyut bilinmez
+    if importlib.util.find_spec('PIL') is None:
+        return None, None
+    from PIL import Image
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except Exception:
+        return None, None
+
+
+def prefetch(iterable, maxsize, is_running):
+    # iterable arka plandaki bir üretici thread'de tüketilir ve sınırlı bir kuyruğa
+    # konur; üretici kuyruk doluysa bekler. Üreticideki hata tüketicide yeniden fırlatılır.
+    items = queue.Queue(maxsize)
+    done = object()
+    errors = []
+    closed = threading.Event()
+
+    def put(item):
+        while is_running() and not closed.is_set():
+            try:
+                items.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            try:
+                item = items.get(timeout=0.2)
+            except queue.Empty:
+                if not is_running():
+                    return
+                continue
+            if item is done:
+                break
+            yield item
+    finally:
+        closed.set()
+    if errors:
+        raise errors[0]
+
+
+SESSION_DIR = 'sessions'
+INSTAGRAM_API_URL = 'https://i.instagram.com/'
+TIKTOK_URL = 'https://www.tiktok.com'
+TIKTOK_SESSION_PATH = os.path.join(SESSION_DIR, 'tiktok.json')
+# Saklanan TikTok çerezlerinin ve arama sayfalarının geçerlilik süreleri (saniye).
+# Arama sayfalarındaki video adresleri imzalı ve birkaç saat geçerli olduğundan
+# sayfa doğrudan yalnızca kısa süre kullanılır; sonrasında ETag ile doğrulanır.
+TIKTOK_SESSION_TTL = 6 * 3600
+SEARCH_PAGE_TTL = 10 * 60
+SEARCH_CACHE_MAX_AGE = 24 * 3600
+LoginRequired = None  # instagrapi ile birlikte yüklenir
+
+
+def instagram_session_path(username):
+    # Dosya adı kullanıcı adının özetidir; hesap adı diskte açıkça görünmez
+    digest = hashlib.sha256(username.strip().lower().encode('utf-8')).hexdigest()[:16]
+    return os.path.join(SESSION_DIR, f"instagram_{digest}.json")
+
+
+def write_session_file(session_path, data):
+    # Oturum çerezleri yalnızca sahibinin okuyabileceği (0600) bir dosyaya atomik yazılır;
+    # geçici dosya adı, aynı dosyayı yazan eşzamanlı işler çakışmasın diye benzersizdir
+    os.makedirs(os.path.dirname(session_path), mode=0o700, exist_ok=True)
+    temp_path = f"{session_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(temp_path, session_path)
+
+
+def save_instagram_session(client, session_path):
+    try:
+        write_session_file(session_path, client.get_settings())
+    except Exception as e:
+        logging.error(f"Instagram oturumu kaydedilemedi: {e}")
+
+
+def save_tiktok_session(session):
+    # Ana sayfadan alınan çerezler (tt_csrf_token dahil) sonraki çalıştırmalarda
+    # aynı ana sayfa isteğini tekrarlamamak için saklanır
+    try:
+        cookies = [{'name': cookie.name, 'value': cookie.value, 'domain': cookie.domain,
+                    'path': cookie.path, 'expires': cookie.expires, 'secure': cookie.secure}
+                   for cookie in session.cookies]
+        write_session_file(TIKTOK_SESSION_PATH, {'saved_at': time.time(), 'cookies': cookies})
+    except Exception as e:
+        logging.error(f"TikTok oturumu kaydedilemedi: {e}")
+
+
+def load_tiktok_session(session, max_age=None):
+    # Süresi dolmamış çerezler oturuma yüklenir; dosya max_age'den eskiyse kullanılmaz
+    max_age = TIKTOK_SESSION_TTL if max_age is None else max_age
+    try:
+        if not os.path.exists(TIKTOK_SESSION_PATH):
+            return False
+        with open(TIKTOK_SESSION_PATH, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        now = time.time()
+        if now - saved.get('saved_at', 0) > max_age:
+            return False
+        loaded = False
+        for cookie in saved.get('cookies', []):
+            if cookie.get('expires') and cookie['expires'] <= now:
+                continue
+            session.cookies.set(cookie['name'], cookie['value'], domain=cookie['domain'],
+                                path=cookie['path'], expires=cookie['expires'], secure=cookie['secure'])
+            loaded = True
+        return loaded
+    except Exception as e:
+        logging.error(f"TikTok oturumu okunamadı: {e}")
+        return False
+
+
+class DownloaderThread(QThread):
+    # Instagram ve TikTok indiricilerinin ortak kısmı: sinyaller, sayaçlar, iş
+    # sonuçlarının toplanması, disk doluluğu ve durdurma
     progress_updated = pyqtSignal(str)
     download_complete = pyqtSignal(str)
     download_error = pyqtSignal(str)
     progress_count = pyqtSignal(int)
 
-    def __init__(self, hashtag, download_path, limit=None, username="", password="", 
-                 download_photos=True, download_videos=True):
+    # Alt sınıfların mesajlarında kullandığı öğe adı ("medya", "video")
+    item_label = 'medya'
+
+    def __init__(self, download_path, limit=None, max_workers=3, layout='flat'):
         super().__init__()
-        self.hashtag = hashtag
         self.download_path = download_path
         self.limit = limit
+        self.layout = layout
+        self.is_running = True
+        # Disk alt sınıra indiği için indirme durdurulduysa nedeni; iş tamamlanmış sayılmaz
+        self.halted = None
+        self.media_tracker = get_media_tracker()
+        self.engine = get_download_engine()
+        self.engine.bandwidth.watch(self.media_tracker)
+        # Eşzamanlı indirme ayarı; istek hızı paylaşılan RequestScheduler ile sınırlanır
+        self.max_workers = max_workers
+        self.scheduler = get_request_scheduler()
+        self._job_slots = asyncio.Semaphore(max_workers)
+        self._futures = {}
+        # İndirilmekte olan medyalar; işler motor döngüsünde çalıştığı için kilit gerekmez
+        self._in_flight = set()
+        self.downloaded_count = 0
+        self.skipped_count = 0
+        # Aday listesinden toplu sorguyla elenen, daha önce indirilmiş medyalar
+        self.already_count = 0
+        # Aynı veritabanını kullanan başka bir işçinin kiraladığı medyalar
+        self.busy_count = 0
+        # Aday listesi süzüldükten sonra başka bir işçinin indirip kaydettiği medyalar;
+        # akışı üreten thread sayar, akış bitince atlananlara eklenir
+        self.done_elsewhere_count = 0
+        self.lease_owner = self.media_tracker.new_lease_owner()
+        # İlerleme paydası; akış bitince gerçekten indirilecek medya sayısına iner
+        self.expected_count = limit or 20
+        # Süren indirmelerin tamamlanan oranı; ilerleme saniyede en fazla 10 kez yayılır
+        self._partial = {}
+        self.report_progress = ProgressThrottle(self.progress_count, self._progress_percent)
+
+    def _reset_counts(self):
+        self.halted = None
+        self.downloaded_count = 0
+        self.skipped_count = 0
+        self.already_count = 0
+        self.busy_count = 0
+        self.done_elsewhere_count = 0
+        self.expected_count = self.limit or 20
+
+    def _progress_percent(self):
+        done = self.downloaded_count + sum(list(self._partial.values()))
+        return min(100, int(done / max(self.expected_count, 1) * 100))
+
+    def _describe(self, item):
+        return str(item)
+
+    def _claim(self, platform, media_ids, wanted):
+        # Sayfadaki adaylardan sırayla en fazla wanted tanesi kiralanır; başka işçide
+        # olanların yerine sıradakiler denenir. Limitin dışında kalan adaylar kiralanmaz,
+        # böylece başka işçiler onları hemen alabilir. (kiralananlar, başka işçinin
+        # indirdikleri, denenen aday sayısı) döner.
+        media_ids = list(media_ids)
+        claimed, done_elsewhere = set(), set()
+        tried = 0
+        while tried < len(media_ids) and len(claimed) < wanted:
+            batch = media_ids[tried:tried + wanted - len(claimed)]
+            tried += len(batch)
+            got, downloaded = self.media_tracker.claim_media(self.lease_owner, platform, batch)
+            claimed |= got
+            done_elsewhere |= downloaded
+        return claimed, done_elsewhere, tried
+
+    def _collect(self, futures, return_when):
+        done, _ = wait(futures, timeout=0.5, return_when=return_when)
+        for future in done:
+            item = futures.pop(future)
+            try:
+                if future.result():
+                    self.downloaded_count += 1
+                    self.report_progress(force=True)
+                    self.progress_updated.emit(
+                        f"İndirilen {self.item_label} {self.downloaded_count}/{self.expected_count}: "
+                        f"{self._describe(item)}"
+                    )
+                else:
+                    self.skipped_count += 1
+            except Exception as e:
+                self.download_error.emit(f"{self.item_label.capitalize()} işleme hatası: {str(e)}")
+                self.skipped_count += 1
+
+    def _store_media(self, platform, media_id, url, filename, media_type, query, content_hash,
+                     metadata=None):
+        # G/Ç havuzunda çalışır: indirme sürerken başka bir işçi aynı medyayı kaydettiyse
+        # dosya silinip None döner; değilse aynı içerik bağlanır ve kayıt grup commit
+        # kuyruğuna atılır. Aynı içerik bağlandıysa True döner.
+        if self.media_tracker.is_media_downloaded(media_id, url, platform):
+            os.remove(filename)
+            return None
+        linked = deduplicate_content(self.media_tracker, filename, content_hash)
+        metadata = dict(metadata or {})
+        if media_type == 'photo':
+            metadata['width'], metadata['height'] = image_size(filename)
+        self.media_tracker.queue_media(
+            media_id=media_id,
+            media_url=url,
+            file_path=filename,
+            media_type=media_type,
+            platform=platform,
+            hashtag=query,
+            content_hash=content_hash,
+            metadata=metadata
+        )
+        return linked
+
+    def _disk_full(self, error):
+        # Bu dosya sığmıyorsa yalnızca o atlanır; alt sınıra inildiyse hiçbir dosya
+        # sığmayacağı için indirme durdurulur (süren aktarımlar kaldığı yerden devam edebilir);
+        # run() bu durumda download_complete yerine download_error yayar
+        logging.error(str(error))
+        if not error.exhausted:
+            self.download_error.emit(str(error))
+        elif self.is_running:
+            self.is_running = False
+            self.halted = f"{error}. İndirme durduruldu."
+
+    def _emit_halted(self, total_count):
+        self.download_error.emit(
+            f"{self.halted}\n"
+            f"İndirilen: {self.downloaded_count}\n"
+            f"Toplam: {total_count}"
+        )
+
+    def stop(self):
+        self.is_running = False
+        for future in list(self._futures):
+            future.cancel()
+
+
+class InstagramDownloaderThread(DownloaderThread):
+    def __init__(self, hashtag, download_path, limit=None, username="", password="", 
+                 download_photos=True, download_videos=True, max_workers=4, near_duplicates='off',
+                 layout='flat'):
+        super().__init__(download_path, limit, max_workers, layout)
+        self.hashtag = hashtag
         self.username = username
         self.password = password
-        self.is_running = True
+        global LoginRequired
+        from instagrapi import Client
+        from instagrapi.exceptions import LoginRequired
         self.client = Client()
+        self.session_path = instagram_session_path(username)
         self.download_photos = download_photos
         self.download_videos = download_videos
-        self.media_tracker = SQLiteMediaTracker()
+        # Fotoğraflar indirildikten sonra algısal özetle benzerleri aranır ('off', 'flag', 'remove')
+        self.near_duplicates = near_duplicates
+        self._near_duplicate_slot = asyncio.Lock()
+        self.similar_count = 0
 
-    def download_media(self, url, filename, media_id, media_type):
+    async def _download_media_job(self, url, filename, media_id, media_type, metadata=None):
+        metrics = None
         try:
-            if self.media_tracker.is_media_downloaded(media_id, url):
+            if media_id in self._in_flight or url in self._in_flight:
                 self.progress_updated.emit(f"Medya zaten indirilmiş: {os.path.basename(filename)}")
                 return False
 
-            response = requests.get(url, stream=True, timeout=30)
-            response.raise_for_status()
+            def on_progress(downloaded, total_size):
+                if total_size > 0:
+                    self._partial[media_id] = downloaded / total_size
+                    self.report_progress()
 
-            with open(filename, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
+            self._in_flight.update((media_id, url))
+            try:
+                if await self.engine.run_blocking(self.media_tracker.is_media_downloaded,
+                                                  media_id, url, 'instagram'):
+                    self.progress_updated.emit(f"Medya zaten indirilmiş: {os.path.basename(filename)}")
+                    return False
+                async with self._job_slots:
                     if not self.is_running:
-                        f.close()
-                        os.remove(filename)
                         return False
-                    if chunk:
-                        f.write(chunk)
-
-            if self.media_tracker.add_media(
-                media_id=media_id,
-                media_url=url,
-                file_path=filename,
-                media_type=media_type,
-                platform='instagram',
-                hashtag=self.hashtag
-            ):
+                    metrics = DownloadMetrics('instagram', media_id)
+                    result = await self.engine.fetch(
+                        url, filename, is_running=lambda: self.is_running, on_progress=on_progress,
+                        journal=self.media_tracker, transfer_key=f"instagram:{media_id}",
+                        metrics=metrics, platform='instagram')
+                filename = result.file_path
+                db_started = time.monotonic()
+                linked = await self.engine.run_blocking(
+                    self._store_media, 'instagram', media_id, url, filename, media_type,
+                    self.hashtag, result.content_hash, metadata)
+                metrics.db_time = time.monotonic() - db_started
+                if linked is None:
+                    metrics.status = 'skipped'
+                    return False
+                if linked:
+                    self.progress_updated.emit(f"Aynı içerik zaten var, bağlantı oluşturuldu: "
+                                               f"{os.path.basename(filename)}")
+                if media_type == 'photo' and self.near_duplicates != 'off':
+                    await self._check_near_duplicate(media_id, filename)
                 return True
-            return False
+            finally:
+                self._in_flight.difference_update((media_id, url))
+                self._partial.pop(media_id, None)
 
-        except requests.exceptions.RequestException as e:
+        except DownloadCancelled:
+            if metrics is not None:
+                metrics.status = 'cancelled'
+            return False
+        except asyncio.CancelledError:
+            # stop() future'ı iptal edince gelir; BaseException olduğundan ayrıca yakalanır
+            if metrics is not None:
+                metrics.status = 'cancelled'
+            raise
+        except InsufficientDiskSpace as e:
+            if metrics is not None:
+                metrics.status = 'failed'
+            self._disk_full(e)
+            return False
+        except httpx.HTTPError as e:
+            if metrics is not None:
+                metrics.status = 'failed'
             self.download_error.emit(f"İndirme ağ hatası: {str(e)}")
             return False
         except Exception as e:
+            if metrics is not None:
+                metrics.status = 'failed'
             self.download_error.emit(f"İndirme hatası: {str(e)}")
             return False
+        finally:
+            if metrics is not None:
+                record_download_metrics(self.media_tracker, metrics)
+
+    async def _check_near_duplicate(self, media_id, filename):
+        try:
+            loop = asyncio.get_running_loop()
+            phash = (await loop.run_in_executor(get_phash_pool(), image_dhashes, [filename]))[0]
+            if phash is None:
+                return
+            # İndeks yükleme ve SQLite işi G/Ç havuzunda, bu thread'in fotoğrafları için
+            # sırayla yapılır; aynı anda gelen iki benzer fotoğraf birbirini kaçırmaz
+            async with self._near_duplicate_slot:
+                match = await self.engine.run_blocking(self._near_duplicate, media_id, filename, phash)
+            if match is None:
+                return
+            self.similar_count += 1
+            distance, _, original_path = match
+            action = 'silindi' if self.near_duplicates == 'remove' else 'işaretlendi'
+            self.progress_updated.emit(f"Benzer fotoğraf {action}: {os.path.basename(filename)} ≈ "
+                                       f"{os.path.basename(original_path)} (uzaklık {distance})")
+        except Exception as e:
+            logging.error(f"Benzer fotoğraf kontrol hatası: {e}")
+
+    def _near_duplicate(self, media_id, filename, phash):
+        # Benzerlik kaydı satırı güncellediğinden kuyruktaki kayıt önce yazılır
+        self.media_tracker.flush()
+        return handle_near_duplicate(self.media_tracker, media_id, filename, phash, self.near_duplicates)
+
+    def login(self, force=False):
+        # Kayıtlı oturum varsa yüklenir; instagrapi geçerliyse yeniden kullanır,
+        # geçersizse kendisi tam girişe düşer. Yeni oturum ayarları diske yazılır.
+        if not force and os.path.exists(self.session_path):
+            try:
+                with open(self.session_path, 'r', encoding='utf-8') as f:
+                    self.client.set_settings(json.load(f))
+                self.progress_updated.emit("Kayıtlı Instagram oturumu kullanılıyor...")
+            except Exception as e:
+                logging.warning(f"Instagram oturumu okunamadı: {e}")
+
+        if force:
+            self.client.login(self.username, self.password, relogin=True)
+        else:
+            self.client.login(self.username, self.password)
+        save_instagram_session(self.client, self.session_path)
+
+    def submit_media(self, url, filename, media_id, media_type, metadata=None):
+        return self.engine.submit(self._download_media_job(url, filename, media_id, media_type, metadata))
+
+    def download_media(self, url, filename, media_id, media_type):
+        return self.submit_media(url, filename, media_id, media_type).result()
+
+    def _wanted_type(self, media):
+        return (media.media_type == 1 and self.download_photos) or (media.media_type == 2 and self.download_videos)
+
+    def iter_hashtag_media(self, page_size=27):
+        # Önce "top", sonra "recent" sekmesi sayfa sayfa çekilir; iki sekmede
+        # görünen medyalar bir kez üretilir. Tam Media nesneleri sayfa bitince bırakılır.
+        # İstenmeyen türler ve daha önce indirilenler sayfa başına tek sorguyla elenir;
+        # limit yalnızca gerçekten indirilecek medyaları sayar.
+        limit = self.limit or 20
+        seen = set()
+        produced = 0
+        relogged = False
+        for tab in ('top', 'recent'):
+            max_id = None
+            while self.is_running:
+                try:
+                    self.scheduler.acquire(INSTAGRAM_API_URL, is_running=lambda: self.is_running)
+                    medias, max_id = self.client.hashtag_medias_v1_chunk(
+                        self.hashtag, max_amount=page_size, tab_key=tab, max_id=max_id)
+                except LoginRequired:
+                    if relogged:
+                        raise
+                    # Kayıtlı oturum sunucu tarafında düşmüş; bir kez yeniden giriş yap
+                    relogged = True
+                    self.login(force=True)
+                    continue
+
+                records = []
+                for media in medias:
+                    record = MediaRecord.from_media(media)
+                    if record.media_id in seen or not self._wanted_type(record):
+                        continue
+                    seen.add(record.media_id)
+                    records.append(record)
+
+                # URL'si olmayanlar hata olarak bildirilmek üzere indiriciye bırakılır
+                fresh = {media_id for _, media_id, _ in self.media_tracker.filter_new_media(
+                    [('instagram', record.media_id, record.url) for record in records if record.url])}
+                # Kiralama sırası üretim sırasıyla aynıdır; denenmeyen adaylara limit
+                # dolduğu için hiç gelinmez
+                claimed, done_elsewhere, _ = self._claim(
+                    'instagram', [record.media_id for record in records
+                                  if record.url and record.media_id in fresh], limit - produced)
+                for record in records:
+                    if record.url and record.media_id not in fresh:
+                        self.already_count += 1
+                        continue
+                    if record.url and record.media_id in done_elsewhere:
+                        self.done_elsewhere_count += 1
+                        continue
+                    if record.url and record.media_id not in claimed:
+                        self.busy_count += 1
+                        continue
+                    produced += 1
+                    yield record
+                    if produced >= limit:
+                        return
+
+                if not medias or not max_id:
+                    break
+
+    def _describe(self, filename):
+        return os.path.basename(filename)
 
     def run(self):
         try:
+            if self.near_duplicates != 'off' and not perceptual_hash_available():
+                self.progress_updated.emit("Benzer fotoğraf tespiti için numpy ve Pillow gerekli, kapatıldı.")
+                self.near_duplicates = 'off'
+
             self.progress_updated.emit("Instagram'a giriş yapılıyor...")
-            self.client.login(self.username, self.password)
+            self.login()
             self.progress_updated.emit("Giriş başarılı!")
 
             self.progress_updated.emit(f"#{self.hashtag} için medyalar aranıyor...")
-            medias = self.client.hashtag_medias_top(self.hashtag, amount=self.limit or 20)
 
-            if not medias:
-                self.download_error.emit("Hashtag için medya bulunamadı!")
-                return
+            self._reset_counts()
+            self.similar_count = 0
+            total_count = 0
 
-            downloaded_count = 0
-            skipped_count = 0
-            total_count = len(medias)
+            # Sayfalar arka planda çekilirken ilk sayfanın medyaları indirilmeye başlar;
+            # bekleyen iş sayısı sınırlı tutulur, sayaçlar yalnızca bu thread'de güncellenir
+            futures = self._futures
+            max_pending = self.max_workers * 4
+            try:
+                feed = prefetch(self.iter_hashtag_media(), maxsize=max_pending,
+                                is_running=lambda: self.is_running)
+                for index, media in enumerate(feed):
+                    total_count += 1
+
+                    try:
+                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                        media_id = media.media_id
+
+                        if media.media_type == 1:
+                            ext = '.jpg'
+                            media_type = 'photo'
+                        else:
+                            ext = '.mp4'
+                            media_type = 'video'
+
+                        if not media.url:
+                            self.download_error.emit(f"Geçersiz URL: Medya {index + 1} atlanıyor")
+                            self.skipped_count += 1
+                            continue
+
+                        filename = media_file_path(
+                            self.download_path, self.layout, 'instagram',
+                            f"{self.hashtag}_{timestamp}_{media_id}{ext}",
+                            media.metadata.get('created_at')
+                        )
+                        os.makedirs(os.path.dirname(filename), exist_ok=True)
 
-            self.progress_updated.emit(f"Toplam {total_count} medya bulundu")
+                        futures[self.submit_media(media.url, filename, media_id, media_type,
+                                                  media.metadata)] = filename
 
-            for index, media in enumerate(medias):
-                if not self.is_running:
-                    break
-
-                try:
-                    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    media_id = str(media.id)
-
-                    if media.media_type == 1 and self.download_photos:
-                        url = str(media.thumbnail_url)
-                        ext = '.jpg'
-                        media_type = 'photo'
-                    elif media.media_type == 2 and self.download_videos:
-                        url = str(media.video_url)
-                        ext = '.mp4'
-                        media_type = 'video'
-                    else:
+                    except Exception as e:
+                        self.download_error.emit(f"Medya işleme hatası: {str(e)}")
+                        self.skipped_count += 1
                         continue
 
-                    if not url:
-                        self.download_error.emit(f"Geçersiz URL: Medya {index + 1} atlanıyor")
-                        skipped_count += 1
-                        continue
+                    while len(futures) >= max_pending and self.is_running:
+                        self._collect(futures, FIRST_COMPLETED)
 
-                    filename = os.path.join(
-                        self.download_path,
-                        f"{self.hashtag}_{timestamp}_{media_id}{ext}"
-                    )
+                self.expected_count = total_count
+                self.report_progress(force=True)
+                while futures and self.is_running:
+                    self._collect(futures, FIRST_COMPLETED)
+            finally:
+                for future in list(futures):
+                    future.cancel()
+            self.skipped_count += self.done_elsewhere_count
 
-                    if self.download_media(url, filename, media_id, media_type):
-                        downloaded_count += 1
-                        self.progress_count.emit(int((downloaded_count / total_count) * 100))
-                        self.progress_updated.emit(
-                            f"İndirilen medya {downloaded_count}/{total_count}: "
-                            f"{os.path.basename(filename)}"
-                        )
-                    else:
-                        skipped_count += 1
-
-                    time.sleep(2)
+            if self.halted:
+                self._emit_halted(total_count)
+                return
 
-                except Exception as e:
-                    self.download_error.emit(f"Medya işleme hatası: {str(e)}")
-                    skipped_count += 1
-                    continue
+            if not total_count:
+                if self.already_count or self.busy_count or self.skipped_count:
+                    self.download_complete.emit(
+                        f"Yeni medya yok, {self.already_count} medya zaten indirilmiş"
+                        + (f", {self.skipped_count} medya atlandı" if self.skipped_count else "")
+                        + (f", {self.busy_count} medya başka işçide." if self.busy_count else "."))
+                else:
+                    self.download_error.emit("Hashtag için medya bulunamadı!")
+                return
 
             final_message = (
                 f"İndirme tamamlandı!\n"
-                f"İndirilen: {downloaded_count}\n"
-                f"Atlanan: {skipped_count}\n"
+                f"İndirilen: {self.downloaded_count}\n"
+                f"Zaten indirilmiş: {self.already_count}\n"
+                f"Atlanan: {self.skipped_count}\n"
                 f"Toplam: {total_count}"
             )
+            if self.similar_count:
+                final_message += f"\nBenzer fotoğraf: {self.similar_count}"
+            if self.busy_count:
+                final_message += f"\nBaşka işçide: {self.busy_count}"
             self.download_complete.emit(final_message)
 
         except Exception as e:
             self.download_error.emit(f"Genel hata: {str(e)}")
         finally:
-            try:
-                self.client.logout()
-            except:
-                pass
-
-    def stop(self):
-        self.is_running = False
+            # Oturum sonraki işler için saklandığından çıkış (logout) yapılmaz
+            self.media_tracker.flush()
+            self.media_tracker.release_claims(self.lease_owner)
+            self.media_tracker.release_connection()
 
 # TikTokDownloaderThread sınıfını güncelliyoruz
 # TikTokDownloaderThread sınıfını güncelliyoruz
 # TikTokDownloaderThread sınıfını güncelliyoruz
-class TikTokDownloaderThread(QThread):
-    progress_updated = pyqtSignal(str)
-    download_complete = pyqtSignal(str)
-    download_error = pyqtSignal(str)
-    progress_count = pyqtSignal(int)
+class TikTokDownloaderThread(DownloaderThread):
+    item_label = 'video'
 
-    def __init__(self, keyword, download_path, limit=None):
-        super().__init__()
+    def __init__(self, keyword, download_path, limit=None, max_workers=3, layout='flat'):
+        super().__init__(download_path, limit, max_workers, layout)
         self.keyword = keyword
-        self.download_path = download_path
-        self.limit = limit
-        self.is_running = True
-        self.media_tracker = SQLiteMediaTracker()
+        import requests
         self.session = requests.Session()
-
-    def get_video_info(self, keyword):
-        try:
-            # URL encode the search keyword
-            encoded_keyword = requests.utils.quote(keyword)
-            
-            # Direct search URL
-            search_url = f"https://www.tiktok.com/tag/{encoded_keyword}"
-            
-            headers = {
-                'authority': 'www.tiktok.com',
-                'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-                'accept-language': 'tr-TR,tr;q=0.9,en-US;q=0.8,en;q=0.7',
-                'cache-control': 'no-cache',
-                'pragma': 'no-cache',
-                'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120"',
-                'sec-ch-ua-mobile': '?0',
-                'sec-ch-ua-platform': '"Windows"',
-                'sec-fetch-dest': 'document',
-                'sec-fetch-mode': 'navigate',
-                'sec-fetch-site': 'none',
-                'sec-fetch-user': '?1',
-                'upgrade-insecure-requests': '1',
-                'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
-
+        self.base_url = TIKTOK_URL
+        self._headers = None
+        # Çerezler diskten geldiyse ve sunucu reddederse ana sayfadan yenileri alınır
+        self._session_cached = False
+
+    def _search_headers(self, refresh=False):
+        headers = {
+            'authority': 'www.tiktok.com',
+            'accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+            'accept-language': 'tr-TR,tr;q=0.9,en-US;q=0.8,en;q=0.7',
+            'cache-control': 'no-cache',
+            'pragma': 'no-cache',
+            'sec-ch-ua': '"Not_A Brand";v="8", "Chromium";v="120"',
+            'sec-ch-ua-mobile': '?0',
+            'sec-ch-ua-platform': '"Windows"',
+            'sec-fetch-dest': 'document',
+            'sec-fetch-mode': 'navigate',
+            'sec-fetch-site': 'none',
+            'sec-fetch-user': '?1',
+            'upgrade-insecure-requests': '1',
+            'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        }
+
+        host = urlparse(self.base_url).hostname
+        csrf_token = None
+        if refresh:
+            self.session.cookies.clear()
+        elif load_tiktok_session(self.session):
+            csrf_token = self.session.cookies.get('tt_csrf_token', domain=host)
+            self._session_cached = csrf_token is not None
+
+        if not csrf_token:
             # First request to get the CSRF token and cookies
-            response = self.session.get('https://www.tiktok.com/', headers=headers)
-            
+            self._get(f'{self.base_url}/', headers=headers)
+
             # Extract tt_csrf_token from cookies
-            csrf_token = self.session.cookies.get('tt_csrf_token', domain='www.tiktok.com')
-            
+            csrf_token = self.session.cookies.get('tt_csrf_token', domain=host)
             if csrf_token:
-                headers['x-csrf-token'] = csrf_token
-
-            # Now make the actual search request
-            api_url = "https://www.tiktok.com/api/search/general/preview/"
-            params = {
-                "keyword": keyword,
-                "offset": "0",
-                "count": "20",
-                "type": "1",  # Video type
-                "platform": "desktop"
-            }
-
-            api_response = self.session.get(api_url, params=params, headers=headers)
-            data = api_response.json()
-
-            videos = []
-            if 'data' in data and 'videos' in data['data']:
-                for video in data['data']['videos']:
+                save_tiktok_session(self.session)
+
+        if csrf_token:
+            headers['x-csrf-token'] = csrf_token
+        self._headers = headers
+        return headers
+
+    def _fetch_search_page(self, api_url, params, extra_headers, parse_page):
+        # Sayfa SEARCH_PAGE_TTL içinde alınmışsa istek yapılmaz; daha eskiyse
+        # If-None-Match/If-Modified-Since ile sorulur ve 304'te saklanan sonuç kullanılır
+        cache_key = f"{api_url}?{urlencode(sorted(params.items()))}"
+        cached = self.media_tracker.get_search_page(cache_key)
+        if cached and time.time() - cached['fetched_at'] < SEARCH_PAGE_TTL:
+            return cached['payload']
+
+        for attempt in range(2):
+            request_headers = {**self._headers, **extra_headers}
+            if cached and cached['etag']:
+                request_headers['If-None-Match'] = cached['etag']
+            if cached and cached['last_modified']:
+                request_headers['If-Modified-Since'] = cached['last_modified']
+            response = self._get(api_url, params=params, headers=request_headers)
+            if response.status_code in (401, 403) and self._session_cached:
+                # Saklanan çerezlerin süresi sunucuda dolmuş
+                self._session_cached = False
+                self._search_headers(refresh=True)
+                continue
+            break
+
+        if response.status_code == 304 and cached:
+            self.media_tracker.touch_search_page(cache_key)
+            return cached['payload']
+
+        data = response.json()
+        page = {'videos': parse_page(data), 'has_more': data.get('has_more', 1), 'cursor': data.get('cursor')}
+        if response.status_code == 200:
+            self.media_tracker.save_search_page(cache_key, page, response.headers.get('etag'),
+                                                response.headers.get('last-modified'))
+        return page
+
+    def _get(self, url, retries=3, **kwargs):
+        # Arama istekleri de zamanlayıcıdan geçer; 429/503'te Retry-After beklenir
+        for attempt in range(1, retries + 1):
+            self.scheduler.acquire(url, is_running=lambda: self.is_running)
+            response = self.session.get(url, timeout=30, **kwargs)
+            if response.status_code not in RETRYABLE_STATUS:
+                self.scheduler.success(url)
+                return response
+            if attempt == retries:
+                return response
+            delay = self.scheduler.backoff(url, parse_retry_after(response.headers.get('retry-after')))
+            self.progress_updated.emit(f"Sunucu yoğun ({response.status_code}), {delay:.0f} sn bekleniyor")
+
+    @staticmethod
+    def _parse_preview_page(data):
+        videos = []
+        if 'data' in data and 'videos' in data['data']:
+            for video in data['data']['videos']:
+                video_info = {
+                    'id': video.get('id', ''),
+                    'video': {
+                        'downloadAddr': video.get('play_addr', {}).get('url_list', [''])[0]
+                    },
+                    'desc': video.get('title', 'Untitled'),
+                    'author': video.get('author', {}).get('nickname', 'Unknown'),
+                    'metadata': {
+                        'caption': video.get('title') or None,
+                        'author': video.get('author', {}).get('nickname'),
+                        'created_at': int(video['create_time']) if video.get('create_time') else None,
+                        'width': video.get('width'),
+                        'height': video.get('height'),
+                        'duration': video.get('duration'),
+                    }
+                }
+                if video_info['video']['downloadAddr']:
+                    videos.append(video_info)
+        return videos
+
+    @staticmethod
+    def _parse_full_page(data):
+        videos = []
+        if 'data' in data:
+            for item in data['data']:
+                if 'item' in item and 'video' in item['item']:
+                    video_data = item['item']
+                    video = video_data['video']
                     video_info = {
-                        'id': video.get('id', ''),
+                        'id': video_data.get('id', ''),
                         'video': {
-                            'downloadAddr': video.get('play_addr', {}).get('url_list', [''])[0]
+                            'downloadAddr': video.get('playAddr', '')
                         },
-                        'desc': video.get('title', 'Untitled'),
-                        'author': video.get('author', {}).get('nickname', 'Unknown')
+                        'desc': video_data.get('desc', 'Untitled'),
+                        'author': video_data.get('author', {}).get('nickname', 'Unknown'),
+                        'metadata': {
+                            'caption': video_data.get('desc') or None,
+                            'author': video_data.get('author', {}).get('nickname'),
+                            'created_at': int(video_data['createTime']) if video_data.get('createTime') else None,
+                            'width': video.get('width'),
+                            'height': video.get('height'),
+                            'duration': video.get('duration'),
+                        }
                     }
                     if video_info['video']['downloadAddr']:
                         videos.append(video_info)
-                        if self.limit and len(videos) >= self.limit:
-                            break
-
-            if not videos:
-                # Alternatif arama yöntemi
-                browser_url = f"https://www.tiktok.com/api/search/general/full/?keyword={encoded_keyword}&offset=0&count=20"
-                browser_headers = {
-                    **headers,
-                    'referer': f'https://www.tiktok.com/search?q={encoded_keyword}'
-                }
-                
-                browser_response = self.session.get(browser_url, headers=browser_headers)
-                browser_data = browser_response.json()
-                
-                if 'data' in browser_data:
-                    for item in browser_data['data']:
-                        if 'item' in item and 'video' in item['item']:
-                            video_data = item['item']
-                            video_info = {
-                                'id': video_data.get('id', ''),
-                                'video': {
-                                    'downloadAddr': video_data['video'].get('playAddr', '')
-                                },
-                                'desc': video_data.get('desc', 'Untitled'),
-                                'author': video_data.get('author', {}).get('nickname', 'Unknown')
-                            }
-                            if video_info['video']['downloadAddr']:
-                                videos.append(video_info)
-                                if self.limit and len(videos) >= self.limit:
-                                    break
-
-            if not videos:
-                self.progress_updated.emit("Arama sonuçlarında video bulunamadı")
-            else:
-                self.progress_updated.emit(f"{len(videos)} video bulundu")
+        return videos
+
+    def iter_videos(self, keyword, page_size=20):
+        # Arama sonuçları limit dolana veya sonuç bitene kadar sayfa sayfa üretilir.
+        # Önizleme uç noktası hiç sonuç vermezse tam arama uç noktasına geçilir.
+        # Sayfalar arasında tekrar eden video id'leri indiriciye ulaşmadan elenir.
+        limit = self.limit or 20
+        seen = set()
+        produced = 0
+        try:
+            encoded_keyword = quote(keyword)
+            self.media_tracker.prune_search_cache()
+            self._search_headers()
+            sources = (
+                (f"{self.base_url}/api/search/general/preview/",
+                 {"type": "1", "platform": "desktop"}, {}, self._parse_preview_page),
+                (f"{self.base_url}/api/search/general/full/",
+                 {}, {'referer': f'{self.base_url}/search?q={encoded_keyword}'},
+                 self._parse_full_page),
+            )
 
-            return videos
+            for api_url, extra_params, extra_headers, parse_page in sources:
+                offset = 0
+                while self.is_running:
+                    params = {"keyword": keyword, "offset": str(offset), "count": str(page_size),
+                              **extra_params}
+                    data = self._fetch_search_page(api_url, params, extra_headers, parse_page)
+                    videos = data['videos']
+
+                    page = []
+                    for video_info in videos:
+                        video_id = str(video_info['id'])
+                        if video_id and video_id in seen:
+                            continue
+                        seen.add(video_id)
+                        page.append(video_info)
+
+                    # Daha önce indirilmiş videolar indirme kuyruğuna girmeden elenir
+                    fresh = self.media_tracker.filter_new_media(
+                        [('tiktok', str(video_info['id']), str(video_info['video']['downloadAddr']), video_info)
+                         for video_info in page])
+                    self.already_count += len(page) - len(fresh)
+                    claimed, done_elsewhere, tried = self._claim(
+                        'tiktok', [media_id for _, media_id, _, _ in fresh], limit - produced)
+                    self.done_elsewhere_count += len(done_elsewhere)
+                    self.busy_count += tried - len(claimed) - len(done_elsewhere)
+                    for _, media_id, _, video_info in fresh:
+                        if media_id not in claimed:
+                            continue
+                        produced += 1
+                        yield video_info
+                        if produced >= limit:
+                            return
+
+                    # Sunucu ofseti yok sayıp aynı sayfayı dönerse döngü burada biter
+                    if not page or not data['has_more']:
+                        break
+                    offset = int(data['cursor'] or offset + len(videos))
+
+                if seen:
+                    break
+
+            if not seen:
+                self.progress_updated.emit("Arama sonuçlarında video bulunamadı")
 
         except Exception as e:
             self.download_error.emit(f"Video arama hatası: {str(e)}")
             self.progress_updated.emit(f"Hata detayı: {str(e)}")
-            return []
 
-    def download_video(self, video_info):
+    def get_video_info(self, keyword):
+        videos = list(self.iter_videos(keyword))
+        if videos:
+            self.progress_updated.emit(f"{len(videos)} video bulundu")
+        return videos
+
+    async def _download_video_job(self, video_info):
+        metrics = None
         try:
             # Video bilgilerini çıkar
             video_id = str(video_info['id'])  # video ID'sini string'e çevir
             video_url = str(video_info['video']['downloadAddr'])
             desc = f"{video_info['author']} - {video_info['desc']}"
     
-            # Önce video daha önce indirilmiş mi kontrol et
-            if self.media_tracker.is_media_downloaded(video_id, video_url):
+            # Önce video şu an indiriliyor mu kontrol et
+            if video_id in self._in_flight or video_url in self._in_flight:
                 self.progress_updated.emit(f"Video zaten indirilmiş: {desc[:50]}...")
                 return False
     
@@ -364,9 +3214,10 @@ class TikTokDownloaderThread(QThread):
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             safe_desc = re.sub(r'[^\w\s-]', '', desc)[:50]
             safe_desc = re.sub(r'[\s_-]+', '_', safe_desc.strip())
-            filename = os.path.join(
-                self.download_path,
-                f"tiktok_{video_id}_{timestamp}_{safe_desc}.mp4"
+            filename = media_file_path(
+                self.download_path, self.layout, 'tiktok',
+                f"tiktok_{video_id}_{timestamp}_{safe_desc}.mp4",
+                (video_info.get('metadata') or {}).get('created_at')
             )
     
             headers = {
@@ -374,430 +3225,597 @@ class TikTokDownloaderThread(QThread):
                 'Referer': 'https://www.tiktok.com/',
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
             }
-    
-            max_retries = 3
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                try:
-                    response = self.session.get(video_url, headers=headers, stream=True, timeout=30)
-                    response.raise_for_status()
-                    
-                    total_size = int(response.headers.get('content-length', 0))
-                    block_size = 8192
-                    downloaded = 0
-                    
-                    with open(filename, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=block_size):
-                            if not self.is_running:
-                                f.close()
-                                os.remove(filename)
-                                return False
-                            if chunk:
-                                f.write(chunk)
-                                downloaded += len(chunk)
-                                if total_size > 0:
-                                    progress = (downloaded / total_size) * 100
-                                    self.progress_count.emit(int(progress))
-                    
-                    # Video başarıyla indirildi, veritabanına ekle
-                    if self.media_tracker.add_media(
-                        media_id=video_id,
-                        media_url=video_url,
-                        file_path=filename,
-                        media_type='video',
-                        platform='tiktok',
-                        hashtag=self.keyword
-                    ):
-                        self.progress_updated.emit(f"Video başarıyla indirildi ve kaydedildi: {desc[:50]}")
-                        return True
-                    else:
-                        # Veritabanına eklenemedi, dosyayı sil
-                        os.remove(filename)
+
+            def on_progress(downloaded, total_size):
+                if total_size > 0:
+                    self._partial[video_id] = downloaded / total_size
+                    self.report_progress()
+
+            self._in_flight.update((video_id, video_url))
+            try:
+                # Video daha önce indirilmiş mi kontrol et
+                if await self.engine.run_blocking(self.media_tracker.is_media_downloaded,
+                                                  video_id, video_url, 'tiktok'):
+                    self.progress_updated.emit(f"Video zaten indirilmiş: {desc[:50]}...")
+                    return False
+                await self.engine.run_blocking(os.makedirs, os.path.dirname(filename), 0o777, True)
+                async with self._job_slots:
+                    if not self.is_running:
                         return False
-                        
-                except requests.exceptions.RequestException as e:
-                    retry_count += 1
-                    if retry_count == max_retries:
-                        raise e
-                    time.sleep(2)
-    
-            return True
-    
+                    metrics = DownloadMetrics('tiktok', video_id)
+                    # Yeniden deneme ve kaldığı yerden devam motor tarafından yapılır
+                    result = await self.engine.fetch(
+                        video_url, filename, headers=headers,
+                        cookies=self.session.cookies.get_dict(),
+                        is_running=lambda: self.is_running, on_progress=on_progress,
+                        journal=self.media_tracker, transfer_key=f"tiktok:{video_id}",
+                        metrics=metrics, platform='tiktok')
+                filename = result.file_path
+                db_started = time.monotonic()
+                # Video başarıyla indirildi, veritabanına ekle
+                linked = await self.engine.run_blocking(
+                    self._store_media, 'tiktok', video_id, video_url, filename, 'video',
+                    self.keyword, result.content_hash, video_info.get('metadata'))
+                metrics.db_time = time.monotonic() - db_started
+                if linked is None:
+                    # Başka bir işçi kaydetmiş, dosya silindi
+                    metrics.status = 'skipped'
+                    return False
+                if linked:
+                    self.progress_updated.emit(f"Aynı içerik zaten var, bağlantı oluşturuldu: {desc[:50]}")
+                self.progress_updated.emit(f"Video başarıyla indirildi ve kaydedildi: {desc[:50]}")
+                return True
+            finally:
+                self._in_flight.difference_update((video_id, video_url))
+                self._partial.pop(video_id, None)
+
+        except DownloadCancelled:
+            if metrics is not None:
+                metrics.status = 'cancelled'
+            return False
+        except asyncio.CancelledError:
+            # stop() future'ı iptal edince gelir; BaseException olduğundan ayrıca yakalanır
+            if metrics is not None:
+                metrics.status = 'cancelled'
+            raise
+        except InsufficientDiskSpace as e:
+            if metrics is not None:
+                metrics.status = 'failed'
+            self._disk_full(e)
+            return False
         except Exception as e:
+            if metrics is not None:
+                metrics.status = 'failed'
             error_msg = f"Video indirme hatası: {str(e)}"
             self.download_error.emit(error_msg)
             logging.error(error_msg)
-            if 'filename' in locals():
-                try:
-                    os.remove(filename)
-                except:
-                    pass
             return False
-    def run(self):
-        try:
-            self.progress_updated.emit("TikTok indirmesi başlatılıyor...")
-            videos = self.get_video_info(self.keyword)
+        finally:
+            if metrics is not None:
+                record_download_metrics(self.media_tracker, metrics)
 
-            if not videos:
-                self.download_error.emit("Video bulunamadı!")
-                return
+    def submit_video(self, video_info):
+        return self.engine.submit(self._download_video_job(video_info))
 
-            total_count = len(videos)
-            self.progress_updated.emit(f"Toplam {total_count} video bulundu")
+    def download_video(self, video_info):
+        return self.submit_video(video_info).result()
 
-            downloaded_count = 0
-            skipped_count = 0
+    def _describe(self, video):
+        return f"{video['desc'][:50]}..."
 
-            for index, video in enumerate(videos):
-                if not self.is_running:
-                    break
+    def run(self):
+        try:
+            self.progress_updated.emit("TikTok indirmesi başlatılıyor...")
 
-                try:
-                    if self.download_video(video):
-                        downloaded_count += 1
-                        self.progress_count.emit(int((downloaded_count / total_count) * 100))
-                        self.progress_updated.emit(
-                            f"İndirilen video {downloaded_count}/{total_count}: "
-                            f"{video['desc'][:50]}..."
-                        )
-                    else:
-                        skipped_count += 1
+            self._reset_counts()
+            total_count = 0
 
-                    time.sleep(2)  # Rate limiting için bekleme
+            # Arama sayfaları arka planda çekilirken bulunan videolar indirilir
+            futures = self._futures
+            max_pending = self.max_workers * 4
+            try:
+                feed = prefetch(self.iter_videos(self.keyword), maxsize=max_pending,
+                                is_running=lambda: self.is_running)
+                for video in feed:
+                    total_count += 1
+                    futures[self.submit_video(video)] = video
+
+                    while len(futures) >= max_pending and self.is_running:
+                        self._collect(futures, FIRST_COMPLETED)
+
+                self.expected_count = total_count
+                self.report_progress(force=True)
+                while futures and self.is_running:
+                    self._collect(futures, FIRST_COMPLETED)
+            finally:
+                for future in list(futures):
+                    future.cancel()
+            self.skipped_count += self.done_elsewhere_count
+
+            if self.halted:
+                self._emit_halted(total_count)
+                return
 
-                except Exception as e:
-                    self.download_error.emit(f"Video işleme hatası: {str(e)}")
-                    skipped_count += 1
-                    continue
+            if not total_count:
+                if self.already_count or self.busy_count or self.skipped_count:
+                    self.download_complete.emit(
+                        f"Yeni video yok, {self.already_count} video zaten indirilmiş"
+                        + (f", {self.skipped_count} video atlandı" if self.skipped_count else "")
+                        + (f", {self.busy_count} video başka işçide." if self.busy_count else "."))
+                else:
+                    self.download_error.emit("Video bulunamadı!")
+                return
 
             final_message = (
                 f"İndirme tamamlandı!\n"
-                f"İndirilen: {downloaded_count}\n"
-                f"Atlanan: {skipped_count}\n"
+                f"İndirilen: {self.downloaded_count}\n"
+                f"Zaten indirilmiş: {self.already_count}\n"
+                f"Atlanan: {self.skipped_count}\n"
                 f"Toplam: {total_count}"
             )
+            if self.busy_count:
+                final_message += f"\nBaşka işçide: {self.busy_count}"
             self.download_complete.emit(final_message)
 
         except Exception as e:
             self.download_error.emit(f"Genel hata: {str(e)}")
-
-    def stop(self):
-        self.is_running = False
-class SocialMediaDownloaderGUI(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.initUI()
-        self.downloader_thread = None
-        self.last_download_path = ""
-        self.load_last_path()
-
-    def initUI(self):
-        self.setWindowTitle('Sosyal Medya İndirici')
-        self.setGeometry(100, 100, 800, 600)
-
-        central_widget = QWidget()
-        self.setCentralWidget(central_widget)
-        layout = QVBoxLayout(central_widget)
-
-        # Platform seçimi
-        platform_layout = QHBoxLayout()
-        self.platform_combo = QComboBox()
-        self.platform_combo.addItems(['Instagram', 'TikTok'])
-        self.platform_combo.currentTextChanged.connect(self.on_platform_change)
-        platform_layout.addWidget(QLabel('Platform:'))
-        platform_layout.addWidget(self.platform_combo)
-        layout.addLayout(platform_layout)
-
-        # Tab widget
-        self.tab_widget = QTabWidget()
-        self.instagram_tab = QWidget()
-        self.tiktok_tab = QWidget()
-        self.setup_instagram_tab()
-        self.setup_tiktok_tab()
-        self.tab_widget.addTab(self.instagram_tab, "Instagram")
-        self.tab_widget.addTab(self.tiktok_tab, "TikTok")
-        layout.addWidget(self.tab_widget)
-
-        # Kayıt yeri seçimi
-        path_layout = QHBoxLayout()
-        self.path_input = QLineEdit()
-        self.path_input.setReadOnly(True)
-        self.path_button = QPushButton('Kayıt Yeri Seç')
-        self.path_button.clicked.connect(self.select_download_path)
-        path_layout.addWidget(self.path_input)
-        path_layout.addWidget(self.path_button)
-        layout.addLayout(path_layout)
-
-        # Butonlar
-        button_layout = QHBoxLayout()
-        self.download_button = QPushButton('İndirmeyi Başlat')
-        self.download_button.clicked.connect(self.start_download)
-        button_layout.addWidget(self.download_button)
-
-        self.stop_button = QPushButton('İndirmeyi Durdur')
-        self.stop_button.clicked.connect(self.stop_download)
-        self.stop_button.setEnabled(False)
-        button_layout.addWidget(self.stop_button)
-        layout.addLayout(button_layout)
-
-        # İlerleme çubuğu
-        self.progress_bar = QProgressBar()
-        layout.addWidget(self.progress_bar)
-
-        # Log alanı
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
-        layout.addWidget(self.log_text)
-
-        self.statusBar().showMessage('Hazır')
-
-    def setup_instagram_tab(self):
-        layout = QVBoxLayout(self.instagram_tab)
-
-        # Instagram kullanıcı girişi
-        login_group = QVBoxLayout()
-        
-        username_layout = QHBoxLayout()
-        self.instagram_username_input = QLineEdit()
-        self.instagram_username_input.setPlaceholderText('Instagram kullanıcı adı')
-        username_layout.addWidget(QLabel('Kullanıcı Adı:'))
-        username_layout.addWidget(self.instagram_username_input)
-        login_group.addLayout(username_layout)
-
-        password_layout = QHBoxLayout()
-        self.instagram_password_input = QLineEdit()
-        self.instagram_password_input.setPlaceholderText('Instagram şifresi')
-        self.instagram_password_input.setEchoMode(QLineEdit.Password)
-        password_layout.addWidget(QLabel('Şifre:'))
-        password_layout.addWidget(self.instagram_password_input)
-        login_group.addLayout(password_layout)
-
-        layout.addLayout(login_group)
-
-        # Medya türü seçimi
-        media_type_layout = QHBoxLayout()
-        self.photo_checkbox = QCheckBox('Fotoğrafları İndir')
-        self.video_checkbox = QCheckBox('Videoları İndir')
-        self.photo_checkbox.setChecked(True)
-        self.video_checkbox.setChecked(True)
-        media_type_layout.addWidget(self.photo_checkbox)
-        media_type_layout.addWidget(self.video_checkbox)
-        layout.addLayout(media_type_layout)
-
-        # Hashtag girişi
-        hashtag_layout = QHBoxLayout()
-        self.instagram_hashtag_input = QLineEdit()
-        self.instagram_hashtag_input.setPlaceholderText('Hashtag girin (# olmadan)')
-        hashtag_layout.addWidget(QLabel('Hashtag:'))
-        hashtag_layout.addWidget(self.instagram_hashtag_input)
-        layout.addLayout(hashtag_layout)
-
-        # Limit girişi
-        limit_layout = QHBoxLayout()
-        self.instagram_limit_input = QLineEdit()
-        self.instagram_limit_input.setPlaceholderText('Boş bırakın veya sayı girin')
-        limit_layout.addWidget(QLabel('Medya Limiti:'))
-        limit_layout.addWidget(self.instagram_limit_input)
-        layout.addLayout(limit_layout)
-
-        layout.addStretch()
-
-    def setup_tiktok_tab(self):
-        layout = QVBoxLayout(self.tiktok_tab)
-
-        # Arama kelimesi girişi
-        keyword_layout = QHBoxLayout()
-        self.tiktok_keyword_input = QLineEdit()
-        self.tiktok_keyword_input.setPlaceholderText('Arama kelimesi veya hashtag girin')
-        keyword_layout.addWidget(QLabel('Arama:'))
-        keyword_layout.addWidget(self.tiktok_keyword_input)
-        layout.addLayout(keyword_layout)
-
-        # Limit girişi
-        limit_layout = QHBoxLayout()
-        self.tiktok_limit_input = QLineEdit()
-        self.tiktok_limit_input.setPlaceholderText('Boş bırakın veya sayı girin')
-        limit_layout.addWidget(QLabel('Video Limiti:'))
-        limit_layout.addWidget(self.tiktok_limit_input)
-        layout.addLayout(limit_layout)
-
-        # Bilgi etiketi
-        info_label = QLabel("Not: TikTok aramalarında hashtag için '#' kullanabilirsiniz.")
-        info_label.setStyleSheet("color: gray;")
-        layout.addWidget(info_label)
-
-        layout.addStretch()
-
-    def on_platform_change(self, platform):
-        self.tab_widget.setCurrentIndex(0 if platform == 'Instagram' else 1)
-
-    def load_last_path(self):
-        try:
-            if os.path.exists('settings.json'):
-                with open('settings.json', 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
-                    last_path = settings.get('last_download_path', '')
-                    if os.path.exists(last_path):
-                        self.last_download_path = last_path
-                        self.path_input.setText(last_path)
-        except Exception as e:
-            logging.error(f"Ayarları yükleme hatası: {e}")
-
-    def save_last_path(self):
-        try:
-            settings = {'last_download_path': self.last_download_path}
-            with open('settings.json', 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logging.error(f"Ayarları kaydetme hatası: {e}")
-
-    def select_download_path(self):
-        folder = QFileDialog.getExistingDirectory(
-            self, 
-            'İndirme Klasörünü Seç',
-            self.last_download_path or os.path.expanduser('~')
+        finally:
+            self.media_tracker.flush()
+            self.media_tracker.release_claims(self.lease_owner)
+            self.media_tracker.release_connection()
+
+
+JOB_STATE_LABELS = {
+    'pending': 'Bekliyor',
+    'running': 'Çalışıyor',
+    'done': 'Tamamlandı',
+    'failed': 'Başarısız',
+}
+
+
+def split_queries(text):
+    # "kedi, köpek" veya satır satır girilen aramalar ayrı işler olur
+    return [query.strip() for query in re.split(r'[,\n]+', text) if query.strip()]
+
+
+def create_downloader(job, username='', password=''):
+    # Kuyruktaki bir iş satırından ilgili indirme thread'ini kurar.
+    # Şifre kuyrukta saklanmaz, çalıştırırken verilir.
+    options = job['options']
+    if job['platform'] == 'instagram':
+        return InstagramDownloaderThread(
+            hashtag=job['query'],
+            download_path=job['download_path'],
+            limit=options.get('limit'),
+            username=options.get('username') or username,
+            password=password,
+            download_photos=options.get('photos', True),
+            download_videos=options.get('videos', True),
+            max_workers=options.get('workers', 4),
+            near_duplicates=options.get('near_duplicates', 'off'),
+            layout=options.get('layout', 'flat')
+        )
+    return TikTokDownloaderThread(
+        keyword=job['query'],
+        download_path=job['download_path'],
+        limit=options.get('limit'),
+        max_workers=options.get('workers', 3),
+        layout=options.get('layout', 'flat')
+    )
+
+
+def positive_int(value):
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError("Limit pozitif olmalıdır")
+    return number
+
+
+def positive_float(value):
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError("Değer pozitif olmalıdır")
+    return number
+
+
+def parse_size(value):
+    # '500K', '2.5M', '1G' (bayt, 1000 tabanlı); 0 veya 'off' sıfırdır
+    text = value.strip().upper().rstrip('B')
+    if text in ('0', 'OFF', ''):
+        return 0
+    multiplier = {'K': 1e3, 'M': 1e6, 'G': 1e9}.get(text[-1], 1)
+    try:
+        size = float(text[:-1] if multiplier != 1 else text) * multiplier
+    except ValueError:
+        raise argparse.ArgumentTypeError("Değer 500K, 2M, 1G gibi olmalıdır")
+    if size < 0:
+        raise argparse.ArgumentTypeError("Değer negatif olamaz")
+    return int(size)
+
+
+def parse_rate(value):
+    # Bayt/sn; sondaki '/s' kabul edilir ('5MB/s')
+    value = value.strip()
+    return parse_size(value[:-2] if value.lower().endswith('/s') else value)
+
+
+def format_rate(rate):
+    return f"{rate / 1e6:.2f} MB/s" if rate else 'Sınırsız'
+
+
+def parse_date(value):
+    try:
+        return int(datetime.strptime(value, '%Y-%m-%d').timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError("Tarih YYYY-AA-GG biçiminde olmalıdır")
+
+
+def build_cli_parser():
+    parser = argparse.ArgumentParser(
+        prog='vi.py',
+        description='Sosyal medya indirici. Argümansız çalıştırılırsa arayüz açılır.'
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    limits = argparse.ArgumentParser(add_help=False)
+    limits.add_argument('--rate', type=positive_float, default=2.0,
+                        help='Sunucu başına saniyedeki en fazla istek (varsayılan: 2)')
+    limits.add_argument('--burst', type=positive_int, default=4,
+                        help='Sunucu başına biriktirilebilecek istek hakkı (varsayılan: 4)')
+    limits.add_argument('--min-free', type=parse_size, default=512 * 1024 * 1024,
+                        help='Diskte bırakılacak en az boş alan, ör. 2G (varsayılan 512 MiB)')
+    limits.add_argument('--metrics-port', type=int,
+                        help='Prometheus ölçümlerini 127.0.0.1:PORT/metrics adresinde yayınla')
+
+    credentials = argparse.ArgumentParser(add_help=False)
+    credentials.add_argument('--username', default=os.environ.get('INSTAGRAM_USERNAME', ''))
+    credentials.add_argument('--password', default=os.environ.get('INSTAGRAM_PASSWORD', ''),
+                             help='Varsayılan: INSTAGRAM_PASSWORD ortam değişkeni')
+
+    instagram_parser = subparsers.add_parser('instagram', parents=[limits, credentials],
+                                             help='Instagram hashtag indirmesi')
+    instagram_parser.add_argument('hashtag', help='Hashtag (# olmadan)')
+    instagram_parser.add_argument('--path', required=True, help='İndirme klasörü')
+    instagram_parser.add_argument('--limit', type=positive_int)
+    instagram_parser.add_argument('--no-photos', action='store_true')
+    instagram_parser.add_argument('--no-videos', action='store_true')
+    instagram_parser.add_argument('--workers', type=positive_int, default=4)
+    instagram_parser.add_argument('--layout', choices=tuple(STORAGE_LAYOUTS), default='flat',
+                                  help='Klasör düzeni: tek klasör, platform/tarih veya platform/özet')
+    instagram_parser.add_argument('--near-duplicates', choices=tuple(NEAR_DUPLICATE_MODES), default='off',
+                                  help='İndirilen fotoğraflarda benzerleri işaretle veya sil (numpy ve Pillow gerekir)')
+
+    tiktok_parser = subparsers.add_parser('tiktok', parents=[limits], help='TikTok arama indirmesi')
+    tiktok_parser.add_argument('keyword', help='Arama kelimesi veya hashtag')
+    tiktok_parser.add_argument('--path', required=True, help='İndirme klasörü')
+    tiktok_parser.add_argument('--limit', type=positive_int)
+    tiktok_parser.add_argument('--workers', type=positive_int, default=3)
+    tiktok_parser.add_argument('--layout', choices=tuple(STORAGE_LAYOUTS), default='flat',
+                               help='Klasör düzeni: tek klasör, platform/tarih veya platform/özet')
+
+    queue_parser = subparsers.add_parser('queue', help='Kalıcı iş kuyruğu')
+    queue_subparsers = queue_parser.add_subparsers(dest='queue_command', required=True)
+
+    add_parser = queue_subparsers.add_parser('add', help='Kuyruğa iş ekle')
+    add_parser.add_argument('platform', choices=('instagram', 'tiktok'))
+    add_parser.add_argument('queries', nargs='+', help='Her hashtag/arama kelimesi ayrı bir iş olur')
+    add_parser.add_argument('--path', required=True, help='İndirme klasörü')
+    add_parser.add_argument('--limit', type=positive_int)
+    add_parser.add_argument('--priority', type=int, default=0, help='Büyük değer önce çalışır')
+    add_parser.add_argument('--username', default=os.environ.get('INSTAGRAM_USERNAME', ''))
+    add_parser.add_argument('--no-photos', action='store_true')
+    add_parser.add_argument('--no-videos', action='store_true')
+    add_parser.add_argument('--workers', type=positive_int)
+    add_parser.add_argument('--near-duplicates', choices=tuple(NEAR_DUPLICATE_MODES), default='off')
+    add_parser.add_argument('--layout', choices=tuple(STORAGE_LAYOUTS), default='flat')
+
+    list_parser = queue_subparsers.add_parser('list', help='Kuyruktaki işleri listele')
+    list_parser.add_argument('--state', action='append', choices=tuple(JOB_STATE_LABELS))
+
+    run_parser = queue_subparsers.add_parser('run', parents=[limits, credentials],
+                                             help='Bekleyen işleri çalıştır')
+    run_parser.add_argument('--jobs', type=positive_int, default=2, help='Eşzamanlı iş sayısı')
+
+    search_parser = subparsers.add_parser('search', help='İndirilen medyalarda ara')
+    search_parser.add_argument('text', nargs='*', help='Açıklamada geçen kelimeler (sonda * önek araması)')
+    search_parser.add_argument('--author')
+    search_parser.add_argument('--hashtag')
+    search_parser.add_argument('--platform', choices=tuple(PLATFORM_CODES))
+    search_parser.add_argument('--since', type=parse_date, help='YYYY-AA-GG, bu tarih dahil')
+    search_parser.add_argument('--until', type=parse_date, help='YYYY-AA-GG, bu tarih dahil')
+    search_parser.add_argument('--limit', type=positive_int, default=50)
+    search_parser.add_argument('--db', default='downloads.db', help='Veritabanı dosyası')
+
+    bandwidth_parser = subparsers.add_parser(
+        'bandwidth', help='Bant genişliği sınırını göster/değiştir (çalışan indirmeler de uyar)')
+    bandwidth_parser.add_argument('--total', type=parse_rate, help='Tüm indirmeler için, ör. 5M; 0 sınırsız')
+    for platform in PLATFORM_CODES:
+        bandwidth_parser.add_argument(f'--{platform}', type=parse_rate, help=f'Yalnızca {platform} indirmeleri')
+
+    db_parser = subparsers.add_parser('db', help='Veritabanı bakımı')
+    db_subparsers = db_parser.add_subparsers(dest='db_command', required=True)
+
+    migrate_parser = db_subparsers.add_parser('migrate', help='Eski kayıtları yeni şemaya taşı')
+    migrate_parser.add_argument('--db', default='downloads.db', help='Veritabanı dosyası')
+    migrate_parser.add_argument('--batch-size', type=positive_int, default=10000)
+    migrate_parser.add_argument('--keep-legacy', action='store_true',
+                                help='Eski tabloyu taşıma sonrasında silme')
+    migrate_parser.add_argument('--vacuum', action='store_true', help='Taşıma sonrasında dosyayı küçült')
+
+    similar_parser = db_subparsers.add_parser('near-duplicates', help='Arşivdeki benzer fotoğrafları bul')
+    similar_parser.add_argument('--db', default='downloads.db', help='Veritabanı dosyası')
+    similar_parser.add_argument('--remove', action='store_true', help='Benzerleri sil (eski kopya kalır)')
+    similar_parser.add_argument('--distance', type=int, default=NEAR_DUPLICATE_DISTANCE,
+                                help='En fazla Hamming uzaklığı (0-64)')
+
+    relayout_parser = db_subparsers.add_parser('relayout', help='İndirilen dosyaları yeni klasör düzenine taşı')
+    relayout_parser.add_argument('root', help='İndirme klasörü (kayıtlardaki yolun başı)')
+    relayout_parser.add_argument('--layout', choices=tuple(STORAGE_LAYOUTS), required=True)
+    relayout_parser.add_argument('--db', default='downloads.db', help='Veritabanı dosyası')
+    relayout_parser.add_argument('--workers', type=positive_int, default=8, help='Paralel taşıma sayısı')
+    relayout_parser.add_argument('--batch-size', type=positive_int, default=1000)
+
+    return parser
+
+
+def cli_message(message):
+    logging.info(message)
+    print(message, flush=True)
+
+
+def cli_error(message):
+    logging.error(message)
+    print(message, file=sys.stderr, flush=True)
+
+
+def apply_run_options(args):
+    scheduler = get_request_scheduler()
+    scheduler.default_rate = args.rate
+    scheduler.default_burst = args.burst
+    get_download_engine().min_free_bytes = args.min_free
+    if args.metrics_port is not None:
+        server = start_metrics_server(args.metrics_port)
+        print(f"Ölçümler: http://127.0.0.1:{server.server_address[1]}/metrics", file=sys.stderr)
+
+
+def run_cli(argv):
+    # Arayüzsüz çalıştırma: QApplication kurulmaz, thread'in run() metodu bu
+    # thread'de çağrılır. Sinyaller motor thread'inden de geldiği için doğrudan bağlanır.
+    args = build_cli_parser().parse_args(argv)
+    if args.command == 'queue':
+        return run_queue_cli(args)
+    if args.command == 'db':
+        return run_db_cli(args)
+    if args.command == 'search':
+        return run_search_cli(args)
+    if args.command == 'bandwidth':
+        return run_bandwidth_cli(args)
+
+    os.makedirs(args.path, exist_ok=True)
+    apply_run_options(args)
+
+    if args.command == 'instagram':
+        if not args.username or not args.password:
+            print('Instagram kullanıcı adı ve şifresi gereklidir.', file=sys.stderr)
+            return 2
+        if args.no_photos and args.no_videos:
+            print('En az bir medya türü seçilmelidir.', file=sys.stderr)
+            return 2
+        downloader = InstagramDownloaderThread(
+            hashtag=args.hashtag,
+            download_path=args.path,
+            limit=args.limit,
+            username=args.username,
+            password=args.password,
+            download_photos=not args.no_photos,
+            download_videos=not args.no_videos,
+            max_workers=args.workers,
+            near_duplicates=args.near_duplicates,
+            layout=args.layout
+        )
+    else:
+        downloader = TikTokDownloaderThread(
+            keyword=args.keyword,
+            download_path=args.path,
+            limit=args.limit,
+            max_workers=args.workers,
+            layout=args.layout
         )
-        if folder:
-            self.last_download_path = folder
-            self.path_input.setText(folder)
-            self.save_last_path()
-
-    def log_message(self, message):
-        timestamp = datetime.now().strftime('%H:%M:%S')
-        self.log_text.append(f"[{timestamp}] {message}")
-        logging.info(message)
-
-    def validate_inputs(self):
-        if not self.path_input.text().strip():
-            QMessageBox.warning(self, 'Hata', 'İndirme klasörü seçilmelidir.')
-            return False
-
-        current_platform = self.platform_combo.currentText()
-        
-        if current_platform == 'Instagram':
-            if not self.instagram_username_input.text().strip():
-                QMessageBox.warning(self, 'Hata', 'Instagram kullanıcı adı gereklidir.')
-                return False
-                
-            if not self.instagram_password_input.text().strip():
-                QMessageBox.warning(self, 'Hata', 'Instagram şifresi gereklidir.')
-                return False
-
-            if not self.instagram_hashtag_input.text().strip():
-                QMessageBox.warning(self, 'Hata', 'Instagram hashtag gereklidir.')
-                return False
-                
-            if not self.photo_checkbox.isChecked() and not self.video_checkbox.isChecked():
-                QMessageBox.warning(self, 'Hata', 'En az bir medya türü seçilmelidir.')
-                return False
-        
-        elif current_platform == 'TikTok':
-            if not self.tiktok_keyword_input.text().strip():
-                QMessageBox.warning(self, 'Hata', 'TikTok arama kelimesi gereklidir.')
-                return False
-
-        return True
-
-    def start_download(self):
-        if not self.validate_inputs():
-            return
-
-        current_platform = self.platform_combo.currentText()
-        download_path = self.path_input.text().strip()
-
-        self.download_button.setEnabled(False)
-        self.stop_button.setEnabled(True)
-        self.progress_bar.setValue(0)
-        self.log_text.clear()
-
-        if current_platform == 'Instagram':
-            hashtag = self.instagram_hashtag_input.text().strip()
-            limit_text = self.instagram_limit_input.text().strip()
-            username = self.instagram_username_input.text().strip()
-            password = self.instagram_password_input.text().strip()
-
-            try:
-                limit = int(limit_text) if limit_text else None
-                if limit is not None and limit <= 0:
-                    raise ValueError("Limit pozitif olmalıdır")
-            except ValueError as e:
-                QMessageBox.warning(self, 'Hata', f'Geçersiz limit: {str(e)}')
-                self.download_button.setEnabled(True)
-                self.stop_button.setEnabled(False)
-                return
-
-            self.log_message("Instagram indirmesi başlatılıyor...")
-            
-            self.downloader_thread = InstagramDownloaderThread(
-                hashtag=hashtag,
-                download_path=download_path,
-                limit=limit,
-                username=username,
-                password=password,
-                download_photos=self.photo_checkbox.isChecked(),
-                download_videos=self.video_checkbox.isChecked()
-            )
-
-        else:  # TikTok
-            keyword = self.tiktok_keyword_input.text().strip()
-            limit_text = self.tiktok_limit_input.text().strip()
-
-            try:
-                limit = int(limit_text) if limit_text else None
-                if limit is not None and limit <= 0:
-                    raise ValueError("Limit pozitif olmalıdır")
-            except ValueError as e:
-                QMessageBox.warning(self, 'Hata', f'Geçersiz limit: {str(e)}')
-                self.download_button.setEnabled(True)
-                self.stop_button.setEnabled(False)
-                return
 
-            self.log_message("TikTok indirmesi başlatılıyor...")
-            
-            self.downloader_thread = TikTokDownloaderThread(
-                keyword=keyword,
-                download_path=download_path,
-                limit=limit
-            )
+    completed = []
+    downloader.progress_updated.connect(cli_message, Qt.DirectConnection)
+    downloader.download_error.connect(cli_error, Qt.DirectConnection)
+    downloader.download_complete.connect(cli_message, Qt.DirectConnection)
+    downloader.download_complete.connect(completed.append, Qt.DirectConnection)
+
+    try:
+        downloader.run()
+    except KeyboardInterrupt:
+        downloader.stop()
+        cli_error("İndirme durduruldu...")
+        return 130
+    return 0 if completed else 1
+
+
+def start_cli_job(job, username, password):
+    os.makedirs(job['download_path'], exist_ok=True)
+    downloader = create_downloader(job, username=username, password=password)
+    label = f"{job['platform']}:{job['query']}"
+    outcome = {'result': None, 'error': None}
+
+    def on_message(message):
+        cli_message(f"[{label}] {message}")
+
+    def on_error(message):
+        outcome['error'] = message
+        cli_error(f"[{label}] {message}")
+
+    def on_complete(message):
+        outcome['result'] = message
+        on_message(message)
+
+    downloader.progress_updated.connect(on_message, Qt.DirectConnection)
+    downloader.download_error.connect(on_error, Qt.DirectConnection)
+    downloader.download_complete.connect(on_complete, Qt.DirectConnection)
+    return downloader, outcome
+
+
+def run_queue_cli(args):
+    tracker = get_media_tracker()
+
+    if args.queue_command == 'add':
+        if args.platform == 'instagram' and args.no_photos and args.no_videos:
+            print('En az bir medya türü seçilmelidir.', file=sys.stderr)
+            return 2
+        download_path = os.path.abspath(args.path)
+        options = {'limit': args.limit, 'layout': args.layout}
+        if args.workers:
+            options['workers'] = args.workers
+        if args.platform == 'instagram':
+            options.update(username=args.username, photos=not args.no_photos, videos=not args.no_videos,
+                           near_duplicates=args.near_duplicates)
+        for query in args.queries:
+            job_id = tracker.add_job(args.platform, query, download_path, options, args.priority)
+            if job_id is None:
+                return 1
+            print(f"#{job_id} {args.platform}: {query}")
+        return 0
+
+    if args.queue_command == 'list':
+        for job in tracker.list_jobs(args.state):
+            print(f"#{job['id']}\t{JOB_STATE_LABELS.get(job['state'], job['state'])}\t"
+                  f"{job['priority']}\t{job['platform']}: {job['query']}\t{job['download_path']}")
+        return 0
+
+    # run: yarıda kalan işler geri alınır, her iş ayrı bir Python thread'inde çalışır
+    apply_run_options(args)
+    tracker.requeue_running_jobs()
+    pending = tracker.list_jobs(('pending',))
+    if any(job['platform'] == 'instagram' for job in pending) and not args.password:
+        print('Instagram işleri için şifre gereklidir.', file=sys.stderr)
+        return 2
+
+    running = {}
+    failed = 0
+    try:
+        while True:
+            while len(running) < args.jobs:
+                job = tracker.claim_next_job()
+                if job is None:
+                    break
+                downloader, outcome = start_cli_job(job, args.username, args.password)
+                worker = threading.Thread(target=downloader.run, name=f"job-{job['id']}", daemon=True)
+                running[job['id']] = (worker, downloader, outcome)
+                worker.start()
+
+            if not running:
+                break
+            time.sleep(0.2)
+            for job_id, (worker, downloader, outcome) in list(running.items()):
+                if worker.is_alive():
+                    continue
+                del running[job_id]
+                if outcome['result'] is not None:
+                    tracker.finish_job(job_id, 'done', outcome['result'])
+                else:
+                    failed += 1
+                    tracker.finish_job(job_id, 'failed', outcome['error'])
+    except KeyboardInterrupt:
+        for job_id, (worker, downloader, outcome) in running.items():
+            downloader.stop()
+        for job_id, (worker, downloader, outcome) in running.items():
+            worker.join()
+            tracker.finish_job(job_id, 'pending')
+        cli_error("İndirme durduruldu...")
+        return 130
+    return 1 if failed else 0
+
+
+def run_search_cli(args):
+    tracker = get_media_tracker(args.db)
+    started = time.monotonic()
+    results = tracker.search_media(
+        ' '.join(args.text), author=args.author, hashtag=args.hashtag, platform=args.platform,
+        since=args.since, until=args.until + 86400 if args.until is not None else None, limit=args.limit)
+    for item in results:
+        timestamp = item['created_at'] or item['downloaded_at']
+        caption = ' '.join((item['caption'] or '').split())[:80]
+        print(f"{datetime.fromtimestamp(timestamp):%Y-%m-%d}\t{item['platform']}\t{item['author'] or '-'}\t"
+              f"{caption}\t{item['file_path']}")
+    print(f"{len(results)} sonuç ({(time.monotonic() - started) * 1000:.1f} ms)", file=sys.stderr)
+    return 0
+
+
+def run_bandwidth_cli(args):
+    # Ayar downloads.db'ye yazılır; aynı veritabanını kullanan çalışan süreçler
+    # birkaç saniye içinde yeni sınıra geçer
+    tracker = get_media_tracker()
+    changes = {scope: getattr(args, name) for scope, name in
+               [('*', 'total')] + [(platform, platform) for platform in PLATFORM_CODES]
+               if getattr(args, name) is not None}
+    if changes and not tracker.set_bandwidth_limits(changes):
+        return 1
+    limits = tracker.get_bandwidth_limits() or {}
+    print(f"Toplam: {format_rate(limits.get('*'))}")
+    for platform in PLATFORM_CODES:
+        print(f"{platform}: {format_rate(limits.get(platform))}")
+    return 0
+
+
+def run_db_cli(args):
+    tracker = get_media_tracker(args.db)
+    if args.db_command == 'near-duplicates':
+        if not perceptual_hash_available():
+            print('Benzer fotoğraf tespiti için numpy ve Pillow gerekli.', file=sys.stderr)
+            return 2
+
+        def on_match(file_path, match):
+            distance, _, original_path = match
+            print(f"{file_path}\t{original_path}\t{distance}")
+
+        scanned, matched = scan_near_duplicates(tracker, 'remove' if args.remove else 'flag',
+                                                args.distance, on_match=on_match)
+        cli_message(f"{scanned} fotoğraf tarandı, {matched} benzer bulundu"
+                    + (" ve silindi" if args.remove else ""))
+        return 0
+
+    def on_progress(done, total):
+        print(f"\r{done}/{total}", end='', file=sys.stderr, flush=True)
+
+    if args.db_command == 'relayout':
+        started = time.monotonic()
+        stats = tracker.relocate_media(args.root, args.layout, workers=args.workers,
+                                       batch_size=args.batch_size, on_progress=on_progress)
+        print(file=sys.stderr)
+        cli_message(f"{stats['moved']} dosya taşındı, {stats['updated']} kayıt düzeltildi, "
+                    f"{stats['missing']} dosya bulunamadı, {stats['partial']} yarım indirme taşındı, "
+                    f"{stats['failed']} hata "
+                    f"({time.monotonic() - started:.1f} sn)")
+        return 1 if stats['failed'] else 0
+
+    if not tracker.legacy_table:
+        print('Taşınacak eski kayıt yok.')
+        return 0
+
+    started = time.monotonic()
+    migrated = tracker.migrate_legacy_media(args.batch_size, drop=not args.keep_legacy,
+                                            vacuum=args.vacuum, on_progress=on_progress)
+    print(file=sys.stderr)
+    if tracker.legacy_table and not args.keep_legacy:
+        return 1
+    cli_message(f"{migrated} kayıt taşındı ({time.monotonic() - started:.1f} sn)")
+    return 0
 
-        self.downloader_thread.progress_updated.connect(self.log_message)
-        self.downloader_thread.download_complete.connect(self.download_finished)
-        self.downloader_thread.download_error.connect(self.log_message)
-        self.downloader_thread.progress_count.connect(self.progress_bar.setValue)
-        self.downloader_thread.start()
-
-    def stop_download(self):
-        if self.downloader_thread and self.downloader_thread.isRunning():
-            self.downloader_thread.stop()
-            self.log_message("İndirme durduruldu...")
-            self.stop_button.setEnabled(False)
-            self.download_button.setEnabled(True)
-
-    def download_finished(self, message):
-        self.log_message(message)
-        self.download_button.setEnabled(True)
-        self.stop_button.setEnabled(False)
-        self.statusBar().showMessage('İndirme tamamlandı')
-        QMessageBox.information(self, 'Tamamlandı', message)
-
-    def closeEvent(self, event):
-        if self.downloader_thread and self.downloader_thread.isRunning():
-            reply = QMessageBox.question(
-                self, 'Çıkış',
-                'İndirme işlemi devam ediyor. Çıkmak istediğinizden emin misiniz?',
-                QMessageBox.Yes | QMessageBox.No,
-                QMessageBox.No
-            )
-            if reply == QMessageBox.Yes:
-                self.stop_download()
-                event.accept()
-            else:
-                event.ignore()
-        else:
-            event.accept()
 
 def main():
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+
+    from PyQt5.QtWidgets import QApplication
+    # vi.py doğrudan çalıştırıldığında gui modülünün içe aktardığı 'vi' bu modül olsun;
+    # yoksa tracker, motor ve log ayarları ikinci bir kopyada yeniden kurulur
+    sys.modules.setdefault('vi', sys.modules[__name__])
+    from gui import SocialMediaDownloaderGUI
     app = QApplication(sys.argv)
     app.setStyle('Fusion')
     ex = SocialMediaDownloaderGUI()